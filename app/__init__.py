@@ -18,6 +18,10 @@ cors = CORS()
 def create_app(config_name='default'):
     app = Flask(__name__)
     
+    # jsonify encodes ObjectId/datetime/Decimal128 values itself (see app.utils.formatters)
+    from app.utils.formatters import MongoJSONProvider
+    app.json = MongoJSONProvider(app)
+    
     # Load config
     from app.config import config
     app.config.from_object(config[config_name])
@@ -32,23 +36,55 @@ def create_app(config_name='default'):
     app.config['MONGO_URI'] = f"mongodb+srv://{username}:{password}@{cluster}/{database}?retryWrites=true&w=majority&appName=Cluster0&ssl=true&tlsAllowInvalidCertificates=true"
     print(f"MongoDB URI constructed: mongodb+srv://{username}:****@{cluster}/{database}?retryWrites=true&w=majority&appName=Cluster0&ssl=true&tlsAllowInvalidCertificates=true")
     
+    # Per-request database metrics (Server-Timing header and a log line).
+    # The pymongo listener only sees clients created after it is registered.
+    if app.config.get('DB_METRICS_ENABLED'):
+        from app.utils.db_metrics import init_db_metrics, register_listener
+        register_listener()
+        init_db_metrics(app)
+    
+    # Slow-query log (the capped slow_queries collection, see /admin/slow-queries)
+    slow_log = None
+    if app.config.get('SLOW_QUERY_LOG_ENABLED'):
+        from app.utils.slow_queries import init_slow_query_log
+        slow_log = init_slow_query_log(app)
+    
     # Initialize extensions with app
-    try:
-        mongo.init_app(app)
-        print("MongoDB connection successful!")
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        print("App will run with limited functionality.")
+    if app.config.get('USE_MOCK_DB'):
+        from app.utils.mock_db import MockMongoDB, configure_fixtures, declare_indexes, materialized_collections
+        configure_fixtures(app.config.get('MOCK_DB_FIXTURES'))
+        mongo.db = MockMongoDB(path=app.config.get('MOCK_DB_PATH'))
+        # The mock is indexed exactly as the models declare: collections in
+        # use are synced now, the others get the indexes when first used
+        # (syncing them now would seed their fixtures eagerly)
+        from app.utils.db_init import declared_indexes, sync_indexes
+        declare_indexes({name: list(indexes.values()) for name, indexes in declared_indexes().items()})
+        sync_indexes(mongo.db, collections=materialized_collections())
+        if slow_log is not None:
+            slow_log.ensure_collection()
+        print("Using mock database" + (f" persisted to {app.config['MOCK_DB_PATH']}" if app.config.get('MOCK_DB_PATH') else ""))
+    else:
+        try:
+            mongo.init_app(app)
+            print("MongoDB connection successful!")
+        except Exception as e:
+            print(f"MongoDB connection error: {e}")
+            print("App will run with limited functionality.")
     
     login_manager.init_app(app)
     cors.init_app(app)
     
+    from app.utils.db_init import register_commands
+    register_commands(app)
+    
     # Set up login view
     login_manager.login_view = 'auth.login_page'
     
     try:
         # Import user model for login manager
         from app.models.user import load_user
+        from app.middleware.auth import init_auth_caches
+        init_auth_caches(app)
         
         # Register blueprints
         from app.api.auth import auth_bp
@@ -92,10 +128,17 @@ def create_app(config_name='default'):
     def maintenance():
         return render_template('maintenance.html')
     
-    # Register middleware
+    # Register middleware (maintenance mode reads the cached app settings)
+    from app.utils.app_settings import init_settings_cache
+    init_settings_cache(app)
     from app.utils.middleware import register_middleware
     register_middleware(app, mongo)
     
+    # gzip response bodies for clients that accept it
+    if app.config.get('COMPRESS_ENABLED'):
+        from app.utils.compression import init_compression
+        init_compression(app)
+    
     # Error handler for 404
     @app.errorhandler(404)
     def page_not_found(e):
@@ -121,5 +164,8 @@ def create_app(config_name='default'):
 
     from app.api.workouts import workouts_bp
     app.register_blueprint(workouts_bp)
+
+    from app.api.reminders import reminders_bp
+    app.register_blueprint(reminders_bp)
         
     return app
\ No newline at end of file
@@ -1,50 +0,0 @@
-from flask import Flask, render_template
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_login import LoginManager
-from flask_cors import CORS
-
-# Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
-login_manager = LoginManager()
-cors = CORS()
-
-def create_app(config_name='default'):
-    app = Flask(__name__)
-    
-    # Load config
-    from app.config import config
-    app.config.from_object(config[config_name])
-    
-    # Initialize extensions with app
-    db.init_app(app)
-    migrate.init_app(app, db)
-    login_manager.init_app(app)
-    cors.init_app(app)
-    
-    # Set up login view
-    login_manager.login_view = 'auth.login_page'
-    
-    # Import models to register them
-    from app.models.user import User
-    
-    # Register blueprints
-    from app.api.auth import auth_bp
-    app.register_blueprint(auth_bp, url_prefix='/api/auth')
-    
-    # A simple route to confirm the app is working
-    @app.route('/')
-    def index():
-        return render_template('index.html')
-    
-    # Dashboard route (requires login)
-    @app.route('/dashboard')
-    @login_required
-    def dashboard():
-        return render_template('dashboard.html')
-    
-    from app.api.admin import admin_bp
-    app.register_blueprint(admin_bp)
-    
-    return app
\ No newline at end of file
@@ -1,10 +1,14 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, Response
 from flask_login import login_required, current_user
-from bson import ObjectId, json_util
+from bson import ObjectId
 from functools import wraps
 from app import mongo
 from datetime import datetime, timedelta
 from app.models.user import User
+from app.utils.app_settings import settings_updated
+from app.utils.streaming import stream_format, streamed_list
+from app.utils.pagination import InvalidPageToken, count_total, keyset_page
+from app.models.workouts import Workout
 import pymongo
 import json
 import csv
@@ -61,13 +65,17 @@ def dashboard():
                            active_tab='dashboard')
 
 # User Management
+
+# The columns of the user list (admin/users.html); password hashes and the rest stay in the database
+USER_LIST_FIELDS = ['username', 'first_name', 'last_name', 'email', 'created_at', 'last_login',
+                    'is_active', 'subscription_tier']
+
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def users():
-    page = int(request.args.get('page', 1))
+    after = request.args.get('after')
     per_page = 20
-    skip = (page - 1) * per_page
     
     # Apply filters if provided
     filters = {}
@@ -76,13 +84,14 @@ def users():
     if request.args.get('status'):
         filters['is_active'] = (request.args.get('status') == 'active')
     
-    # Get total count for pagination
-    total_users = mongo.db.users.count_documents(filters)
-    total_pages = (total_users + per_page - 1) // per_page
-    
-    # Get users with pagination
-    users_data = list(mongo.db.users.find(filters).sort('created_at', pymongo.DESCENDING)
-                     .skip(skip).limit(per_page))
+    # Total (estimated unless filtered) and the page after the `after` token
+    total_users = count_total(mongo.db.users, filters)
+    try:
+        users_data, next_token = keyset_page(mongo.db.users, filters, [('created_at', pymongo.DESCENDING)],
+                                             per_page, after, USER_LIST_FIELDS)
+    except InvalidPageToken:
+        flash('Invalid page link', 'warning')
+        return redirect(url_for('admin.users'))
     
     # Convert ObjectId to string for serialization
     for user in users_data:
@@ -90,8 +99,8 @@ def users():
     
     return render_template('admin/users.html', 
                            users=users_data,
-                           page=page,
-                           total_pages=total_pages,
+                           after=after,
+                           next_token=next_token,
                            total_users=total_users,
                            active_tab='users')
 
@@ -151,6 +160,7 @@ def update_user(user_id):
             {'_id': ObjectId(user_id)},
             {'$set': update_data}
         )
+        User.invalidate(user_id)
         
         if result.modified_count > 0:
             flash('User updated successfully', 'success')
@@ -168,9 +178,8 @@ def update_user(user_id):
 @login_required
 @admin_required
 def exercises():
-    page = int(request.args.get('page', 1))
+    after = request.args.get('after')
     per_page = 20
-    skip = (page - 1) * per_page
     
     # Apply filters if provided
     filters = {}
@@ -187,13 +196,14 @@ def exercises():
     if request.args.get('search'):
         filters['name'] = {'$regex': request.args.get('search'), '$options': 'i'}
     
-    # Get total count for pagination
-    total_exercises = mongo.db.exercises.count_documents(filters)
-    total_pages = (total_exercises + per_page - 1) // per_page
-    
-    # Get exercises with pagination
-    exercises_data = list(mongo.db.exercises.find(filters).sort('name', pymongo.ASCENDING)
-                         .skip(skip).limit(per_page))
+    # Total (estimated unless filtered) and the page after the `after` token
+    total_exercises = count_total(mongo.db.exercises, filters)
+    try:
+        exercises_data, next_token = keyset_page(mongo.db.exercises, filters, Workout.EXERCISE_SORT,
+                                                 per_page, after)
+    except InvalidPageToken:
+        flash('Invalid page link', 'warning')
+        return redirect(url_for('admin.exercises'))
     
     # Convert ObjectId to string for serialization
     for exercise in exercises_data:
@@ -214,8 +224,8 @@ def exercises():
                            exercises=exercises_data,
                            muscle_groups=muscle_groups,
                            equipment_list=equipment_list,
-                           page=page,
-                           total_pages=total_pages,
+                           after=after,
+                           next_token=next_token,
                            total_exercises=total_exercises,
                            active_tab='exercises')
 
@@ -437,7 +447,7 @@ def get_exercise_api(exercise_id):
         
         return jsonify({
             "success": True,
-            "exercise": json.loads(json_util.dumps(exercise))
+            "exercise": exercise
         })
         
     except Exception as e:
@@ -541,6 +551,7 @@ def update_settings():
             {'$set': settings_data},
             upsert=True
         )
+        settings_updated(settings_data)
         
         flash('Settings updated successfully', 'success')
         return redirect(url_for('admin.settings'))
@@ -549,6 +560,27 @@ def update_settings():
         flash('Error updating settings', 'danger')
         return redirect(url_for('admin.settings'))
 
+# Slow-query log
+@admin_bp.route('/slow-queries')
+@login_required
+@admin_required
+def slow_queries():
+    """List the slowest query shapes recorded in the slow-query log"""
+    from app.utils.slow_queries import slow_query_log, worst_offenders
+    log = slow_query_log()
+    offenders = []
+    if log is not None:
+        try:
+            offenders = worst_offenders(limit=request.args.get('limit', 50, type=int))
+        except Exception as e:
+            current_app.logger.error(f"Error reading the slow-query log: {str(e)}")
+            flash('Error reading the slow-query log', 'danger')
+    
+    return render_template('admin/slow_queries.html',
+                           offenders=offenders,
+                           log=log,
+                           active_tab='slow_queries')
+
 # API endpoint for chart data
 @admin_bp.route('/api/stats/users')
 @login_required
@@ -594,17 +626,26 @@ def user_stats_api():
 @login_required
 @admin_required
 def workout_templates():
-    page = int(request.args.get('page', 1))
+    after = request.args.get('after')
     per_page = 10
-    skip = (page - 1) * per_page
     
-    # Get total count for pagination
-    total_templates = mongo.db.workout_routines.count_documents({})
-    total_pages = (total_templates + per_page - 1) // per_page
+    try:
+        # All templates after `after` (or ?limit= of them) as streamed JSON instead of the page
+        stream = stream_format()
+        if stream:
+            cursor = Workout.find_workout_templates(after=after)
+            limit = request.args.get('limit', 0, type=int)
+            if limit > 0:
+                cursor = cursor.limit(limit)
+            return streamed_list(cursor, 'templates', stream)
+        
+        templates, next_token = Workout.get_workout_templates(limit=per_page, after=after)
+    except InvalidPageToken:
+        flash('Invalid page link', 'warning')
+        return redirect(url_for('admin.workout_templates'))
     
-    # Get templates with pagination
-    templates = list(mongo.db.workout_routines.find().sort('created_at', pymongo.DESCENDING)
-                    .skip(skip).limit(per_page))
+    # Estimated: read from the collection's metadata
+    total_templates = count_total(mongo.db.workout_routines, {})
     
     # Convert ObjectId to string for serialization
     for template in templates:
@@ -612,8 +653,8 @@ def workout_templates():
     
     return render_template('admin/workout_templates.html', 
                            templates=templates,
-                           page=page,
-                           total_pages=total_pages,
+                           after=after,
+                           next_token=next_token,
                            total_templates=total_templates,
                            active_tab='workouts')
 
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify, render_template, redirect, url_fo
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models.user import User
 from app import mongo
+from app.utils.app_settings import setting
 import jwt
 import datetime
 
@@ -46,6 +47,12 @@ def register():
     # Get data from request
     data = request.get_json() if request.is_json else request.form
     
+    if not setting('allow_registrations'):
+        if request.is_json:
+            return jsonify({'error': 'Registrations are closed'}), 403
+        flash('Registrations are currently closed', 'warning')
+        return redirect(url_for('auth.register_page'))
+    
     # Check if user already exists
     if User.get_by_email(data.get('email')):
         if request.is_json:
@@ -66,7 +73,8 @@ def register():
             email=data.get('email'),
             password=data.get('password'),
             first_name=data.get('first_name', ''),
-            last_name=data.get('last_name', '')
+            last_name=data.get('last_name', ''),
+            subscription_tier=setting('default_subscription')
         )
         
         if request.is_json:
@@ -243,6 +251,9 @@ def api_register():
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
         
+        if not setting('allow_registrations'):
+            return jsonify({"error": "Registrations are closed"}), 403
+        
         # Check if user already exists
         if User.get_by_email(data.get('email')):
             return jsonify({"error": "Email already registered"}), 409
@@ -256,7 +267,8 @@ def api_register():
             email=data.get('email'),
             password=data.get('password'),
             first_name=data.get('first_name', ''),
-            last_name=data.get('last_name', '')
+            last_name=data.get('last_name', ''),
+            subscription_tier=setting('default_subscription')
         )
         
         # Generate JWT token
@@ -1,10 +1,13 @@
 # app/api/body.py
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from bson import ObjectId, json_util
+from bson import ObjectId
 from app.models.body import Body
+from app.utils.streaming import stream_format, streamed_list
+from app.utils.pagination import InvalidPageToken, page_args
+from app.utils.projection import InvalidFields, requested_fields
+from app.utils.data_versions import conditional
 from datetime import datetime
-import json
 
 body_bp = Blueprint('body', __name__, url_prefix='/api/body')
 
@@ -47,6 +50,7 @@ def get_weight_history():
         start_date_str = request.args.get('start_date')
         end_date_str = request.args.get('end_date')
         limit = request.args.get('limit', 30, type=int)
+        fields = requested_fields()
         
         start_date = None
         end_date = None
@@ -67,13 +71,20 @@ def get_weight_history():
             except ValueError:
                 return jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD"}), 400
         
-        weights = Body.get_weight_history(current_user.id, start_date, end_date, limit)
+        stream = stream_format()
+        if stream:
+            cursor = Body.find_weight_history(current_user.id, start_date, end_date, limit, fields)
+            return streamed_list(cursor, "weights", stream)
+        
+        weights = Body.get_weight_history(current_user.id, start_date, end_date, limit, fields)
         
         return jsonify({
             "success": True,
-            "weights": json.loads(json_util.dumps(weights))
+            "weights": weights
         }), 200
         
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving weight history: {str(e)}")
         return jsonify({"error": "Failed to retrieve weight history"}), 500
@@ -116,13 +127,15 @@ def get_measurements():
     try:
         limit = request.args.get('limit', 10, type=int)
         
-        measurements = Body.get_measurements_history(current_user.id, limit)
+        measurements = Body.get_measurements_history(current_user.id, limit, requested_fields())
         
         return jsonify({
             "success": True,
-            "measurements": json.loads(json_util.dumps(measurements))
+            "measurements": measurements
         }), 200
         
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving measurements: {str(e)}")
         return jsonify({"error": "Failed to retrieve measurements"}), 500
@@ -166,13 +179,15 @@ def get_composition():
     try:
         limit = request.args.get('limit', 10, type=int)
         
-        compositions = Body.get_body_composition_history(current_user.id, limit)
+        compositions = Body.get_body_composition_history(current_user.id, limit, requested_fields())
         
         return jsonify({
             "success": True,
-            "compositions": json.loads(json_util.dumps(compositions))
+            "compositions": compositions
         }), 200
         
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving body composition history: {str(e)}")
         return jsonify({"error": "Failed to retrieve body composition history"}), 500
@@ -210,24 +225,30 @@ def upload_photo():
 @body_bp.route('/photos', methods=['GET'])
 @login_required
 def get_photos():
-    """Get progress photos"""
+    """Get progress photos, newest first, a page (?limit=, ?after=) at a time"""
     try:
         category = request.args.get('category')
-        limit = request.args.get('limit', 20, type=int)
+        limit, after = page_args(20)
         
-        photos = Body.get_progress_photos(current_user.id, category, limit)
+        photos, next_token = Body.get_progress_photos(current_user.id, category, limit, after, requested_fields())
         
         return jsonify({
             "success": True,
-            "photos": json.loads(json_util.dumps(photos))
+            "photos": photos,
+            "next": next_token
         }), 200
         
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving progress photos: {str(e)}")
         return jsonify({"error": "Failed to retrieve progress photos"}), 500
 
 @body_bp.route('/goals', methods=['GET', 'POST'])
 @login_required
+@conditional('body_goals')
 def manage_goals():
     """Get or set body goals"""
     try:
@@ -237,7 +258,7 @@ def manage_goals():
             
             return jsonify({
                 "success": True,
-                "goals": json.loads(json_util.dumps(goals)) if goals else None
+                "goals": goals if goals else None
             }), 200
         
         # POST request - set new goals
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from bson import ObjectId, json_util
+from bson import ObjectId
 from app.models.nutrition import Nutrition
+from app.utils.pagination import InvalidPageToken, page_args
+from app.utils.projection import InvalidFields, requested_fields
+from app.utils.data_versions import conditional
 from datetime import datetime
-import json
 
 # Changed name to avoid blueprint name conflict
 nutrition_bp = Blueprint('nutrition_api', __name__, url_prefix='/api/nutrition')
@@ -38,10 +40,11 @@ def add_meal():
         current_app.logger.error(f"Error adding meal: {str(e)}")
         return jsonify({"error": "Failed to add meal"}), 500
 
-@nutrition_bp.route('/meals/<date>', methods=['GET'])
+@nutrition_bp.route('/meals/<string(length=10):date>', methods=['GET'])
 @login_required
+@conditional('meals')
 def get_meals(date):
-    """Get meals for a specific date"""
+    """Get meals for a specific date, a page (?limit=, ?after=) at a time"""
     try:
         # Parse date
         try:
@@ -49,13 +52,19 @@ def get_meals(date):
         except ValueError:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
         
-        meals = Nutrition.get_meals_by_date(current_user.id, date_obj)
+        limit, after = page_args(50)
+        meals, next_token = Nutrition.get_meals_by_date(current_user.id, date_obj, limit, after, requested_fields())
         
         return jsonify({
             "success": True,
-            "meals": json.loads(json_util.dumps(meals))
+            "meals": meals,
+            "next": next_token
         }), 200
         
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting meals: {str(e)}")
         return jsonify({"error": "Failed to retrieve meals"}), 500
@@ -79,7 +88,7 @@ def manage_meal(meal_id):
         if request.method == 'GET':
             return jsonify({
                 "success": True,
-                "meal": json.loads(json_util.dumps(meal))
+                "meal": meal
             }), 200
         
         # PUT request - Update meal
@@ -151,6 +160,7 @@ def log_water():
 
 @nutrition_bp.route('/water/<date>', methods=['GET'])
 @login_required
+@conditional('water_intake')
 def get_water(date):
     """Get water intake for a specific date"""
     try:
@@ -174,6 +184,7 @@ def get_water(date):
 
 @nutrition_bp.route('/goals', methods=['GET', 'POST'])
 @login_required
+@conditional('nutrition_goals')
 def manage_goals():
     """Get or set nutrition goals"""
     try:
@@ -183,7 +194,7 @@ def manage_goals():
             
             return jsonify({
                 "success": True,
-                "goals": json.loads(json_util.dumps(goals))
+                "goals": goals
             }), 200
         
         # POST request - Set goals
@@ -211,6 +222,7 @@ def manage_goals():
 
 @nutrition_bp.route('/summary/<date>', methods=['GET'])
 @login_required
+@conditional('meals', 'water_intake', 'nutrition_goals')
 def get_summary(date):
     """Get nutrition summary for a specific date"""
     try:
@@ -237,9 +249,9 @@ def get_summary(date):
         return jsonify({
             "success": True,
             "date": date,
-            "summary": json.loads(json_util.dumps(summary)),
+            "summary": summary,
             "water_intake": water,
-            "goals": json.loads(json_util.dumps(goals)),
+            "goals": goals,
             "progress": progress
         }), 200
         
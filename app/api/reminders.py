@@ -1,24 +1,33 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from bson import ObjectId, json_util
+from bson import ObjectId
 from app.models.reminders import Reminder
+from app.utils.pagination import InvalidPageToken, page_args
+from app.utils.projection import InvalidFields, requested_fields
+from app.utils.data_versions import conditional
 from datetime import datetime
-import json
 
 reminders_bp = Blueprint('reminders_api', __name__, url_prefix='/api/reminders')
 
 @reminders_bp.route('', methods=['GET'])
 @login_required
+@conditional('reminders')
 def get_reminders():
-    """Get all reminders for the current user"""
+    """Get the current user's reminders, a page (?limit=, ?after=) at a time"""
     try:
-        reminders = Reminder.get_reminders(current_user.id)
+        limit, after = page_args(50)
+        reminders, next_token = Reminder.get_reminders(current_user.id, limit, after, requested_fields())
         
         return jsonify({
             "success": True,
-            "reminders": json.loads(json_util.dumps(reminders))
+            "reminders": reminders,
+            "next": next_token
         }), 200
         
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving reminders: {str(e)}")
         return jsonify({"error": "Failed to retrieve reminders"}), 500
@@ -75,7 +84,7 @@ def manage_reminder(reminder_id):
         if request.method == 'GET':
             return jsonify({
                 "success": True,
-                "reminder": json.loads(json_util.dumps(reminder))
+                "reminder": reminder
             }), 200
         
         # PUT request - Update reminder
@@ -1,10 +1,13 @@
 # app/api/workouts.py
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from bson import ObjectId, json_util
+from bson import ObjectId
 from app.models.workouts import Workout
-from datetime import datetime, timedelta
-import json
+from app.utils.streaming import stream_format, streamed_list
+from app.utils.pagination import InvalidPageToken, page_args
+from app.utils.projection import InvalidFields, requested_fields
+from app.utils.data_versions import conditional
+from datetime import date, datetime, timedelta
 
 workouts_bp = Blueprint('workouts', __name__, url_prefix='/api/workouts')
 
@@ -37,21 +40,64 @@ def create_routine():
 @workouts_bp.route('/routines', methods=['GET'])
 @login_required
 def get_routines():
-    """Get workout routines"""
+    """
+    Get the user's workout routines, a page (?limit=, ?after=) at a time.
+    The first page also carries the first page of other users' public
+    routines (unless include_public=false); /routines/public pages the rest.
+    """
     try:
         include_public = request.args.get('include_public', 'true').lower() == 'true'
+        limit, after = page_args(20)
+        fields = requested_fields()
         
-        routines = Workout.get_routines(current_user.id, include_public)
+        stream = stream_format()
+        if stream:
+            return streamed_list(Workout.find_routines(current_user.id, after, fields), "routines", stream)
         
-        return jsonify({
+        routines, next_token = Workout.get_routines(current_user.id, limit, after, fields)
+        response = {
             "success": True,
-            "routines": json.loads(json_util.dumps(routines))
-        }), 200
+            "routines": routines,
+            "next": next_token
+        }
+        
+        if include_public and not after:
+            public_routines, public_next = Workout.get_public_routines(current_user.id, limit, fields=fields)
+            response["public_routines"] = public_routines
+            response["public_next"] = public_next
         
+        return jsonify(response), 200
+        
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving workout routines: {str(e)}")
         return jsonify({"error": "Failed to retrieve workout routines"}), 500
 
+@workouts_bp.route('/routines/public', methods=['GET'])
+@login_required
+def get_public_routines():
+    """Get other users' public routines, newest first, a page (?limit=, ?after=) at a time"""
+    try:
+        limit, after = page_args(20)
+        routines, next_token = Workout.get_public_routines(current_user.id, limit, after, requested_fields())
+        
+        return jsonify({
+            "success": True,
+            "routines": routines,
+            "next": next_token
+        }), 200
+        
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving public routines: {str(e)}")
+        return jsonify({"error": "Failed to retrieve public routines"}), 500
+
 @workouts_bp.route('/routines/<routine_id>', methods=['GET'])
 @login_required
 def get_routine(routine_id):
@@ -68,7 +114,7 @@ def get_routine(routine_id):
         
         return jsonify({
             "success": True,
-            "routine": json.loads(json_util.dumps(routine))
+            "routine": routine
         }), 200
         
     except Exception as e:
@@ -165,6 +211,7 @@ def schedule_workout():
 
 @workouts_bp.route('/schedule', methods=['GET'])
 @login_required
+@conditional('scheduled_workouts', vary=lambda: date.today().isoformat())  # the default range starts today
 def get_scheduled_workouts():
     """Get scheduled workouts for a date range"""
     try:
@@ -197,13 +244,20 @@ def get_scheduled_workouts():
             end_date = start_date + timedelta(days=30)
             end_date = end_date.replace(hour=23, minute=59, second=59)
         
-        workouts = Workout.get_scheduled_workouts(current_user.id, start_date, end_date)
+        limit, after = page_args(100)
+        workouts, next_token = Workout.get_scheduled_workouts(current_user.id, start_date, end_date, limit, after,
+                                                              requested_fields())
         
         return jsonify({
             "success": True,
-            "workouts": json.loads(json_util.dumps(workouts))
+            "workouts": workouts,
+            "next": next_token
         }), 200
         
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving scheduled workouts: {str(e)}")
         return jsonify({"error": "Failed to retrieve scheduled workouts"}), 500
@@ -299,14 +353,21 @@ def get_workout_history():
     """Get workout history"""
     try:
         limit = int(request.args.get('limit', 10))
+        fields = requested_fields()
         
-        workouts = Workout.get_workout_history(current_user.id, limit)
+        stream = stream_format()
+        if stream:
+            return streamed_list(Workout.find_workout_history(current_user.id, limit, fields), "workouts", stream)
+        
+        workouts = Workout.get_workout_history(current_user.id, limit, fields)
         
         return jsonify({
             "success": True,
-            "workouts": json.loads(json_util.dumps(workouts))
+            "workouts": workouts
         }), 200
         
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving workout history: {str(e)}")
         return jsonify({"error": "Failed to retrieve workout history"}), 500
@@ -331,19 +392,40 @@ def get_exercises():
         if request.args.get('search'):
             filters['search'] = request.args.get('search')
         
-        limit = int(request.args.get('limit', 100))
+        stream = stream_format()
+        # A streamed list may be longer than a page can be
+        limit, after = page_args(100, capped=not stream)
         skip = int(request.args.get('skip', 0))
+        fields = requested_fields()
+        
+        # Pages follow the `next` token of the previous one; counting is opt-in past the first
+        with_total = request.args.get('count', 'false' if after else 'true').lower() in ('1', 'true')
         
-        exercises, total = Workout.get_exercises(filters, limit, skip)
+        if stream:
+            exercises, total = Workout.find_exercises(filters, limit, skip, after=after, with_total=with_total,
+                                                      fields=fields)
+            return streamed_list(exercises, "exercises", stream, total=total, limit=limit, skip=skip)
+        
+        if skip:
+            # Old clients paging with skip
+            exercises, total = Workout.get_exercises(filters, limit, skip, fields)
+            next_token = None
+        else:
+            exercises, next_token, total = Workout.get_exercises_page(filters, limit, after, with_total, fields)
         
         return jsonify({
             "success": True,
-            "exercises": json.loads(json_util.dumps(exercises)),
+            "exercises": exercises,
             "total": total,
             "limit": limit,
-            "skip": skip
+            "skip": skip,
+            "next": next_token
         }), 200
         
+    except InvalidPageToken:
+        return jsonify({"error": "Invalid page token"}), 400
+    except InvalidFields:
+        return jsonify({"error": "Invalid fields"}), 400
     except Exception as e:
         current_app.logger.error(f"Error retrieving exercises: {str(e)}")
         return jsonify({"error": "Failed to retrieve exercises"}), 500
@@ -393,7 +475,7 @@ def get_workout_stats():
         
         return jsonify({
             "success": True,
-            "stats": json.loads(json_util.dumps(stats)),
+            "stats": stats,
             "period": period
         }), 200
         
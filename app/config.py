@@ -21,7 +21,54 @@ class Config:
     
     # Development flag
     DEVELOPMENT_MODE = os.environ.get('DEVELOPMENT_MODE', 'False').lower() == 'true'
-
+    
+    # In-memory mock database instead of MongoDB; persisted to MOCK_DB_PATH if set
+    USE_MOCK_DB = os.environ.get('USE_MOCK_DB', 'False').lower() == 'true'
+    MOCK_DB_PATH = os.environ.get('MOCK_DB_PATH')
+    # Seed data for the mock: 'default', 'none' or comma-separated collection names
+    MOCK_DB_FIXTURES = os.environ.get('MOCK_DB_FIXTURES', 'default')
+    
+    # Per-request database metrics: Server-Timing header and a structured log line
+    DB_METRICS_ENABLED = os.environ.get('DB_METRICS_ENABLED', 'True').lower() == 'true'
+    DB_METRICS_HEADER = os.environ.get('DB_METRICS_HEADER', 'True').lower() == 'true'
+    DB_METRICS_LOG = os.environ.get('DB_METRICS_LOG', 'True').lower() == 'true'
+    
+    # Slow-query log: commands slower than SLOW_QUERY_MS go to the capped
+    # slow_queries collection (newest SLOW_QUERY_LOG_MAX kept) with their explain plan
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'True').lower() == 'true'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+    SLOW_QUERY_LOG_MAX = int(os.environ.get('SLOW_QUERY_LOG_MAX', '10000'))
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'True').lower() == 'true'
+    
+    # Users looked up by the auth decorators and the login manager are cached
+    # per process for USER_CACHE_TTL seconds; the workers check the shared
+    # version stamp every USER_CACHE_VERSION_INTERVAL seconds (0: never)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+    USER_CACHE_VERSION_INTERVAL = float(os.environ.get('USER_CACHE_VERSION_INTERVAL', '5'))
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+    
+    # The app_settings document is cached and refreshed in the background once
+    # it is SETTINGS_CACHE_TTL seconds old; the refresh gives up after SETTINGS_TIMEOUT_MS
+    SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '5'))
+    SETTINGS_TIMEOUT_MS = int(os.environ.get('SETTINGS_TIMEOUT_MS', '1000'))
+    
+    # Streamed list responses (?stream=1, ?stream=ndjson): documents fetched and
+    # sent per batch; clients may ask for up to STREAM_MAX_BATCH_SIZE
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '100'))
+    STREAM_MAX_BATCH_SIZE = int(os.environ.get('STREAM_MAX_BATCH_SIZE', '1000'))
+    
+    # Paged lists (?limit=, ?after=): the size when an endpoint has no default
+    # of its own, and the most a client may ask for
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', '50'))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '200'))
+    
+    # gzip responses of at least COMPRESS_MIN_SIZE bytes for clients that accept it
+    # (levels 1-9: faster to smaller)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+    
 class DevelopmentConfig(Config):
     """Development config."""
     DEBUG = True
@@ -32,6 +79,17 @@ class TestingConfig(Config):
     """Testing config."""
     TESTING = True
     MONGO_DATABASE = 'sweatz_test'
+    # Tests run against an empty in-memory mock they seed themselves
+    USE_MOCK_DB = True
+    MOCK_DB_PATH = None
+    MOCK_DB_FIXTURES = 'none'
+    DB_METRICS_LOG = False
+    SLOW_QUERY_LOG_ENABLED = False
+    # One process: no version stamp to check
+    USER_CACHE_VERSION_INTERVAL = 0
+    # Settings change only through admin.update_settings here, which updates
+    # the cache itself; no background refresh lands in a measured request
+    SETTINGS_CACHE_TTL = 3600
 
 class ProductionConfig(Config):
     """Production config."""
@@ -1,8 +1,38 @@
 # app/middleware/auth.py
+import hashlib
+import time
 from functools import wraps
 from flask import request, jsonify, current_app
 import jwt
 from app.models.user import User
+from app.utils.cache import TTLCache
+
+# Decoded token payloads by digest, each kept until its token expires
+_tokens = TTLCache(maxsize=10000)
+
+def init_auth_caches(app):
+    """Size the user and token caches from the app config"""
+    global _tokens
+    User.configure_cache(
+        maxsize=app.config.get('USER_CACHE_SIZE', 10000),
+        ttl=app.config.get('USER_CACHE_TTL', 60),
+        version_interval=app.config.get('USER_CACHE_VERSION_INTERVAL', 5)
+    )
+    _tokens = TTLCache(maxsize=app.config.get('TOKEN_CACHE_SIZE', 10000))
+
+def decode_token(token):
+    """
+    The payload of a valid token, raising the jwt errors otherwise. A token
+    decoded before is not verified again until it expires.
+    """
+    secret = current_app.config['JWT_SECRET_KEY']
+    key = hashlib.sha256(f"{secret}:{token}".encode()).hexdigest()
+    payload = _tokens.get(key)
+    if payload is None:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+        if 'exp' in payload:
+            _tokens.set(key, payload, ttl=payload['exp'] - time.time())
+    return payload
 
 def token_required(f):
     """Decorator for JWT protected API routes"""
@@ -27,16 +57,12 @@ def token_required(f):
         
         try:
             # Decode token
-            payload = jwt.decode(
-                token,
-                current_app.config['JWT_SECRET_KEY'],
-                algorithms=['HS256']
-            )
+            payload = decode_token(token)
             
             user_id = payload['sub']
             
-            # Get user from database
-            user = User.get_by_id(user_id)
+            # Get user (cached between requests)
+            user = User.get_cached(user_id)
             if not user:
                 return jsonify({"error": "User not found"}), 401
             
@@ -73,16 +99,12 @@ def admin_token_required(f):
         
         try:
             # Decode token
-            payload = jwt.decode(
-                token,
-                current_app.config['JWT_SECRET_KEY'],
-                algorithms=['HS256']
-            )
+            payload = decode_token(token)
             
             user_id = payload['sub']
             
-            # Get user from database
-            user = User.get_by_id(user_id)
+            # Get user (cached between requests)
+            user = User.get_cached(user_id)
             if not user:
                 return jsonify({"error": "User not found"}), 401
             
@@ -1,13 +1,25 @@
 # app/models/body.py
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app import mongo
+from app.utils.data_versions import bump_version
+from app.utils.pagination import keyset_page
+from app.utils.projection import projection
 
 class Body:
+    # Every history query filters on user_id and sorts by date (photos page by date, _id)
+    INDEXES = {
+        "body_logs": [IndexModel([("user_id", ASCENDING), ("date", ASCENDING)])],
+        "progress_photos": [IndexModel([("user_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)])],
+        "body_goals": [IndexModel([("user_id", ASCENDING)], unique=True)]
+    }
+    
+    PHOTO_SORT = [("date", DESCENDING)]
+    
     @staticmethod
-    def log_weight(user_id, weight_data):
-        """Log a weight entry"""
-        entry = {
+    def _weight_document(user_id, weight_data):
+        return {
             "user_id": ObjectId(user_id),
             "weight": weight_data.get("weight"),  # in kg
             "unit": weight_data.get("unit", "kg"),
@@ -15,12 +27,23 @@ class Body:
             "notes": weight_data.get("notes", ""),
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def log_weight(user_id, weight_data):
+        """Log a weight entry"""
+        entry = Body._weight_document(user_id, weight_data)
         result = mongo.db.body_logs.insert_one(entry)
+        bump_version(user_id, "body_logs")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_weight_history(user_id, start_date=None, end_date=None, limit=30):
+    def get_weight_history(user_id, start_date=None, end_date=None, limit=30, fields=None):
         """Get weight history for a user"""
+        return list(Body.find_weight_history(user_id, start_date, end_date, limit, fields))
+    
+    @staticmethod
+    def find_weight_history(user_id, start_date=None, end_date=None, limit=30, fields=None):
+        """Cursor over the user's weight entries, latest first (only `fields` of them, if given)"""
         query = {"user_id": ObjectId(user_id), "weight": {"$exists": True}}
         
         if start_date and end_date:
@@ -29,13 +52,11 @@ class Body:
                 "$lte": end_date
             }
         
-        weights = mongo.db.body_logs.find(query).sort("date", -1).limit(limit)
-        return list(weights)
+        return mongo.db.body_logs.find(query, projection(fields)).sort("date", -1).limit(limit)
     
     @staticmethod
-    def log_measurements(user_id, measurement_data):
-        """Log body measurements"""
-        entry = {
+    def _measurements_document(user_id, measurement_data):
+        return {
             "user_id": ObjectId(user_id),
             "date": measurement_data.get("date", datetime.now()),
             "chest": measurement_data.get("chest"),
@@ -49,11 +70,17 @@ class Body:
             "notes": measurement_data.get("notes", ""),
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def log_measurements(user_id, measurement_data):
+        """Log body measurements"""
+        entry = Body._measurements_document(user_id, measurement_data)
         result = mongo.db.body_logs.insert_one(entry)
+        bump_version(user_id, "body_logs")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_measurements_history(user_id, limit=10):
+    def get_measurements_history(user_id, limit=10, fields=None):
         """Get measurement history for a user"""
         # Query for documents that have at least one measurement field
         query = {
@@ -69,13 +96,12 @@ class Body:
             ]
         }
         
-        measurements = mongo.db.body_logs.find(query).sort("date", -1).limit(limit)
+        measurements = mongo.db.body_logs.find(query, projection(fields)).sort("date", -1).limit(limit)
         return list(measurements)
     
     @staticmethod
-    def log_body_composition(user_id, composition_data):
-        """Log body composition metrics"""
-        entry = {
+    def _body_composition_document(user_id, composition_data):
+        return {
             "user_id": ObjectId(user_id),
             "date": composition_data.get("date", datetime.now()),
             "body_fat_percentage": composition_data.get("body_fat_percentage"),
@@ -89,11 +115,40 @@ class Body:
             "notes": composition_data.get("notes", ""),
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def log_body_composition(user_id, composition_data):
+        """Log body composition metrics"""
+        entry = Body._body_composition_document(user_id, composition_data)
         result = mongo.db.body_logs.insert_one(entry)
+        bump_version(user_id, "body_logs")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_body_composition_history(user_id, limit=10):
+    def log_entries(user_id, entries):
+        """
+        Log many body entries in one write. Each entry has a "type" of
+        weight (the default), measurements or composition.
+        """
+        builders = {
+            "weight": Body._weight_document,
+            "measurements": Body._measurements_document,
+            "composition": Body._body_composition_document
+        }
+        documents = []
+        for entry in entries:
+            entry_type = entry.get("type", "weight")
+            if entry_type not in builders:
+                raise ValueError(f"Unknown body log type: {entry_type}")
+            documents.append(builders[entry_type](user_id, entry))
+        if not documents:
+            return []
+        result = mongo.db.body_logs.insert_many(documents)
+        bump_version(user_id, "body_logs")
+        return [str(entry_id) for entry_id in result.inserted_ids]
+    
+    @staticmethod
+    def get_body_composition_history(user_id, limit=10, fields=None):
         """Get body composition history for a user"""
         query = {
             "user_id": ObjectId(user_id),
@@ -108,7 +163,7 @@ class Body:
             ]
         }
         
-        compositions = mongo.db.body_logs.find(query).sort("date", -1).limit(limit)
+        compositions = mongo.db.body_logs.find(query, projection(fields)).sort("date", -1).limit(limit)
         return list(compositions)
     
     @staticmethod
@@ -124,18 +179,18 @@ class Body:
             "created_at": datetime.now()
         }
         result = mongo.db.progress_photos.insert_one(entry)
+        bump_version(user_id, "progress_photos")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_progress_photos(user_id, category=None, limit=20):
-        """Get progress photos for a user"""
+    def get_progress_photos(user_id, category=None, limit=20, after=None, fields=None):
+        """A page of the user's progress photos, newest first: (photos, next_token)"""
         query = {"user_id": ObjectId(user_id)}
         
         if category:
             query["category"] = category
             
-        photos = mongo.db.progress_photos.find(query).sort("date", -1).limit(limit)
-        return list(photos)
+        return keyset_page(mongo.db.progress_photos, query, Body.PHOTO_SORT, limit, after, fields)
     
     @staticmethod
     def set_body_goal(user_id, goal_data):
@@ -156,6 +211,7 @@ class Body:
             {"$set": goal},
             upsert=True
         )
+        bump_version(user_id, "body_goals")
         
         return result.modified_count > 0 or result.upserted_id is not None
     
@@ -1,12 +1,23 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from app import mongo
+from app.utils.data_versions import bump_version, set_changes
+from app.utils.pagination import keyset_page
 
 class Nutrition:
+    # Per-user, per-day lookups: meals (paged by time, _id) and water by time, one goal per user
+    INDEXES = {
+        "meals": [IndexModel([("user_id", ASCENDING), ("time", ASCENDING), ("_id", ASCENDING)])],
+        "water_intake": [IndexModel([("user_id", ASCENDING), ("time", ASCENDING)])],
+        "nutrition_goals": [IndexModel([("user_id", ASCENDING)], unique=True)]
+    }
+    
+    MEAL_SORT = [("time", ASCENDING)]
+    
     @staticmethod
-    def create_meal(user_id, meal_data):
-        """Create a new meal entry"""
-        meal = {
+    def _meal_document(user_id, meal_data):
+        return {
             "user_id": ObjectId(user_id),
             "name": meal_data.get("name", ""),
             "time": meal_data.get("time", datetime.now()),
@@ -17,24 +28,40 @@ class Nutrition:
             "foods": meal_data.get("foods", []),
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def create_meal(user_id, meal_data):
+        """Create a new meal entry"""
+        meal = Nutrition._meal_document(user_id, meal_data)
         result = mongo.db.meals.insert_one(meal)
+        bump_version(user_id, "meals")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_meals_by_date(user_id, date):
-        """Get all meals for a user on a specific date"""
+    def create_meals(user_id, meals_data):
+        """Create many meal entries in one write (e.g. an offline sync)"""
+        meals = [Nutrition._meal_document(user_id, meal_data) for meal_data in meals_data]
+        if not meals:
+            return []
+        result = mongo.db.meals.insert_many(meals)
+        bump_version(user_id, "meals")
+        return [str(meal_id) for meal_id in result.inserted_ids]
+    
+    @staticmethod
+    def get_meals_by_date(user_id, date, limit=50, after=None, fields=None):
+        """A page of the user's meals on a specific date by time: (meals, next_token)"""
         start_date = datetime.combine(date, datetime.min.time())
         end_date = datetime.combine(date, datetime.max.time())
         
-        meals = mongo.db.meals.find({
+        query = {
             "user_id": ObjectId(user_id),
             "time": {
                 "$gte": start_date,
                 "$lte": end_date
             }
-        }).sort("time", 1)
+        }
         
-        return list(meals)
+        return keyset_page(mongo.db.meals, query, Nutrition.MEAL_SORT, limit, after, fields)
     
     @staticmethod
     def get_meal(meal_id):
@@ -43,40 +70,65 @@ class Nutrition:
     
     @staticmethod
     def update_meal(meal_id, meal_data):
-        """Update a meal entry"""
-        result = mongo.db.meals.update_one(
+        """Update a meal entry; whether it was modified"""
+        update_data = {
+            "name": meal_data.get("name"),
+            "time": meal_data.get("time"),
+            "calories": meal_data.get("calories"),
+            "protein": meal_data.get("protein"),
+            "carbs": meal_data.get("carbs"),
+            "fats": meal_data.get("fats"),
+            "foods": meal_data.get("foods"),
+            "updated_at": datetime.now()
+        }
+        
+        # Returns the owner, whose data version changes, and the fields as they were
+        meal = mongo.db.meals.find_one_and_update(
             {"_id": ObjectId(meal_id)},
-            {"$set": {
-                "name": meal_data.get("name"),
-                "time": meal_data.get("time"),
-                "calories": meal_data.get("calories"),
-                "protein": meal_data.get("protein"),
-                "carbs": meal_data.get("carbs"),
-                "fats": meal_data.get("fats"),
-                "foods": meal_data.get("foods"),
-                "updated_at": datetime.now()
-            }}
+            {"$set": update_data},
+            projection={"user_id": 1, **dict.fromkeys(update_data, 1)}
         )
-        return result.modified_count > 0
+        if not meal or not set_changes(meal, update_data):
+            return False
+        bump_version(meal["user_id"], "meals")
+        return True
     
     @staticmethod
     def delete_meal(meal_id):
         """Delete a meal entry"""
-        result = mongo.db.meals.delete_one({"_id": ObjectId(meal_id)})
-        return result.deleted_count > 0
+        meal = mongo.db.meals.find_one_and_delete({"_id": ObjectId(meal_id)}, projection={"user_id": 1})
+        if not meal:
+            return False
+        bump_version(meal["user_id"], "meals")
+        return True
     
     @staticmethod
-    def log_water_intake(user_id, intake_data):
-        """Log water intake for a user"""
-        intake = {
+    def _water_intake_document(user_id, intake_data):
+        return {
             "user_id": ObjectId(user_id),
             "amount": intake_data.get("amount", 0),  # in ml
             "time": intake_data.get("time", datetime.now()),
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def log_water_intake(user_id, intake_data):
+        """Log water intake for a user"""
+        intake = Nutrition._water_intake_document(user_id, intake_data)
         result = mongo.db.water_intake.insert_one(intake)
+        bump_version(user_id, "water_intake")
         return str(result.inserted_id)
     
+    @staticmethod
+    def log_water_intakes(user_id, intakes_data):
+        """Log many water intake entries in one write"""
+        intakes = [Nutrition._water_intake_document(user_id, intake_data) for intake_data in intakes_data]
+        if not intakes:
+            return []
+        result = mongo.db.water_intake.insert_many(intakes)
+        bump_version(user_id, "water_intake")
+        return [str(intake_id) for intake_id in result.inserted_ids]
+    
     @staticmethod
     def get_daily_water_intake(user_id, date):
         """Get total water intake for a specific date"""
@@ -124,6 +176,7 @@ class Nutrition:
             {"$set": goal},
             upsert=True
         )
+        bump_version(user_id, "nutrition_goals")
         
         return result.modified_count > 0 or result.upserted_id is not None
     
@@ -1,8 +1,18 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from app import mongo
+from app.utils.data_versions import bump_version, set_changes
+from app.utils.pagination import keyset_page
 
 class Reminder:
+    # get_reminders pages a user's reminders by (datetime, _id)
+    INDEXES = {
+        "reminders": [IndexModel([("user_id", ASCENDING), ("datetime", ASCENDING), ("_id", ASCENDING)])]
+    }
+    
+    SORT = [("datetime", ASCENDING)]
+    
     @staticmethod
     def create_reminder(user_id, reminder_data):
         """Create a new reminder"""
@@ -19,13 +29,13 @@ class Reminder:
         }
         
         result = mongo.db.reminders.insert_one(reminder)
+        bump_version(user_id, "reminders")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_reminders(user_id):
-        """Get all reminders for a user"""
-        reminders = mongo.db.reminders.find({"user_id": ObjectId(user_id)}).sort("datetime", 1)
-        return list(reminders)
+    def get_reminders(user_id, limit=50, after=None, fields=None):
+        """A page of the user's reminders by datetime: (reminders, next_token)"""
+        return keyset_page(mongo.db.reminders, {"user_id": ObjectId(user_id)}, Reminder.SORT, limit, after, fields)
     
     @staticmethod
     def get_reminder(reminder_id):
@@ -34,7 +44,7 @@ class Reminder:
     
     @staticmethod
     def update_reminder(reminder_id, reminder_data):
-        """Update a reminder"""
+        """Update a reminder; whether it was modified"""
         update_data = {
             "title": reminder_data.get("title"),
             "description": reminder_data.get("description"),
@@ -46,15 +56,22 @@ class Reminder:
             "updated_at": datetime.now()
         }
         
-        result = mongo.db.reminders.update_one(
+        # Returns the owner, whose data version changes, and the fields as they were
+        reminder = mongo.db.reminders.find_one_and_update(
             {"_id": ObjectId(reminder_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"user_id": 1, **dict.fromkeys(update_data, 1)}
         )
-        
-        return result.modified_count > 0
+        if not reminder or not set_changes(reminder, update_data):
+            return False
+        bump_version(reminder["user_id"], "reminders")
+        return True
     
     @staticmethod
     def delete_reminder(reminder_id):
         """Delete a reminder"""
-        result = mongo.db.reminders.delete_one({"_id": ObjectId(reminder_id)})
-        return result.deleted_count > 0
\ No newline at end of file
+        reminder = mongo.db.reminders.find_one_and_delete({"_id": ObjectId(reminder_id)}, projection={"user_id": 1})
+        if not reminder:
+            return False
+        bump_version(reminder["user_id"], "reminders")
+        return True
\ No newline at end of file
@@ -1,10 +1,26 @@
 from flask_login import UserMixin
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import mongo, login_manager
+from app.utils.cache import TTLCache, VersionStamp
 from datetime import datetime
 
 class User(UserMixin):
+    # Logins look users up by email or username; the admin list pages by (created_at, _id)
+    INDEXES = {
+        "users": [
+            IndexModel([("email", ASCENDING)], unique=True),
+            IndexModel([("username", ASCENDING)], unique=True),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)])
+        ]
+    }
+    
+    # User documents by id for the per-request lookups (see get_cached);
+    # sized and timed by configure_cache
+    _cache = TTLCache(maxsize=10000, ttl=60)
+    _version = VersionStamp('users', interval=0)
+    
     def __init__(self, user_data):
         self.id = str(user_data.get('_id'))
         self.username = user_data.get('username')
@@ -45,7 +61,8 @@ class User(UserMixin):
         return self.is_superuser or self.role == 'admin'
     
     @staticmethod
-    def create(username, email, password, first_name="", last_name="", is_superuser=False, role="user"):
+    def create(username, email, password, first_name="", last_name="", is_superuser=False, role="user",
+               subscription_tier=None):
         user_data = {
             'username': username,
             'email': email,
@@ -56,7 +73,7 @@ class User(UserMixin):
             'is_active': True,
             'is_superuser': is_superuser,
             'role': role,
-            'subscription_tier': 'admin' if is_superuser else 'free'
+            'subscription_tier': subscription_tier or ('admin' if is_superuser else 'free')
         }
         
         # Insert user into MongoDB
@@ -89,6 +106,34 @@ class User(UserMixin):
             pass
         return None
     
+    @classmethod
+    def configure_cache(cls, maxsize, ttl, version_interval):
+        cls._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        cls._version = VersionStamp('users', interval=version_interval)
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """get_by_id through the process-wide user cache"""
+        user_id = str(user_id)
+        if cls._version.changed():
+            cls._cache.clear()
+        user_data = cls._cache.get(user_id)
+        if user_data is None:
+            try:
+                user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+            except:
+                return None
+            if not user_data:
+                return None
+            cls._cache.set(user_id, user_data)
+        return User(user_data)
+    
+    @classmethod
+    def invalidate(cls, user_id):
+        """Drop the cached user here and, through the version stamp, in the other workers"""
+        cls._cache.pop(str(user_id))
+        cls._version.bump()
+    
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
     
@@ -97,7 +142,9 @@ class User(UserMixin):
             {'_id': ObjectId(self.id)},
             {'$set': {'last_login': datetime.utcnow()}}
         )
+        # Only last_login changed, so the other workers may keep their copy
+        User._cache.pop(self.id)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get_by_id(user_id)
\ No newline at end of file
+    return User.get_cached(user_id)
\ No newline at end of file
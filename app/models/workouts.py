@@ -1,13 +1,34 @@
 # app/models/workouts.py
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app import mongo
+from app.utils.data_versions import bump_version
+from app.utils.pagination import count_total, keyset_cursor, keyset_page
+from app.utils.projection import projection
 
 class Workout:
+    # The exercise library by name, routine listings and per-user workout calendars.
+    # The list orders end with _id, which keyset pagination seeks on.
+    INDEXES = {
+        "exercises": [IndexModel([("name", ASCENDING), ("_id", ASCENDING)])],
+        "workout_routines": [
+            IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("is_public", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)])
+        ],
+        "scheduled_workouts": [IndexModel([("user_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)])],
+        "completed_workouts": [IndexModel([("user_id", ASCENDING), ("date", ASCENDING)])]
+    }
+    
+    # List orders (see app.utils.pagination, which adds _id)
+    EXERCISE_SORT = [("name", ASCENDING)]
+    ROUTINE_SORT = [("created_at", DESCENDING)]
+    SCHEDULE_SORT = [("date", ASCENDING)]
+    
     @staticmethod
-    def create_exercise(exercise_data):
-        """Create a new exercise in the database"""
-        exercise = {
+    def _exercise_document(exercise_data):
+        return {
             "name": exercise_data.get("name"),
             "muscle_group": exercise_data.get("muscle_group", "other"),
             "difficulty": exercise_data.get("difficulty", "intermediate"),
@@ -18,13 +39,28 @@ class Workout:
             "created_by": exercise_data.get("created_by"),  # Admin ID
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def create_exercise(exercise_data):
+        """Create a new exercise in the database"""
+        exercise = Workout._exercise_document(exercise_data)
         
         result = mongo.db.exercises.insert_one(exercise)
         return str(result.inserted_id)
     
     @staticmethod
-    def get_exercises(filters=None, limit=100, skip=0):
-        """Get exercises with optional filters"""
+    def create_exercises(exercises_data):
+        """Create many exercises in one write (e.g. when importing a library)"""
+        exercises = [Workout._exercise_document(exercise_data) for exercise_data in exercises_data]
+        if not exercises:
+            return []
+        
+        result = mongo.db.exercises.insert_many(exercises)
+        return [str(exercise_id) for exercise_id in result.inserted_ids]
+    
+    @staticmethod
+    def exercise_query(filters=None):
+        """The exercises query for the list filters"""
         query = {}
         
         if filters:
@@ -37,11 +73,41 @@ class Workout:
             if 'search' in filters and filters['search']:
                 query['name'] = {'$regex': filters['search'], '$options': 'i'}
         
-        exercises = mongo.db.exercises.find(query).sort("name", 1).skip(skip).limit(limit)
-        total = mongo.db.exercises.count_documents(query)
-        
+        return query
+    
+    @staticmethod
+    def get_exercises(filters=None, limit=100, skip=0, fields=None):
+        """Get exercises with optional filters"""
+        exercises, total = Workout.find_exercises(filters, limit, skip, fields=fields)
         return list(exercises), total
     
+    @staticmethod
+    def find_exercises(filters=None, limit=100, skip=0, after=None, with_total=True, fields=None):
+        """
+        Cursor over the filtered exercises by name, following the page token
+        `after` (or skipping `skip`), and their total count (None unless with_total)
+        """
+        query = Workout.exercise_query(filters)
+        exercises = keyset_cursor(mongo.db.exercises, query, Workout.EXERCISE_SORT, after, fields)
+        if skip:
+            exercises = exercises.skip(skip)
+        exercises = exercises.limit(limit)
+        total = count_total(mongo.db.exercises, query) if with_total else None
+        
+        return exercises, total
+    
+    @staticmethod
+    def get_exercises_page(filters=None, limit=100, after=None, with_total=True, fields=None):
+        """
+        A page of the filtered exercises by name following the page token
+        `after`: (exercises, next_token, total), total None unless with_total
+        """
+        query = Workout.exercise_query(filters)
+        exercises, next_token = keyset_page(mongo.db.exercises, query, Workout.EXERCISE_SORT, limit, after, fields)
+        total = count_total(mongo.db.exercises, query) if with_total else None
+        
+        return exercises, next_token, total
+    
     @staticmethod
     def get_exercise(exercise_id):
         """Get a specific exercise by ID"""
@@ -87,22 +153,31 @@ class Workout:
         }
         
         result = mongo.db.workout_routines.insert_one(routine)
+        bump_version(user_id, "workout_routines")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_routines(user_id, include_public=True):
-        """Get workout routines for a user"""
-        query = {
-            "$or": [
-                {"user_id": ObjectId(user_id)}
-            ]
-        }
-        
-        if include_public:
-            query["$or"].append({"is_public": True})
-        
-        routines = mongo.db.workout_routines.find(query).sort("created_at", -1)
-        return list(routines)
+    def get_routines(user_id, limit=20, after=None, fields=None):
+        """A page of the user's own routines, newest first: (routines, next_token)"""
+        query = {"user_id": ObjectId(user_id)}
+        return keyset_page(mongo.db.workout_routines, query, Workout.ROUTINE_SORT, limit, after, fields)
+    
+    @staticmethod
+    def find_routines(user_id, after=None, fields=None):
+        """Cursor over the user's own routines, newest first, following the page token `after`"""
+        query = {"user_id": ObjectId(user_id)}
+        return keyset_cursor(mongo.db.workout_routines, query, Workout.ROUTINE_SORT, after, fields)
+    
+    @staticmethod
+    def get_public_routines(user_id=None, limit=20, after=None, fields=None):
+        """
+        A page of the public routines, newest first, leaving out user_id's own
+        (which get_routines lists): (routines, next_token)
+        """
+        query = {"is_public": True}
+        if user_id:
+            query["user_id"] = {"$ne": ObjectId(user_id)}
+        return keyset_page(mongo.db.workout_routines, query, Workout.ROUTINE_SORT, limit, after, fields)
     
     @staticmethod
     def get_routine(routine_id):
@@ -133,6 +208,7 @@ class Workout:
                 "updated_at": datetime.now()
             }}
         )
+        bump_version(user_id, "workout_routines")
         
         return result.modified_count > 0
     
@@ -143,6 +219,8 @@ class Workout:
             "_id": ObjectId(routine_id),
             "user_id": ObjectId(user_id)
         })
+        if result.deleted_count:
+            bump_version(user_id, "workout_routines")
         
         return result.deleted_count > 0
     
@@ -163,11 +241,12 @@ class Workout:
         }
         
         result = mongo.db.scheduled_workouts.insert_one(scheduled)
+        bump_version(user_id, "scheduled_workouts")
         return str(result.inserted_id)
     
     @staticmethod
-    def get_scheduled_workouts(user_id, start_date=None, end_date=None):
-        """Get scheduled workouts for a date range"""
+    def get_scheduled_workouts(user_id, start_date=None, end_date=None, limit=100, after=None, fields=None):
+        """A page of the user's scheduled workouts (in a date range) by date: (workouts, next_token)"""
         query = {"user_id": ObjectId(user_id)}
         
         if start_date and end_date:
@@ -176,8 +255,7 @@ class Workout:
                 "$lte": end_date
             }
         
-        workouts = mongo.db.scheduled_workouts.find(query).sort("date", 1)
-        return list(workouts)
+        return keyset_page(mongo.db.scheduled_workouts, query, Workout.SCHEDULE_SORT, limit, after, fields)
     
     @staticmethod
     def update_scheduled_workout(workout_id, user_id, data):
@@ -195,6 +273,8 @@ class Workout:
                 "updated_at": datetime.now()
             }}
         )
+        if result.matched_count:
+            bump_version(user_id, "scheduled_workouts")
         
         return result.modified_count > 0
     
@@ -205,13 +285,14 @@ class Workout:
             "_id": ObjectId(workout_id),
             "user_id": ObjectId(user_id)
         })
+        if result.deleted_count:
+            bump_version(user_id, "scheduled_workouts")
         
         return result.deleted_count > 0
     
     @staticmethod
-    def log_completed_workout(user_id, workout_data):
-        """Log a completed workout"""
-        completed = {
+    def _completed_workout_document(user_id, workout_data):
+        return {
             "user_id": ObjectId(user_id),
             "routine_id": ObjectId(workout_data.get("routine_id")) if workout_data.get("routine_id") else None,
             "scheduled_id": ObjectId(workout_data.get("scheduled_id")) if workout_data.get("scheduled_id") else None,
@@ -222,6 +303,11 @@ class Workout:
             "rating": workout_data.get("rating", 0),  # 1-5 stars
             "created_at": datetime.now()
         }
+    
+    @staticmethod
+    def log_completed_workout(user_id, workout_data):
+        """Log a completed workout"""
+        completed = Workout._completed_workout_document(user_id, workout_data)
         
         result = mongo.db.completed_workouts.insert_one(completed)
         
@@ -231,86 +317,114 @@ class Workout:
                 {"_id": ObjectId(workout_data.get("scheduled_id"))},
                 {"$set": {"completed": True}}
             )
+            bump_version(user_id, "completed_workouts", "scheduled_workouts")
+        else:
+            bump_version(user_id, "completed_workouts")
             
         return str(result.inserted_id)
     
     @staticmethod
-    def get_workout_history(user_id, limit=10):
+    def log_completed_workouts(user_id, workouts_data):
+        """Log many completed workouts in one write"""
+        completed = [Workout._completed_workout_document(user_id, workout_data) for workout_data in workouts_data]
+        if not completed:
+            return []
+        
+        result = mongo.db.completed_workouts.insert_many(completed)
+        
+        # Mark all linked scheduled workouts as completed at once
+        scheduled_ids = [workout["scheduled_id"] for workout in completed if workout["scheduled_id"]]
+        if scheduled_ids:
+            mongo.db.scheduled_workouts.update_many(
+                {"_id": {"$in": scheduled_ids}, "user_id": ObjectId(user_id)},
+                {"$set": {"completed": True}}
+            )
+        bump_version(user_id, "completed_workouts", *(["scheduled_workouts"] if scheduled_ids else []))
+        
+        return [str(workout_id) for workout_id in result.inserted_ids]
+    
+    @staticmethod
+    def get_workout_history(user_id, limit=10, fields=None):
         """Get workout history for a user"""
-        workouts = mongo.db.completed_workouts.find(
-            {"user_id": ObjectId(user_id)}
+        return list(Workout.find_workout_history(user_id, limit, fields))
+    
+    @staticmethod
+    def find_workout_history(user_id, limit=10, fields=None):
+        """Cursor over the user's completed workouts, latest first (only `fields` of them, if given)"""
+        return mongo.db.completed_workouts.find(
+            {"user_id": ObjectId(user_id)},
+            projection(fields)
         ).sort("date", -1).limit(limit)
-        
-        return list(workouts)
-
-# Add or enhance these methods in app/models/workouts.py
-
-@staticmethod
-def create_workout_template(user_id, template_data):
-    """Create a workout template"""
-    template = {
-        "created_by": ObjectId(user_id),
-        "name": template_data.get("name"),
-        "description": template_data.get("description", ""),
-        "type": template_data.get("type", "custom"),  # custom, split, full-body, etc.
-        "is_public": template_data.get("is_public", False),
-        "tags": template_data.get("tags", []),
-        "days": template_data.get("days", []),  # Array of day objects with exercises
-        "created_at": datetime.now()
-    }
     
-    result = mongo.db.workout_routines.insert_one(template)
-    return str(result.inserted_id)
-
-@staticmethod
-def get_workout_templates(include_public=True, limit=20, skip=0):
-    """Get workout templates"""
-    query = {}
+    # Workout templates (the admin-managed routines)
     
-    if not include_public:
-        query["is_public"] = True
+    @staticmethod
+    def create_workout_template(user_id, template_data):
+        """Create a workout template"""
+        template = {
+            "created_by": ObjectId(user_id),
+            "name": template_data.get("name"),
+            "description": template_data.get("description", ""),
+            "type": template_data.get("type", "custom"),  # custom, split, full-body, etc.
+            "is_public": template_data.get("is_public", False),
+            "tags": template_data.get("tags", []),
+            "days": template_data.get("days", []),  # Array of day objects with exercises
+            "created_at": datetime.now()
+        }
+        
+        result = mongo.db.workout_routines.insert_one(template)
+        return str(result.inserted_id)
     
-    templates = mongo.db.workout_routines.find(query).sort("created_at", -1).skip(skip).limit(limit)
-    return list(templates)
-
-@staticmethod
-def get_workout_template(template_id):
-    """Get a specific workout template"""
-    return mongo.db.workout_routines.find_one({"_id": ObjectId(template_id)})
-
-@staticmethod
-def update_workout_template(template_id, user_id, template_data):
-    """Update a workout template"""
-    update_data = {
-        "name": template_data.get("name"),
-        "description": template_data.get("description"),
-        "type": template_data.get("type"),
-        "is_public": template_data.get("is_public", False),
-        "tags": template_data.get("tags", []),
-        "days": template_data.get("days", []),
-        "updated_at": datetime.now(),
-        "updated_by": ObjectId(user_id)
-    }
+    @staticmethod
+    def get_workout_templates(public_only=False, limit=20, after=None):
+        """A page of workout templates, newest first: (templates, next_token)"""
+        query = {"is_public": True} if public_only else {}
+        return keyset_page(mongo.db.workout_routines, query, Workout.ROUTINE_SORT, limit, after)
     
-    result = mongo.db.workout_routines.update_one(
-        {"_id": ObjectId(template_id)},
-        {"$set": update_data}
-    )
+    @staticmethod
+    def find_workout_templates(public_only=False, after=None):
+        """Cursor over the workout templates, newest first, following the page token `after`"""
+        query = {"is_public": True} if public_only else {}
+        return keyset_cursor(mongo.db.workout_routines, query, Workout.ROUTINE_SORT, after)
     
-    return result.modified_count > 0
-
-@staticmethod
-def delete_workout_template(template_id):
-    """Delete a workout template"""
-    result = mongo.db.workout_routines.delete_one({"_id": ObjectId(template_id)})
-    return result.deleted_count > 0
-
-@staticmethod
-def parse_template_form_data(form_data):
-    """Parse complex nested form data for workout templates"""
-    days = []
+    @staticmethod
+    def get_workout_template(template_id):
+        """Get a specific workout template"""
+        return mongo.db.workout_routines.find_one({"_id": ObjectId(template_id)})
     
-    # Logic to extract days and exercises from form data
-    # This is where you'd handle complex form data processing
+    @staticmethod
+    def update_workout_template(template_id, user_id, template_data):
+        """Update a workout template"""
+        update_data = {
+            "name": template_data.get("name"),
+            "description": template_data.get("description"),
+            "type": template_data.get("type"),
+            "is_public": template_data.get("is_public", False),
+            "tags": template_data.get("tags", []),
+            "days": template_data.get("days", []),
+            "updated_at": datetime.now(),
+            "updated_by": ObjectId(user_id)
+        }
+        
+        result = mongo.db.workout_routines.update_one(
+            {"_id": ObjectId(template_id)},
+            {"$set": update_data}
+        )
+        
+        return result.modified_count > 0
     
-    return days
\ No newline at end of file
+    @staticmethod
+    def delete_workout_template(template_id):
+        """Delete a workout template"""
+        result = mongo.db.workout_routines.delete_one({"_id": ObjectId(template_id)})
+        return result.deleted_count > 0
+    
+    @staticmethod
+    def parse_template_form_data(form_data):
+        """Parse complex nested form data for workout templates"""
+        days = []
+        
+        # Logic to extract days and exercises from form data
+        # This is where you'd handle complex form data processing
+        
+        return days
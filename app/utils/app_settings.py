@@ -0,0 +1,110 @@
+# app/utils/app_settings.py
+"""
+The app_settings document (maintenance mode, registrations, ...), cached
+per process.
+
+Requests read the cached copy and never wait on the database: once it is
+older than the TTL, the next read starts a background refresh and keeps
+returning the copy it has until the refresh lands. Only the very first
+read loads it synchronously. admin.update_settings hands the written
+values to the cache, so they apply at once in that worker; the other
+workers pick them up within a TTL.
+"""
+import logging
+import threading
+import time
+from pymongo.errors import PyMongoError
+
+APP_SETTINGS_ID = 'app_settings'
+
+# What a missing document (or field) means
+DEFAULT_SETTINGS = {
+    'maintenance_mode': False,
+    'allow_registrations': True,
+    'default_subscription': 'free',
+    'app_version': '1.0.0',
+}
+
+logger = logging.getLogger(__name__)
+
+class SettingsCache:
+    def __init__(self, db=None, ttl=5.0, timeout_ms=1000, clock=time.monotonic):
+        self._db = db
+        self.ttl = ttl
+        self.timeout_ms = timeout_ms
+        self._clock = clock
+        self._settings = None
+        self._loaded_at = None
+        self._load_lock = threading.Lock()
+        self._refreshing = threading.Lock()
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from app import mongo
+        return mongo.db
+
+    def get(self):
+        """The settings (defaults filled in); not to be modified"""
+        settings = self._settings
+        if settings is None:
+            with self._load_lock:
+                if self._settings is None:
+                    self.refresh()
+            return self._settings
+        if self._clock() - self._loaded_at >= self.ttl:
+            self._refresh_in_background()
+        return settings
+
+    def refresh(self):
+        """Read the document now. On failure the cached copy (or the defaults) stays."""
+        try:
+            doc = self.db.settings.find_one({'_id': APP_SETTINGS_ID}, max_time_ms=self.timeout_ms)
+        except PyMongoError as e:
+            logger.error(f"Error loading app settings: {str(e)}")
+            if self._settings is None:
+                self._settings = dict(DEFAULT_SETTINGS)
+        else:
+            self._settings = {**DEFAULT_SETTINGS, **(doc or {})}
+        # Also after a failure, so a database outage costs one read per TTL
+        self._loaded_at = self._clock()
+
+    def _refresh_in_background(self):
+        if not self._refreshing.acquire(blocking=False):
+            return
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing.release()
+        try:
+            threading.Thread(target=run, name='app-settings-refresh', daemon=True).start()
+        except RuntimeError:
+            self._refreshing.release()
+
+    def update(self, values):
+        """Apply values just written to the document"""
+        self._settings = {**(self._settings or DEFAULT_SETTINGS), **values}
+        self._loaded_at = self._clock()
+
+_cache = SettingsCache()
+
+def init_settings_cache(app):
+    global _cache
+    _cache = SettingsCache(
+        ttl=app.config.get('SETTINGS_CACHE_TTL', 5),
+        timeout_ms=app.config.get('SETTINGS_TIMEOUT_MS', 1000)
+    )
+    return _cache
+
+def app_settings():
+    """The cached app settings"""
+    return _cache.get()
+
+def setting(name):
+    return app_settings().get(name, DEFAULT_SETTINGS.get(name))
+
+def settings_updated(values):
+    """Make the values admin.update_settings just wrote current in this process"""
+    _cache.update(values)
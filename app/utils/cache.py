@@ -0,0 +1,115 @@
+# app/utils/cache.py
+"""
+In-process caches.
+
+TTLCache is a thread-safe LRU map whose entries also expire. Each worker
+process has its own, so VersionStamp keeps them coherent: a write bumps a
+counter document shared through the database, and every process reads
+the counter at most once per interval and drops what it cached when the
+counter has moved.
+"""
+import threading
+import time
+from collections import OrderedDict
+from pymongo.errors import PyMongoError
+
+CACHE_VERSIONS = 'cache_versions'
+
+class TTLCache:
+    """Up to `maxsize` entries, least recently used evicted first, each kept `ttl` seconds"""
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Cache value under key for `ttl` seconds (default self.ttl); nothing if ttl <= 0"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class VersionStamp:
+    """
+    A counter shared by the worker processes: one document of the
+    cache_versions collection. An interval of 0 turns it off (a single
+    process needs no stamp).
+    """
+    def __init__(self, name, interval=5.0, db=None, clock=time.monotonic):
+        self.name = name
+        self.interval = interval
+        self._db = db
+        self._clock = clock
+        self._seen = None
+        self._checked = None
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from app import mongo
+        return mongo.db
+
+    def changed(self):
+        """
+        Whether the counter moved since the last check. Reads it at most
+        once per interval; a failed read counts as a change, so the caller
+        errs on the side of dropping its entries.
+        """
+        if self.interval <= 0:
+            return False
+        now = self._clock()
+        if self._checked is not None and now - self._checked < self.interval:
+            return False
+        self._checked = now
+        try:
+            doc = getattr(self.db, CACHE_VERSIONS).find_one({'_id': self.name})
+        except PyMongoError:
+            return True
+        version = doc.get('version', 0) if doc else 0
+        changed = self._seen is not None and version != self._seen
+        self._seen = version
+        return changed
+
+    def bump(self):
+        """Tell the other processes to drop their entries"""
+        if self.interval <= 0:
+            return
+        getattr(self.db, CACHE_VERSIONS).update_one(
+            {'_id': self.name},
+            {'$inc': {'version': 1}},
+            upsert=True
+        )
@@ -0,0 +1,85 @@
+# app/utils/compression.py
+"""
+gzip response compression.
+
+A response is gzipped (stdlib zlib, at COMPRESS_LEVEL) when the client
+sends Accept-Encoding: gzip and the body is worth it: a text type (JSON,
+NDJSON, CSV, HTML, ...) of at least COMPRESS_MIN_SIZE bytes, not encoded
+already, and smaller once compressed. Streamed responses are compressed
+as they go, each chunk flushed so the client still receives the body
+piece by piece.
+
+Compressed responses carry Vary: Accept-Encoding, and their ETag becomes
+weak (W/"..."): the bytes differ from the uncompressed representation,
+but If-None-Match (a weak comparison) still matches either.
+"""
+import gzip
+import zlib
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/csv', 'text/css', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+}
+
+def gzip_body(data, level=6):
+    """data gzipped; mtime 0, so the same body always compresses to the same bytes"""
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def gzip_chunks(chunks, level=6):
+    """A gzip stream of chunks (bytes or str), one piece out per chunk in"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def _compressible(response):
+    return (response.status_code == 200
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and 'no-transform' not in response.headers.get('Cache-Control', '')
+            and not response.direct_passthrough)
+
+def compress_response(response, level=6, min_size=1024):
+    """The response gzipped if the request accepts it and it is worth it (see the module docstring)"""
+    if request.method == 'HEAD' or not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings.quality('gzip'):
+        return response
+
+    if response.is_streamed:
+        response.response = gzip_chunks(response.response, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        compressed = gzip_body(data, level)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    """gzip the app's responses (COMPRESS_LEVEL, COMPRESS_MIN_SIZE)"""
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, level, min_size)
@@ -0,0 +1,80 @@
+# app/utils/data_versions.py
+"""
+Per-user data versions, and the conditional GETs built on them.
+
+Each user has a document in data_versions counting the writes to each of
+their collections:
+
+    {"_id": ObjectId("6650..."), "meals": 12, "water_intake": 40}
+
+The models bump a collection's counter after every write they make for a
+user. A view decorated with @conditional('meals') tags its responses with
+an ETag made from the user, the request URL and those counters. A request
+whose If-None-Match holds the current tag gets 304 Not Modified after a
+single read of data_versions by _id: the view (its queries and the
+encoding of its body) does not run.
+"""
+import hashlib
+from functools import wraps
+from bson import ObjectId
+from flask import Response, make_response, request
+from flask_login import current_user
+from app import mongo
+
+DATA_VERSIONS = 'data_versions'
+
+def bump_version(user_id, *collections):
+    """Count a write to the user's collections, after it is made"""
+    if not user_id or not collections:
+        return
+    getattr(mongo.db, DATA_VERSIONS).update_one(
+        {'_id': ObjectId(user_id)},
+        {'$inc': {collection: 1 for collection in collections}},
+        upsert=True
+    )
+
+def set_changes(before, values):
+    """
+    Whether $set-ing `values` changed a document, given the document as it
+    was before (with at least those fields): what modified_count tells an
+    update_one, for a find_one_and_update
+    """
+    return any(field not in before or before[field] != value for field, value in values.items())
+
+def data_versions(user_id):
+    """The user's write counters by collection"""
+    return getattr(mongo.db, DATA_VERSIONS).find_one({'_id': ObjectId(user_id)}) or {}
+
+def data_etag(user_id, collections, versions, vary=''):
+    """The ETag of a response to this request built from the given collections"""
+    counters = ','.join(f"{collection}:{versions.get(collection, 0)}" for collection in collections)
+    key = f"{user_id}|{request.full_path}|{vary}|{counters}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def conditional(*collections, vary=None):
+    """
+    ETags (and 304 Not Modified) for GET requests to the decorated view,
+    whose body must depend only on the request and the current user's
+    data in `collections`. vary: a function returning whatever else it
+    depends on (e.g. today's date, for a default date range).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or not current_user.is_authenticated:
+                return f(*args, **kwargs)
+
+            etag = data_etag(current_user.id, collections, data_versions(current_user.id),
+                             vary() if vary else '')
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Clients may keep the body, but must check it is still current
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -1,55 +1,165 @@
+import logging
+
 from app import mongo
-from pymongo.errors import CollectionInvalid, OperationFailure
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+def _models():
+    from app.models.user import User
+    from app.models.nutrition import Nutrition
+    from app.models.body import Body
+    from app.models.workouts import Workout
+    from app.models.reminders import Reminder
+    return [User, Nutrition, Body, Workout, Reminder]
+
+def declared_indexes():
+    """Indexes declared by the models' INDEXES, as collection -> {name: IndexModel}"""
+    declared = {}
+    for model in _models():
+        for collection, indexes in model.INDEXES.items():
+            for index in indexes:
+                declared.setdefault(collection, {})[index.document['name']] = index
+    return declared
+
+def _signature(key, unique):
+    """Comparable form of an index definition (servers may report directions as floats)"""
+    key = key.items() if isinstance(key, dict) else key
+    return (
+        [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in key],
+        bool(unique)
+    )
+
+def index_drift(db=None, collections=None):
+    """
+    Compare the indexes of each declared collection (of those in
+    `collections`, if given) with the declarations.
+    Returns {collection: {'missing': [...], 'changed': [...], 'stale': [...]}}
+    listing index names, for collections that have drifted only.
+    """
+    db = db if db is not None else mongo.db
+    report = {}
+    for collection, declared in declared_indexes().items():
+        if collections is not None and collection not in collections:
+            continue
+        existing = getattr(db, collection).index_information()
+        existing.pop('_id_', None)
+        drift = {
+            'missing': [name for name in declared if name not in existing],
+            'changed': [
+                name for name, index in declared.items()
+                if name in existing and _signature(existing[name]['key'], existing[name].get('unique'))
+                != _signature(index.document['key'], index.document.get('unique'))
+            ],
+            'stale': [name for name in existing if name not in declared]
+        }
+        if any(drift.values()):
+            report[collection] = drift
+    return report
+
+def sync_indexes(db=None, drop_stale=True, dry_run=False, collections=None):
+    """
+    Bring the indexes in line with the models: create missing ones,
+    rebuild changed ones and, with drop_stale, drop indexes no model
+    declares. Only `collections` are synced, if given. Returns the drift
+    found before syncing (see index_drift).
+
+    A unique index the existing documents violate is not built: it is
+    logged and listed under the collection's 'failed' ({name: error}), and
+    stays missing (a changed one has already been dropped) until the
+    duplicates are removed and the indexes synced again.
+    """
+    db = db if db is not None else mongo.db
+    report = index_drift(db, collections)
+    if dry_run:
+        return report
+    declared = declared_indexes()
+    for collection, drift in report.items():
+        coll = getattr(db, collection)
+        for name in drift['changed'] + (drift['stale'] if drop_stale else []):
+            coll.drop_index(name)
+        # One at a time: a build that fails must not hold back the others
+        for name in drift['missing'] + drift['changed']:
+            try:
+                coll.create_indexes([declared[collection][name]])
+            except DuplicateKeyError as e:
+                logger.error(f"Could not build index {name} on {collection}: {e}")
+                drift.setdefault('failed', {})[name] = str(e)
+    return report
+
+def format_drift(report, drop_stale=True):
+    """Human-readable lines describing an index drift report"""
+    if not report:
+        return ["Indexes match the model declarations."]
+    lines = []
+    for collection, drift in sorted(report.items()):
+        for name in drift['missing']:
+            lines.append(f"{collection}: missing index {name}")
+        for name in drift['changed']:
+            lines.append(f"{collection}: index {name} differs from its declaration")
+        for name in drift['stale']:
+            note = "" if drop_stale else " (kept)"
+            lines.append(f"{collection}: stale index {name}{note}")
+        for name, error in drift.get('failed', {}).items():
+            lines.append(f"{collection}: could not build index {name}: {error}")
+    return lines
+
+def register_commands(app):
+    """Add the `flask sync-indexes` command"""
+    import click
+
+    @app.cli.command('sync-indexes')
+    @click.option('--dry-run', is_flag=True, help="Only report drift.")
+    @click.option('--keep-stale', is_flag=True, help="Do not drop indexes the models no longer declare.")
+    def sync_indexes_command(dry_run, keep_stale):
+        """Create, rebuild and drop indexes to match the models."""
+        report = sync_indexes(drop_stale=not keep_stale, dry_run=dry_run)
+        for line in format_drift(report, drop_stale=not keep_stale):
+            click.echo(line)
+        if report and not dry_run:
+            failed = any(drift.get('failed') for drift in report.values())
+            click.echo("Indexes synced, except those that could not be built." if failed else "Indexes synced.")
 
 def init_db():
     """Initialize MongoDB with required collections and indexes"""
     print("Starting database initialization...")
-    
+
     try:
         # Check connection
         db_info = mongo.db.command("serverStatus")
         print(f"Connected to MongoDB. Server version: {db_info.get('version', 'unknown')}")
-        
+
         # List existing collections
         existing_collections = mongo.db.list_collection_names()
         print(f"Existing collections: {existing_collections}")
-        
-        # Collections to create
-        collections = ['users', 'nutrition_logs', 'body_logs', 'workouts', 'exercises']
-        
+
+        # Collections to create: every collection a model declares indexes for
+        collections = sorted(declared_indexes())
+
         # Create collections if they don't exist
         for collection in collections:
             if collection not in existing_collections:
                 print(f"Creating collection '{collection}'...")
-                mongo.db.create_collection(collection)
+                try:
+                    mongo.db.create_collection(collection)
+                except CollectionInvalid:
+                    pass
                 print(f"Collection '{collection}' created successfully.")
             else:
                 print(f"Collection '{collection}' already exists.")
-        
-        # Create indexes (will be created or updated if they already exist)
-        print("Creating indexes...")
-        
-        # Users collection
-        mongo.db.users.create_index('email', unique=True)
-        print("Created index on users.email")
-        
-        mongo.db.users.create_index('username', unique=True)
-        print("Created index on users.username")
-        
-        # Nutrition logs
-        mongo.db.nutrition_logs.create_index([('user_id', 1), ('date', 1)])
-        print("Created index on nutrition_logs.user_id and nutrition_logs.date")
-        
-        # Body logs
-        mongo.db.body_logs.create_index([('user_id', 1), ('date', 1)])
-        print("Created index on body_logs.user_id and body_logs.date")
-        
-        # Workouts
-        mongo.db.workouts.create_index('user_id')
-        print("Created index on workouts.user_id")
-        
+
+        # Create missing and changed indexes; stale ones are only reported
+        # (run `flask sync-indexes` to drop them)
+        print("Syncing indexes...")
+        report = sync_indexes(drop_stale=False)
+        for line in format_drift(report, drop_stale=False):
+            print(line)
+
         print("Database initialization completed successfully.")
-        
+
+    except OperationFailure as e:
+        print(f"Error syncing indexes: {str(e)}")
+        print("Database initialization failed.")
     except Exception as e:
         print(f"Error during database initialization: {str(e)}")
-        print("Database initialization failed.")
\ No newline at end of file
+        print("Database initialization failed.")
@@ -0,0 +1,173 @@
+# app/utils/db_metrics.py
+"""
+Per-request database instrumentation.
+
+Every command the request issues is recorded: against MongoDB through a
+pymongo CommandListener, against the mock through its command hooks. At
+the end of the request the totals go out as a Server-Timing header, for
+example
+
+    Server-Timing: db;dur=4.21;desc="6 ops", db.users;dur=1.02;desc="2 ops, slowest find 0.61ms"
+
+and as one structured (JSON) log line with the same figures.
+"""
+import json
+import time
+from contextvars import ContextVar
+from flask import current_app, g, request
+from pymongo import monitoring
+
+_current = ContextVar('db_metrics', default=None)
+
+class RequestDBMetrics:
+    """Database commands issued while handling one request"""
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.collections = {}
+
+    def record(self, command, collection, duration_ms, failed=False):
+        self.count += 1
+        self.total_ms += duration_ms
+        stats = self.collections.get(collection)
+        if stats is None:
+            stats = self.collections[collection] = {
+                'count': 0, 'total_ms': 0.0, 'failed': 0, 'slowest_command': None, 'slowest_ms': 0.0
+            }
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+        if failed:
+            stats['failed'] += 1
+        if duration_ms >= stats['slowest_ms']:
+            stats['slowest_ms'] = duration_ms
+            stats['slowest_command'] = command
+
+    def server_timing(self):
+        """The Server-Timing header value"""
+        metrics = [f'db;dur={self.total_ms:.2f};desc="{self.count} ops"']
+        for collection, stats in sorted(self.collections.items(), key=lambda item: -item[1]['total_ms']):
+            name = f"db.{collection}" if collection else "db.admin"
+            metrics.append(
+                f'{name};dur={stats["total_ms"]:.2f};'
+                f'desc="{stats["count"]} ops, slowest {stats["slowest_command"]} {stats["slowest_ms"]:.2f}ms"'
+            )
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        return {
+            'ops': self.count,
+            'db_ms': round(self.total_ms, 3),
+            'collections': {
+                collection or 'admin': {
+                    'ops': stats['count'],
+                    'db_ms': round(stats['total_ms'], 3),
+                    'failed': stats['failed'],
+                    'slowest_command': stats['slowest_command'],
+                    'slowest_ms': round(stats['slowest_ms'], 3)
+                }
+                for collection, stats in self.collections.items()
+            }
+        }
+
+def current_metrics():
+    """Metrics of the request being handled, or None outside a request"""
+    return _current.get()
+
+# Called as observer(command, collection, duration_ms, failed, document)
+# for every command, inside a request or not (see add_observer)
+_observers = []
+
+def add_observer(observer):
+    if observer not in _observers:
+        _observers.append(observer)
+
+def remove_observer(observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+def record_command(command, collection, duration_ms, failed=False, document=None):
+    """
+    Record one database command against the current request, if any, and
+    pass it on to the observers. `document` is the command as sent.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record(command, collection, duration_ms, failed)
+    for observer in _observers:
+        observer(command, collection, duration_ms, failed, document)
+
+def _command_collection(command_name, command):
+    if command_name == 'getMore':
+        return command.get('collection')
+    target = command.get(command_name)
+    return target if isinstance(target, str) else None
+
+class DBCommandListener(monitoring.CommandListener):
+    """Feeds the commands pymongo sends into record_command"""
+    def __init__(self):
+        # Each in-flight command, by (request_id, connection_id)
+        self.pending = {}
+
+    def started(self, event):
+        if _observers or _current.get() is not None:
+            self.pending[(event.request_id, event.connection_id)] = event.command
+
+    def _finished(self, event, failed):
+        command = self.pending.pop((event.request_id, event.connection_id), None)
+        if command is not None:
+            record_command(event.command_name, _command_collection(event.command_name, command),
+                           event.duration_micros / 1000, failed, command)
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+_listener = None
+
+def register_listener():
+    """
+    Register the pymongo listener (once per process). Must run before the
+    MongoClient is created: listeners only apply to clients created later.
+    """
+    global _listener
+    if _listener is None:
+        _listener = DBCommandListener()
+        monitoring.register(_listener)
+    return _listener
+
+def init_db_metrics(app):
+    """Collect database metrics for every request of the app"""
+    from app.utils import mock_db
+    mock_db.add_command_hook(record_command)
+
+    @app.before_request
+    def start_db_metrics():
+        g.db_metrics_token = _current.set(RequestDBMetrics())
+        g.db_metrics_started = time.perf_counter()
+
+    @app.after_request
+    def emit_db_metrics(response):
+        metrics = _current.get()
+        if metrics is None:
+            return response
+        if app.config.get('DB_METRICS_HEADER', True):
+            response.headers.add('Server-Timing', metrics.server_timing())
+        if app.config.get('DB_METRICS_LOG', True):
+            current_app.logger.info(json.dumps({
+                'event': 'db_metrics',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'request_ms': round((time.perf_counter() - g.db_metrics_started) * 1000, 3),
+                **metrics.as_dict()
+            }))
+        return response
+
+    @app.teardown_request
+    def end_db_metrics(exc):
+        token = g.pop('db_metrics_token', None)
+        if token is not None:
+            _current.reset(token)
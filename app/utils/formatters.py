@@ -0,0 +1,55 @@
+# app/utils/formatters.py
+"""
+JSON encoding of BSON values for API responses.
+
+MongoJSONProvider, the app's JSON provider, writes ObjectId, datetime and
+Decimal128 values the way bson.json_util.dumps does (relaxed extended
+JSON), so handlers can jsonify documents straight from the database
+instead of round-tripping them through json_util.dumps and json.loads:
+
+    {"_id": {"$oid": "6650..."}, "date": {"$date": "2025-05-20T12:00:00Z"}}
+
+Other BSON types go through json_util as well; anything else is left to
+Flask's default provider.
+"""
+import calendar
+from datetime import datetime, timezone
+from bson import Decimal128, ObjectId, json_util
+from flask.json.provider import DefaultJSONProvider
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_datetime(value):
+    """A datetime as relaxed extended JSON; naive datetimes are UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    millis = value.microsecond // 1000
+    if value >= _EPOCH:
+        offset = value.utcoffset()
+        zone = "Z" if not offset else value.strftime("%z")
+        fraction = f".{millis:03d}" if millis else ""
+        return {'$date': f"{value.replace(tzinfo=None).isoformat(timespec='seconds')}{fraction}{zone}"}
+    # Before 1970 json_util falls back to milliseconds since the epoch
+    return {'$date': {'$numberLong': str(calendar.timegm(value.utctimetuple()) * 1000 + millis)}}
+
+class MongoJSONProvider(DefaultJSONProvider):
+    # The same bytes in debug and production: sorted keys, no indentation
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        # Compact outside response() too, e.g. for documents streamed one by one
+        kwargs.setdefault('separators', (',', ':'))
+        return super().dumps(obj, **kwargs)
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return {'$oid': str(o)}
+        if isinstance(o, datetime):
+            return encode_datetime(o)
+        if isinstance(o, Decimal128):
+            return {'$numberDecimal': str(o)}
+        try:
+            return json_util.default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
@@ -1,6 +1,7 @@
 # app/utils/middleware.py
 from flask import request, redirect, url_for, flash
 from flask_login import current_user
+from app.utils.app_settings import app_settings
 
 def register_middleware(app, mongo):
     """Register middleware functions with the Flask app"""
@@ -13,9 +14,9 @@ def register_middleware(app, mongo):
             return None
         
         try:
-            # Check if maintenance mode is enabled - with timeout
-            settings = mongo.db.settings.find_one({'_id': 'app_settings'}, max_time_ms=1000)
-            if settings and settings.get('maintenance_mode', False):
+            # Check if maintenance mode is enabled (cached, see app.utils.app_settings)
+            settings = app_settings()
+            if settings.get('maintenance_mode', False):
                 # Allow access for admins
                 if current_user.is_authenticated and hasattr(current_user, 'is_admin') and current_user.is_admin:
                     return None
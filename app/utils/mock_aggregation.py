@@ -0,0 +1,351 @@
+# app/utils/mock_aggregation.py
+"""
+Aggregation pipelines for the mock database.
+
+Each stage is a generator over the previous one, so documents stream
+through the pipeline one at a time. Only $group and $sort have to see
+their whole input before emitting anything; a $sort followed by $limit
+keeps just the top k documents. Leading $match/$sort/$skip/$limit stages
+are handed to a MockCursor so they are answered from the collection's
+indexes.
+"""
+from datetime import datetime
+from heapq import nsmallest
+from itertools import islice
+from pymongo.errors import OperationFailure
+
+from app.utils.mock_db import (
+    MockCursor, _MISSING, _compile_query, _copy_doc, _get_field, _include_path,
+    _index_key, _projected_copy, _sort_key, _sort_spec_key,
+)
+
+def _field_path(path):
+    if path == '$$ROOT':
+        return lambda doc: doc
+    field = path[1:]
+    def get(doc):
+        value = _get_field(doc, field)
+        return None if value is _MISSING else value
+    return get
+
+def _format_date(fmt, date):
+    """Format a date using MongoDB's specifiers (strftime plus %L for milliseconds)"""
+    out = []
+    i = 0
+    while i < len(fmt):
+        char = fmt[i]
+        if char == '%' and i + 1 < len(fmt):
+            spec = fmt[i + 1]
+            if spec == 'L':
+                out.append(f"{date.microsecond // 1000:03d}")
+            elif spec == '%':
+                out.append('%')
+            else:
+                out.append(date.strftime('%' + spec))
+            i += 2
+        else:
+            out.append(char)
+            i += 1
+    return ''.join(out)
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _compile_operator(op, args):
+    """Compile an expression operator such as {'$dateToString': {...}}"""
+    if op == '$literal':
+        return lambda doc: args
+    if op == '$dateToString':
+        date = compile_expression(args['date'])
+        fmt = args.get('format', '%Y-%m-%dT%H:%M:%S.%LZ')
+        on_null = compile_expression(args.get('onNull'))
+        def date_to_string(doc):
+            value = date(doc)
+            if not isinstance(value, datetime):
+                return on_null(doc)
+            return _format_date(fmt, value)
+        return date_to_string
+    if op == '$ifNull':
+        parts = [compile_expression(arg) for arg in args]
+        def if_null(doc):
+            for part in parts:
+                value = part(doc)
+                if value is not None:
+                    return value
+            return None
+        return if_null
+    if op == '$size':
+        inner = compile_expression(args[0] if isinstance(args, list) else args)
+        return lambda doc: len(inner(doc) or [])
+    if op == '$toString':
+        inner = compile_expression(args)
+        return lambda doc: None if inner(doc) is None else str(inner(doc))
+    if op in ('$add', '$subtract', '$multiply', '$divide', '$sum'):
+        if op == '$sum' and not isinstance(args, list):
+            inner = compile_expression(args)
+            def sum_of(doc):
+                value = inner(doc)
+                if isinstance(value, list):
+                    return sum(v for v in value if _numeric(v))
+                return value if _numeric(value) else 0
+            return sum_of
+        parts = [compile_expression(arg) for arg in args]
+        def arithmetic(doc):
+            values = [part(doc) for part in parts]
+            if op == '$sum':
+                return sum(v for v in values if _numeric(v))
+            if any(v is None for v in values):
+                return None
+            result = values[0]
+            for value in values[1:]:
+                if op == '$add':
+                    result = result + value
+                elif op == '$subtract':
+                    result = result - value
+                elif op == '$multiply':
+                    result = result * value
+                else:
+                    result = result / value
+            return result
+        return arithmetic
+    raise OperationFailure(f"Unrecognized expression '{op}'")
+
+def compile_expression(expr):
+    """Compile an aggregation expression into a function of the document"""
+    if isinstance(expr, str) and expr.startswith('$'):
+        return _field_path(expr)
+    if isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith('$'):
+            op, args = next(iter(expr.items()))
+            return _compile_operator(op, args)
+        fields = [(key, compile_expression(value)) for key, value in expr.items()]
+        return lambda doc: {key: get(doc) for key, get in fields}
+    if isinstance(expr, list):
+        items = [compile_expression(value) for value in expr]
+        return lambda doc: [get(doc) for get in items]
+    return lambda doc: expr
+
+class _Accumulator:
+    """Running state of one $group accumulator"""
+    __slots__ = ('op', 'value', 'count', 'seen')
+
+    def __init__(self, op):
+        self.op = op
+        self.value = [] if op in ('$push', '$addToSet') else None
+        self.count = 0
+        self.seen = set() if op == '$addToSet' else None
+
+    def add(self, value):
+        op = self.op
+        if op == '$sum' or op == '$avg':
+            if _numeric(value):
+                self.value = value if self.value is None else self.value + value
+                self.count += 1
+        elif op == '$min' or op == '$max':
+            if value is None:
+                return
+            if self.value is None or (_sort_key(value) < _sort_key(self.value)) == (op == '$min'):
+                self.value = value
+        elif op == '$push':
+            self.value.append(value)
+        elif op == '$addToSet':
+            key = _index_key(value)
+            if key not in self.seen:
+                self.seen.add(key)
+                self.value.append(value)
+        elif op == '$first':
+            if self.count == 0:
+                self.value = value
+            self.count += 1
+        elif op == '$last':
+            self.value = value
+
+    def result(self):
+        if self.op == '$sum':
+            return 0 if self.value is None else self.value
+        if self.op == '$avg':
+            return None if not self.count else self.value / self.count
+        return self.value
+
+_ACCUMULATORS = {'$sum', '$avg', '$min', '$max', '$push', '$addToSet', '$first', '$last'}
+
+def _group(docs, spec):
+    group_id = compile_expression(spec['_id'])
+    accumulators = []
+    for field, expr in spec.items():
+        if field == '_id':
+            continue
+        op, arg = next(iter(expr.items()))
+        if op not in _ACCUMULATORS:
+            raise OperationFailure(f"unknown group operator '{op}'")
+        accumulators.append((field, op, compile_expression(arg)))
+
+    groups = {}
+    for doc in docs:
+        key_value = group_id(doc)
+        key = _index_key(key_value)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = (key_value, [_Accumulator(op) for _, op, _ in accumulators])
+        for (_, _, arg), acc in zip(accumulators, state[1]):
+            acc.add(arg(doc))
+
+    for key_value, accs in groups.values():
+        out = {'_id': key_value}
+        for (field, _, _), acc in zip(accumulators, accs):
+            out[field] = acc.result()
+        yield out
+
+def _project(docs, spec):
+    include_id = spec.get('_id', 1) not in (0, False)
+    fields = {k: v for k, v in spec.items() if k != '_id'}
+    exclusion = fields and all(v in (0, False) for v in fields.values())
+    if exclusion:
+        if any('.' in field for field in fields):
+            # Dotted paths remove fields of subdocuments, which have to be copied
+            for doc in docs:
+                yield _projected_copy(doc, spec)
+            return
+        excluded = set(fields)
+        for doc in docs:
+            yield {k: v for k, v in doc.items()
+                   if k not in excluded and (include_id or k != '_id')}
+        return
+    computed = []
+    for key, value in fields.items():
+        if value in (1, True):
+            computed.append((key, None))
+        else:
+            computed.append((key, compile_expression(value)))
+    id_expr = spec.get('_id')
+    if id_expr not in (None, 0, 1, False, True):
+        computed.insert(0, ('_id', compile_expression(id_expr)))
+        include_id = False
+    for doc in docs:
+        out = {'_id': doc['_id']} if include_id and '_id' in doc else {}
+        for key, get in computed:
+            if get is None:
+                _include_path(doc, out, key.split('.'))
+            else:
+                out[key] = get(doc)
+        yield out
+
+def _subdocument_field(doc, parts):
+    """The value at a path of nested subdocuments (not arrays), or _MISSING"""
+    value = doc
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _with_field(doc, parts, value):
+    """A copy of doc with the value at a path replaced, copying only the subdocuments on the way"""
+    head = parts[0]
+    if len(parts) == 1:
+        return {**doc, head: value}
+    return {**doc, head: _with_field(doc[head], parts[1:], value)}
+
+def _unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    parts = spec['path'][1:].split('.')
+    preserve = spec.get('preserveNullAndEmptyArrays', False)
+    index_field = spec.get('includeArrayIndex')
+    for doc in docs:
+        value = _subdocument_field(doc, parts)
+        if isinstance(value, list) and value:
+            for i, item in enumerate(value):
+                out = _with_field(doc, parts, item)
+                if index_field:
+                    out[index_field] = i
+                yield out
+        elif isinstance(value, list) or value is _MISSING or value is None:
+            if preserve:
+                out = dict(doc)
+                if index_field:
+                    out[index_field] = None
+                yield out
+        else:
+            out = {**doc}
+            if index_field:
+                out[index_field] = None
+            yield out
+
+def _sort(docs, spec, limit=None):
+    key = _sort_spec_key(list(spec.items()))
+    if limit is not None:
+        # Bounded heap: O(n log k) and only k documents held at once
+        return iter(nsmallest(limit, docs, key=key))
+    return iter(sorted(docs, key=key))
+
+def _count(docs, field):
+    yield {field: sum(1 for _ in docs)}
+
+def _source(collection, pipeline):
+    """
+    Feed the pipeline from a cursor, pushing leading $match, $sort, $skip
+    and $limit stages down to the collection's indexes. Returns the
+    documents and the index of the first stage not pushed down.
+    """
+    query = {}
+    i = 0
+    while i < len(pipeline) and '$match' in pipeline[i]:
+        match = pipeline[i]['$match']
+        if query and set(query) & set(match):
+            query = {'$and': [query, match]}
+        else:
+            query = {**query, **match}
+        i += 1
+    cursor = MockCursor(collection, query)
+    if i < len(pipeline) and '$sort' in pipeline[i]:
+        cursor.sort(list(pipeline[i]['$sort'].items()))
+        i += 1
+        skip, limit = 0, None
+        while i < len(pipeline) and ('$skip' in pipeline[i] or '$limit' in pipeline[i]):
+            if '$skip' in pipeline[i]:
+                n = pipeline[i]['$skip']
+                skip += n
+                if limit is not None:
+                    limit = max(limit - n, 0)
+            else:
+                n = pipeline[i]['$limit']
+                limit = n if limit is None else min(limit, n)
+            i += 1
+        if limit == 0:
+            return iter(()), i
+        cursor.skip(skip)
+        if limit is not None:
+            cursor.limit(limit)
+    return cursor._documents(), i
+
+def run_pipeline(collection, pipeline):
+    """Run an aggregation pipeline, returning an iterator of result documents"""
+    docs, i = _source(collection, pipeline)
+    while i < len(pipeline):
+        stage = pipeline[i]
+        name, spec = next(iter(stage.items()))
+        if name == '$match':
+            docs = filter(_compile_query(spec), docs)
+        elif name == '$group':
+            docs = _group(docs, spec)
+        elif name == '$sort':
+            limit = None
+            if i + 1 < len(pipeline) and '$limit' in pipeline[i + 1]:
+                limit = pipeline[i + 1]['$limit']
+                i += 1
+            docs = _sort(docs, spec, limit)
+        elif name == '$limit':
+            docs = islice(docs, spec)
+        elif name == '$skip':
+            docs = islice(docs, spec, None)
+        elif name == '$project':
+            docs = _project(docs, spec)
+        elif name == '$unwind':
+            docs = _unwind(docs, spec)
+        elif name == '$count':
+            docs = _count(docs, spec)
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'")
+        i += 1
+    return (_copy_doc(doc) for doc in docs)
@@ -1,27 +1,25 @@
 # app/utils/mock_db.py
-from datetime import datetime
-from bson import ObjectId
-import json
+from datetime import datetime, timezone
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from heapq import nsmallest
+from itertools import islice
+from bson import ObjectId, Decimal128
+from bson.regex import Regex
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
 import os
 import random
+import re
+import threading
+import time
 
-# In-memory storage
-_mock_data = {
-    'users': [],
-    'meals': [],
-    'water_intake': [],
-    'nutrition_goals': [],
-    'weight_logs': [],
-    'body_measurements': [],
-    'body_composition': [],
-    'progress_photos': [],
-    'body_goals': [],
-    'exercises': [],
-    'workout_routines': [],
-    'scheduled_workouts': [],
-    'completed_workouts': [],
-    'reminders': [],
-    'settings': [
+# Seed fixtures: collection name -> function building its documents.
+# Nothing is built until the collection is first used.
+def _settings_fixture():
+    return [
         {
             '_id': 'app_settings',
             'maintenance_mode': False,
@@ -31,161 +29,1504 @@ _mock_data = {
             'last_updated': datetime.now()
         }
     ]
+
+def _users_fixture():
+    return [
+        # Default admin user
+        {
+            '_id': ObjectId('6123456789abcdef01234567'),
+            'username': 'admin',
+            'email': 'admin@example.com',
+            'password_hash': 'pbkdf2:sha256:150000$x7QZ9cNT$5b2491202c8a61cc38aa43db4d9c0d602dedb42cd8969ba4422c040f46d59303',  # password is 'admin123'
+            'first_name': 'Admin',
+            'last_name': 'User',
+            'created_at': datetime(2024, 1, 1),
+            'last_login': datetime(2025, 5, 1),
+            'is_active': True,
+            'is_superuser': True,
+            'role': 'admin',
+            'subscription_tier': 'admin'
+        },
+        # Regular user
+        {
+            '_id': ObjectId('7123456789abcdef01234567'),
+            'username': 'user',
+            'email': 'user@example.com',
+            'password_hash': 'pbkdf2:sha256:150000$x7QZ9cNT$5b2491202c8a61cc38aa43db4d9c0d602dedb42cd8969ba4422c040f46d59303',  # password is 'admin123' (same for simplicity)
+            'first_name': 'Regular',
+            'last_name': 'User',
+            'created_at': datetime(2024, 2, 1),
+            'last_login': datetime(2025, 5, 1),
+            'is_active': True,
+            'is_superuser': False,
+            'role': 'user',
+            'subscription_tier': 'free'
+        }
+    ]
+
+def _exercises_fixture():
+    exercise_categories = ["Chest", "Back", "Shoulders", "Arms", "Legs", "Core", "Full Body", "Cardio"]
+    difficulties = ["beginner", "intermediate", "advanced"]
+    rng = random.Random(0)
+    exercises = []
+    for i in range(1, 20):
+        exercises.append({
+            '_id': ObjectId(),
+            'name': f"Sample Exercise {i}",
+            'description': f"This is a sample exercise description for exercise {i}.",
+            'muscle_group': rng.choice(exercise_categories),
+            'difficulty': rng.choice(difficulties),
+            'instruction': f"Step 1. Do this.\nStep 2. Do that.\nStep 3. Complete set for exercise {i}.",
+            'video_url': f"https://www.youtube.com/watch?v=sample{i}",
+            'equipment': ["barbell", "dumbbell"] if i % 2 == 0 else ["bodyweight"],
+            'created_at': datetime.now(),
+            'created_by': '6123456789abcdef01234567'  # admin user ID
+        })
+    return exercises
+
+_FIXTURES = {
+    'users': _users_fixture,
+    'meals': list,
+    'water_intake': list,
+    'nutrition_goals': list,
+    'weight_logs': list,
+    'body_measurements': list,
+    'body_composition': list,
+    'progress_photos': list,
+    'body_goals': list,
+    'exercises': _exercises_fixture,
+    'workout_routines': list,
+    'scheduled_workouts': list,
+    'completed_workouts': list,
+    'reminders': list,
+    'settings': _settings_fixture,
 }
 
-# Add some default admin user
-_mock_data['users'].append({
-    '_id': ObjectId('6123456789abcdef01234567'),
-    'username': 'admin',
-    'email': 'admin@example.com',
-    'password_hash': 'pbkdf2:sha256:150000$x7QZ9cNT$5b2491202c8a61cc38aa43db4d9c0d602dedb42cd8969ba4422c040f46d59303',  # password is 'admin123'
-    'first_name': 'Admin',
-    'last_name': 'User',
-    'created_at': datetime(2024, 1, 1),
-    'last_login': datetime(2025, 5, 1),
-    'is_active': True,
-    'is_superuser': True,
-    'role': 'admin',
-    'subscription_tier': 'admin'
-})
-
-# Add some regular user
-_mock_data['users'].append({
-    '_id': ObjectId('7123456789abcdef01234567'),
-    'username': 'user',
-    'email': 'user@example.com',
-    'password_hash': 'pbkdf2:sha256:150000$x7QZ9cNT$5b2491202c8a61cc38aa43db4d9c0d602dedb42cd8969ba4422c040f46d59303',  # password is 'admin123' (same for simplicity)
-    'first_name': 'Regular',
-    'last_name': 'User',
-    'created_at': datetime(2024, 2, 1),
-    'last_login': datetime(2025, 5, 1),
-    'is_active': True,
-    'is_superuser': False,
-    'role': 'user',
-    'subscription_tier': 'free'
-})
-
-# Add sample exercises
-exercise_categories = ["Chest", "Back", "Shoulders", "Arms", "Legs", "Core", "Full Body", "Cardio"]
-difficulties = ["beginner", "intermediate", "advanced"]
-
-for i in range(1, 20):
-    _mock_data['exercises'].append({
-        '_id': ObjectId(),
-        'name': f"Sample Exercise {i}",
-        'description': f"This is a sample exercise description for exercise {i}.",
-        'muscle_group': random.choice(exercise_categories),
-        'difficulty': random.choice(difficulties),
-        'instruction': f"Step 1. Do this.\nStep 2. Do that.\nStep 3. Complete set for exercise {i}.",
-        'video_url': f"https://www.youtube.com/watch?v=sample{i}",
-        'equipment': ["barbell", "dumbbell"] if i % 2 == 0 else ["bodyweight"],
-        'created_at': datetime.now(),
-        'created_by': '6123456789abcdef01234567'  # admin user ID
-    })
+def _fixture_spec(spec):
+    """Resolve a fixture spec: 'default'/'all', 'none', or collection names (a list or comma-separated)"""
+    if spec is None or spec in ('default', 'all'):
+        return dict(_FIXTURES)
+    if spec == 'none':
+        return {}
+    names = spec.split(',') if isinstance(spec, str) else spec
+    names = [name.strip() for name in names if name.strip()]
+    unknown = [name for name in names if name not in _FIXTURES]
+    if unknown:
+        raise ValueError(f"Unknown mock fixtures: {', '.join(unknown)}")
+    return {name: _FIXTURES[name] for name in names}
+
+# Fixtures not yet loaded, chosen by MOCK_DB_FIXTURES
+_pending_fixtures = _fixture_spec(os.environ.get('MOCK_DB_FIXTURES'))
+_fixture_lock = threading.Lock()
+
+class _Missing:
+    def __repr__(self):
+        return '<missing>'
+
+_MISSING = _Missing()
+
+def _get_field(doc, field):
+    """
+    Resolve a (possibly dotted) field path, returning _MISSING if absent.
+
+    As in MongoDB, a path continues into the subdocuments of an array:
+    'sets.reps' of {'sets': [{'reps': 8}, {'reps': 6}]} is [8, 6], which
+    the matchers and indexes treat like any array field. A numeric part
+    ('sets.0') selects an array element instead.
+    """
+    if '.' not in field:
+        return doc.get(field, _MISSING)
+    return _resolve_path(doc, field.split('.'))
+
+def _resolve_path(value, parts):
+    for position, part in enumerate(parts):
+        if isinstance(value, dict):
+            if part not in value:
+                return _MISSING
+            value = value[part]
+        elif isinstance(value, list):
+            if part.isdigit() and int(part) < len(value):
+                value = value[int(part)]
+                continue
+            # Collect the rest of the path from each subdocument, flattening arrays
+            found = []
+            for item in value:
+                if isinstance(item, dict):
+                    item_value = _resolve_path(item, parts[position:])
+                    if isinstance(item_value, list):
+                        found.extend(item_value)
+                    elif item_value is not _MISSING:
+                        found.append(item_value)
+            return found if found else _MISSING
+        else:
+            return _MISSING
+    return value
+
+def _index_key(value):
+    """Turn a field value into a hashable index key"""
+    if isinstance(value, list):
+        return tuple(_index_key(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _index_key(v)) for k, v in value.items())
+    return value
+
+def _index_keys(value):
+    """All keys a value is indexed under (array fields are multikey)"""
+    if value is _MISSING:
+        return [None]
+    if isinstance(value, list):
+        keys = [_index_key(v) for v in value]
+        keys.append(_index_key(value))
+        return keys
+    return [_index_key(value)]
+
+def _copy_doc(value):
+    """Copy a document so callers can't mutate the stored (and indexed) version"""
+    if isinstance(value, dict):
+        return {k: _copy_doc(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_doc(v) for v in value]
+    return value
+
+def _include_path(source, target, parts):
+    head, rest = parts[0], parts[1:]
+    if head not in source:
+        return
+    value = source[head]
+    if not rest:
+        target[head] = _copy_doc(value)
+    elif isinstance(value, dict):
+        _include_path(value, target.setdefault(head, {}), rest)
+    elif isinstance(value, list):
+        # A path into an array projects each subdocument; other elements are dropped
+        items = [item for item in value if isinstance(item, dict)]
+        projected = target.setdefault(head, [{} for _ in items])
+        for item, out in zip(items, projected):
+            _include_path(item, out, rest)
+
+def _exclude_path(doc, parts):
+    head, rest = parts[0], parts[1:]
+    if not rest:
+        doc.pop(head, None)
+        return
+    value = doc.get(head)
+    for item in (value if isinstance(value, list) else [value]):
+        if isinstance(item, dict):
+            _exclude_path(item, rest)
+
+def _projected_copy(doc, projection):
+    """
+    A copy of the part of doc a find projection selects: the included
+    fields (plus _id unless excluded) or all but the excluded ones; dotted
+    paths reach into subdocuments and arrays of them
+    """
+    if not projection:
+        return _copy_doc(doc)
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get('_id', 1) not in (0, False)
+    fields = [field for field in projection if field != '_id']
+    if fields and all(projection[field] in (0, False) for field in fields):
+        out = _copy_doc(doc)
+        for field in fields:
+            _exclude_path(out, field.split('.'))
+    else:
+        out = {}
+        if '_id' in doc:
+            out['_id'] = doc['_id']
+        for field in fields:
+            _include_path(doc, out, field.split('.'))
+    if not include_id:
+        out.pop('_id', None)
+    return out
+
+def _normalize_id(value):
+    """Legacy leniency: allow `_id` lookups by ObjectId hex string"""
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+# Rank of each BSON type in MongoDB's cross-type comparison order
+_TYPE_ORDER = {
+    type(None): 1, int: 2, float: 2, Decimal128: 2, str: 3, dict: 4, list: 5,
+    bytes: 6, ObjectId: 7, bool: 8, datetime: 9, re.Pattern: 11,
+}
+# Sort keys that compare below/above every real sort key
+_MIN_KEY = (-1,)
+_MAX_KEY = (99,)
+
+def _sort_key(value):
+    """Comparable key ordering values the way MongoDB does, across types"""
+    if value is _MISSING or value is None:
+        return (1,)
+    rank = _TYPE_ORDER.get(type(value), 10)
+    if rank == 2 and isinstance(value, Decimal128):
+        value = value.to_decimal()
+    elif rank == 4:
+        value = tuple((k, _sort_key(v)) for k, v in value.items())
+    elif rank == 5:
+        value = tuple(_sort_key(v) for v in value)
+    elif rank == 9 and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    elif rank == 10:
+        value = repr(value)
+    elif rank == 11:
+        value = value.pattern
+    return (rank, value)
+
+class _HashIndex:
+    """Maps the values of one field to the ids of the documents holding them"""
+    def __init__(self, name, field, unique=False, sparse=False):
+        self.name = name
+        self.field = field
+        self.fields = (field,)
+        self.keys = [(field, 'hashed')]
+        self.unique = unique
+        self.sparse = sparse
+        self.buckets = {}
+        # Ids of the documents without the field, which a sparse index leaves out of unique checks
+        self.absent = set()
+    
+    def check(self, doc):
+        """
+        Raise DuplicateKeyError if adding doc would violate uniqueness. As in
+        MongoDB, a missing field counts as null, unless the index is sparse.
+        """
+        if not self.unique:
+            return
+        value = _get_field(doc, self.field)
+        if value is _MISSING and self.sparse:
+            return
+        for key in _index_keys(value):
+            bucket = self.buckets.get(key)
+            if bucket and any(_id != doc['_id'] and _id not in self.absent for _id in bucket):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error index: {self.name} dup key: {{ {self.field}: {key!r} }}"
+                )
+    
+    def add(self, doc):
+        value = _get_field(doc, self.field)
+        if self.sparse and value is _MISSING:
+            self.absent.add(doc['_id'])
+        for key in _index_keys(value):
+            self.buckets.setdefault(key, {})[doc['_id']] = True
+    
+    def remove(self, doc):
+        self.absent.discard(doc['_id'])
+        for key in _index_keys(_get_field(doc, self.field)):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.pop(doc['_id'], None)
+                if not bucket:
+                    del self.buckets[key]
+    
+    def add_many(self, docs):
+        for doc in docs:
+            self.add(doc)
+    
+    def remove_many(self, docs):
+        for doc in docs:
+            self.remove(doc)
+    
+    def lookup(self, value):
+        """Ids of documents whose field equals (or, for arrays, contains) value"""
+        bucket = self.buckets.get(_index_key(value))
+        return list(bucket) if bucket else []
+
+class _SortedIndex:
+    """
+    Compound index kept as a sorted list of (key..., _id) tuples.
+    
+    Keys are stored ascending whatever the declared direction; a sort over
+    the fields after an equality prefix is served by walking the slice
+    forwards or backwards.
+    """
+    def __init__(self, name, keys, unique=False, sparse=False):
+        self.name = name
+        self.keys = list(keys)
+        self.fields = tuple(field for field, _ in self.keys)
+        self.unique = unique
+        self.sparse = sparse
+        self.multikey = False
+        self.entries = []
+        # Sort keys of the ids of documents with none of the fields, which
+        # a sparse index leaves out of unique checks
+        self.absent = set()
+    
+    def _key_values(self, doc):
+        """The combinations of field values doc is indexed under, one per array element"""
+        combinations = [()]
+        for field in self.fields:
+            value = _get_field(doc, field)
+            if isinstance(value, list) and value:
+                self.multikey = True
+                values = value
+            else:
+                values = [value]
+            combinations = [combination + (v,) for combination in combinations for v in values]
+        return combinations
+    
+    def _entries_for(self, doc):
+        id_key = _sort_key(doc['_id'])
+        return [tuple(_sort_key(v) for v in values) + (id_key,) for values in self._key_values(doc)]
+    
+    def _note_absent(self, doc):
+        if self.sparse and all(_get_field(doc, field) is _MISSING for field in self.fields):
+            self.absent.add(_sort_key(doc['_id']))
+    
+    def check(self, doc):
+        """
+        Raise DuplicateKeyError if adding doc would violate uniqueness. As in
+        MongoDB, missing fields count as null, unless the index is sparse
+        and the document has none of its fields.
+        """
+        if not self.unique:
+            return
+        combinations = self._key_values(doc)
+        if self.sparse and all(v is _MISSING for v in combinations[0]):
+            return
+        entries = self.entries
+        id_key = _sort_key(doc['_id'])
+        width = len(self.fields)
+        for values in combinations:
+            prefix = tuple(_sort_key(v) for v in values)
+            # Entries with the prefix are adjacent; the document's own (an
+            # update, or an array holding a value twice) come among them
+            pos = bisect_left(entries, prefix)
+            while pos < len(entries) and entries[pos][:width] == prefix:
+                if entries[pos][-1] != id_key and entries[pos][-1] not in self.absent:
+                    key = ', '.join(
+                        f"{field}: {None if v is _MISSING else v!r}" for field, v in zip(self.fields, values)
+                    )
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error index: {self.name} dup key: {{ {key} }}"
+                    )
+                pos += 1
+    
+    def add(self, doc):
+        self._note_absent(doc)
+        for entry in self._entries_for(doc):
+            insort(self.entries, entry)
+    
+    def add_many(self, docs):
+        """Add a batch with a single sort instead of one insertion per document"""
+        if self.sparse:
+            for doc in docs:
+                self._note_absent(doc)
+        entries = [entry for doc in docs for entry in self._entries_for(doc)]
+        if len(entries) < 8:
+            for entry in entries:
+                insort(self.entries, entry)
+        else:
+            self.entries.extend(entries)
+            self.entries.sort()
+    
+    def remove(self, doc):
+        self.absent.discard(_sort_key(doc['_id']))
+        for entry in self._entries_for(doc):
+            pos = bisect_left(self.entries, entry)
+            if pos < len(self.entries) and self.entries[pos] == entry:
+                del self.entries[pos]
+    
+    def remove_many(self, docs):
+        """Remove a batch with one pass over the entries instead of one deletion each"""
+        dead = {entry for doc in docs for entry in self._entries_for(doc)}
+        if self.absent:
+            self.absent.difference_update(_sort_key(doc['_id']) for doc in docs)
+        if len(dead) < 8:
+            for doc in docs:
+                self.remove(doc)
+        elif dead:
+            self.entries = [entry for entry in self.entries if entry not in dead]
+    
+    def bounds(self, prefix, low=None, high=None):
+        """
+        Slice of entries matching an equality prefix and an optional range
+        on the next field. low/high are (sort_key, inclusive) pairs.
+        """
+        if low is None:
+            start = prefix + ((high[0][0],),) if high else prefix
+        elif low[1]:
+            start = prefix + (low[0],)
+        else:
+            start = prefix + (low[0], _MAX_KEY)
+        if high is None:
+            stop = prefix + ((low[0][0] + 1,),) if low else prefix + (_MAX_KEY,)
+        elif high[1]:
+            stop = prefix + (high[0], _MAX_KEY)
+        else:
+            stop = prefix + (high[0],)
+        return bisect_left(self.entries, start), bisect_left(self.entries, stop)
+
+class _Plan:
+    """How a query is answered: candidate documents and whether they come pre-sorted"""
+    def __init__(self, docs, index=None, keys_examined=None, sorted_=False):
+        self.docs = docs
+        self.index = index
+        self.keys_examined = keys_examined
+        self.sorted = sorted_
+
+_RANGE_OPS = {'$gt': False, '$gte': True, '$lt': False, '$lte': True}
+
+def _range_clause(value):
+    """(low, high) bounds if value is a pure range clause, else None"""
+    if not isinstance(value, dict) or not value or not all(op in _RANGE_OPS for op in value):
+        return None
+    low = high = None
+    for op, bound in value.items():
+        if op in ('$gt', '$gte'):
+            low = (_sort_key(bound), _RANGE_OPS[op])
+        else:
+            high = (_sort_key(bound), _RANGE_OPS[op])
+    if low and high and low[0][0] != high[0][0]:
+        return None
+    return low, high
+
+def _is_equality(value):
+    """Whether a filter value is a plain equality, which an index can look up"""
+    # A regex value matches by pattern, so only a scan (or the predicate) can answer it
+    return not isinstance(value, (dict, list, re.Pattern, Regex))
+
+class _RWLock:
+    """
+    Reader/writer lock: any number of readers, or one writer. Writers are
+    preferred so a steady stream of readers can't starve them. A thread
+    holding the write lock may re-enter it or read; read locks nest.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+    
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, 'reads', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.reads = depth + 1
+            try:
+                yield
+            finally:
+                self._local.reads = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if getattr(self._local, 'reads', 0):
+            raise RuntimeError("cannot upgrade a read lock to a write lock")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+class _CollectionStore:
+    """
+    Documents of one collection keyed by `_id`, plus their indexes.
+    
+    Writers hold the write lock. Stored documents are never mutated: an
+    update swaps in a new dict, so readers only need the read lock while
+    planning, to snapshot their candidates, and can then filter, sort and
+    copy out without blocking writers.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.indexes = {}
+        # Collection options, e.g. {'capped': True, 'size': ..., 'max': ...}
+        self.options = {}
+        self.lock = _RWLock()
+    
+    def set_options(self, options):
+        with self.lock.write():
+            if _journal is not None:
+                _journal.record('c', self.name, options)
+            self.options = dict(options)
+            self._trim()
+    
+    def _trim(self):
+        """Drop the oldest documents of a capped collection beyond its `max`"""
+        limit = self.options.get('max') if self.options.get('capped') else None
+        while limit and len(self.docs) > limit:
+            doc = next(iter(self.docs.values()))
+            if _journal is not None:
+                _journal.record('d', self.name, {'_id': doc['_id']})
+            for index in self.indexes.values():
+                index.remove(doc)
+            del self.docs[doc['_id']]
+    
+    def _check_id(self, doc):
+        if doc['_id'] in self.docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {{ _id: {doc['_id']!r} }}"
+            )
+    
+    def insert(self, doc):
+        with self.lock.write():
+            self._check_id(doc)
+            for index in self.indexes.values():
+                index.check(doc)
+            if _journal is not None:
+                _journal.record('i', self.name, doc)
+            self.docs[doc['_id']] = doc
+            for index in self.indexes.values():
+                index.add(doc)
+            self._trim()
+    
+    def _changed(self, doc, changes, replace):
+        """The updated document and the indexes it affects"""
+        if '_id' in changes and changes['_id'] != doc['_id']:
+            raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'")
+        if replace:
+            return {'_id': doc['_id'], **changes}, list(self.indexes.values())
+        affected = [index for index in self.indexes.values()
+                    if any(field == key or field.startswith(key + '.')
+                           for field in index.fields for key in changes)]
+        new_doc = {**doc, **changes}
+        for key, value in changes.items():
+            if value is _MISSING:
+                # Removed by $unset
+                del new_doc[key]
+        return new_doc, affected
+    
+    def update(self, doc, changes, replace=False):
+        """
+        Replace a stored document with a changed copy (or, with replace,
+        with `changes` itself), keeping indexes in sync
+        """
+        with self.lock.write():
+            new_doc, affected = self._changed(doc, changes, replace)
+            for index in affected:
+                index.check(new_doc)
+            if _journal is not None:
+                _journal.record('u', self.name, new_doc)
+            for index in affected:
+                index.remove(doc)
+            self.docs[doc['_id']] = new_doc
+            for index in affected:
+                index.add(new_doc)
+            return new_doc
+    
+    def remove(self, doc):
+        with self.lock.write():
+            if _journal is not None:
+                _journal.record('d', self.name, {'_id': doc['_id']})
+            for index in self.indexes.values():
+                index.remove(doc)
+            del self.docs[doc['_id']]
+    
+    def insert_many(self, docs, ordered=True):
+        """
+        Insert a batch under one write lock. Unique indexes are checked and
+        maintained document by document; the others are updated once for
+        the whole batch. Returns the inserted documents and a list of
+        (position, error) for the rejected ones; an ordered batch stops at
+        the first error.
+        """
+        with self.lock.write():
+            unique = [index for index in self.indexes.values() if index.unique]
+            inserted, errors = [], []
+            for position, doc in enumerate(docs):
+                try:
+                    self._check_id(doc)
+                    for index in unique:
+                        index.check(doc)
+                except DuplicateKeyError as e:
+                    errors.append((position, e))
+                    if ordered:
+                        break
+                    continue
+                if _journal is not None:
+                    _journal.record('i', self.name, doc)
+                self.docs[doc['_id']] = doc
+                for index in unique:
+                    index.add(doc)
+                inserted.append(doc)
+            for index in self.indexes.values():
+                if not index.unique:
+                    index.add_many(inserted)
+            self._trim()
+            return inserted, errors
+    
+    def update_many(self, updates, ordered=True):
+        """
+        Apply (stored document, changes) pairs under one write lock, with
+        the same per-batch index maintenance as insert_many. Returns the new
+        documents and a list of (position, error).
+        """
+        with self.lock.write():
+            updated, errors = [], []
+            removed, added = {}, {}
+            for position, (doc, changes) in enumerate(updates):
+                try:
+                    new_doc, affected = self._changed(doc, changes, False)
+                    for index in affected:
+                        index.check(new_doc)
+                except (DuplicateKeyError, WriteError) as e:
+                    errors.append((position, e))
+                    if ordered:
+                        break
+                    continue
+                if _journal is not None:
+                    _journal.record('u', self.name, new_doc)
+                for index in affected:
+                    if index.unique:
+                        index.remove(doc)
+                        index.add(new_doc)
+                    else:
+                        removed.setdefault(index.name, []).append(doc)
+                        added.setdefault(index.name, []).append(new_doc)
+                self.docs[doc['_id']] = new_doc
+                updated.append(new_doc)
+            for name, docs in removed.items():
+                self.indexes[name].remove_many(docs)
+                self.indexes[name].add_many(added[name])
+            return updated, errors
+    
+    def remove_many(self, docs):
+        """Delete a batch of stored documents under one write lock"""
+        with self.lock.write():
+            for doc in docs:
+                if _journal is not None:
+                    _journal.record('d', self.name, {'_id': doc['_id']})
+                del self.docs[doc['_id']]
+            for index in self.indexes.values():
+                index.remove_many(docs)
+    
+    def _build_index(self, keys, unique, name, sparse=False):
+        if keys[0][1] == 'hashed':
+            index = _HashIndex(name, keys[0][0], unique, sparse)
+        else:
+            index = _SortedIndex(name, keys, unique, sparse)
+        if index.unique:
+            for doc in self.docs.values():
+                index.check(doc)
+                index.add(doc)
+        else:
+            index.add_many(self.docs.values())
+        return index
+    
+    def create_index(self, keys, unique=False, name=None, sparse=False):
+        with self.lock.write():
+            existing = self.indexes.get(name)
+            if existing is None:
+                index = self._build_index(keys, unique, name, sparse)
+                if _journal is not None:
+                    _journal.record('x', self.name, self.index_specs([index])[0])
+                self.indexes[name] = index
+            elif list(existing.keys) != list(keys) or existing.unique != unique or existing.sparse != sparse:
+                raise OperationFailure(
+                    f"An existing index has the same name as the requested index. "
+                    f"Requested index: {keys!r}, existing index: {existing.keys!r}",
+                    code=86
+                )
+            return name
+    
+    def drop_index(self, name):
+        with self.lock.write():
+            if name not in self.indexes:
+                raise OperationFailure(f"index not found with name [{name}]", code=27)
+            if _journal is not None:
+                _journal.record('r', self.name, {'name': name})
+            del self.indexes[name]
+    
+    def index_specs(self, indexes=None):
+        """Definitions of the indexes, as accepted by create_index"""
+        indexes = self.indexes.values() if indexes is None else indexes
+        return [{'name': index.name, 'keys': list(index.keys), 'unique': index.unique,
+                 **({'sparse': True} if index.sparse else {})}
+                for index in indexes]
+    
+    def load(self, docs, index_specs=(), options=None):
+        """
+        Replace the contents with trusted documents (e.g. from a snapshot).
+        Each index is rebuilt with a single sort rather than one insertion
+        per document.
+        """
+        with self.lock.write():
+            self.options = dict(options or {})
+            self.docs = {doc['_id']: doc for doc in docs}
+            self.indexes = {}
+            for spec in index_specs:
+                keys = [tuple(key) for key in spec['keys']]
+                self.indexes[spec['name']] = self._build_index(
+                    keys, spec.get('unique', False), spec['name'], spec.get('sparse', False)
+                )
+    
+    def _scan_sorted(self, entries, multikey):
+        """Yield the current documents of an index slice snapshot, in order"""
+        seen = set() if multikey else None
+        for entry in entries:
+            _id = entry[-1][1]
+            if seen is not None:
+                if _id in seen:
+                    continue
+                seen.add(_id)
+            doc = self.docs.get(_id)
+            if doc is not None:
+                yield doc
+    
+    def plan(self, query, sort=None):
+        """
+        Pick the index that narrows the query's candidates the most.
+        
+        `_id` equality is answered directly; otherwise hash indexes serve
+        equalities and sorted indexes serve an equality prefix plus one
+        range, also supplying the requested sort order when it follows the
+        prefix. Everything else falls back to a collection scan.
+        """
+        if not query:
+            query = {}
+        with self.lock.read():
+            if '_id' in query:
+                value = query['_id']
+                if _is_equality(value):
+                    doc = self.docs.get(_normalize_id(value))
+                    return _Plan([doc] if doc is not None else [], '_id_', 1 if doc is not None else 0, sorted_=True)
+                if isinstance(value, dict) and list(value) == ['$in']:
+                    ids = dict.fromkeys(_normalize_id(v) for v in value['$in'] if _hashable(v))
+                    docs = [self.docs[_id] for _id in ids if _id in self.docs]
+                    return _Plan(docs, '_id_', len(ids))
+            
+            best = None
+            for index in self.indexes.values():
+                if isinstance(index, _HashIndex):
+                    if index.field in query and _is_equality(query[index.field]):
+                        ids = index.lookup(query[index.field])
+                        candidate = (len(ids), 1, index, ids)
+                    else:
+                        continue
+                else:
+                    prefix = ()
+                    for field in index.fields:
+                        if field in query and _is_equality(query[field]):
+                            prefix += (_sort_key(query[field]),)
+                        else:
+                            break
+                    low = high = None
+                    if len(prefix) < len(index.fields):
+                        clause = _range_clause(query.get(index.fields[len(prefix)]))
+                        if clause is not None:
+                            low, high = clause
+                    provides_sort = reverse = False
+                    if sort and not index.multikey:
+                        suffix = index.fields[len(prefix):len(prefix) + len(sort)]
+                        directions = {direction for _, direction in sort}
+                        if tuple(field for field, _ in sort) == suffix and len(directions) == 1:
+                            provides_sort = True
+                            reverse = directions.pop() < 0
+                    if not prefix and low is None and high is None and not provides_sort:
+                        continue
+                    start, stop = index.bounds(prefix, low, high)
+                    candidate = (stop - start, 0 if provides_sort else 1, index, (start, stop, reverse))
+                if best is None or candidate[:2] < best[:2]:
+                    best = candidate
+            
+            if best is None:
+                return _Plan(list(self.docs.values()), None, None)
+            count, unsorted, index, selection = best
+            if isinstance(index, _HashIndex):
+                docs = [self.docs[_id] for _id in selection]
+                return _Plan(docs, index.name, count)
+            start, stop, reverse = selection
+            # Snapshot the slice (a cheap pointer copy); documents are resolved lazily
+            entries = index.entries[start:stop]
+            if reverse:
+                entries.reverse()
+            return _Plan(self._scan_sorted(entries, index.multikey), index.name, count, sorted_=not unsorted)
+
+# In-memory storage: collection name -> _CollectionStore
+_mock_data = {}
+
+# Operation log for on-disk persistence, set by app.utils.mock_store.attach()
+_journal = None
+
+# Indexes a collection is created with (see declare_indexes): name -> [index spec]
+_declared_indexes = {}
+
+def _get_store(name):
+    store = _mock_data.get(name)
+    if store is None:
+        with _fixture_lock:
+            store = _mock_data.get(name)
+            if store is None:
+                # First use: seed from the collection's fixture, if any, with the declared indexes
+                store = _CollectionStore(name)
+                fixture = _pending_fixtures.pop(name, None)
+                store.load(fixture() if fixture is not None else [], _declared_indexes.get(name, ()))
+                _mock_data[name] = store
+    return store
+
+def declare_indexes(declared):
+    """
+    Indexes ({collection: [IndexModel, ...]}) that collections not used
+    yet are created with, so they can be indexed without seeding their
+    fixtures early. Collections already in use are left alone.
+    """
+    with _fixture_lock:
+        _declared_indexes.update({
+            name: [{'name': model.document['name'], 'keys': list(model.document['key'].items()),
+                    'unique': model.document.get('unique', False), 'sparse': model.document.get('sparse', False)}
+                   for model in models]
+            for name, models in declared.items()
+        })
+
+def materialized_collections():
+    """Names of the collections in use, leaving out fixtures not seeded yet"""
+    return list(_mock_data)
+
+def configure_fixtures(spec):
+    """
+    Choose which fixtures seed the mock database: 'default' (or 'all'),
+    'none', or a list or comma-separated string of collection names. Only
+    collections that have not been used yet are affected.
+    """
+    global _pending_fixtures
+    fixtures = _fixture_spec(spec)
+    with _fixture_lock:
+        _pending_fixtures = {name: build for name, build in fixtures.items() if name not in _mock_data}
+
+def load_fixtures():
+    """Seed every pending fixture now"""
+    for name in list(_pending_fixtures):
+        _get_store(name)
+
+def clear_collections():
+    """Empty every collection, keeping its indexes (and options)"""
+    for store in list(_mock_data.values()):
+        store.load([], store.index_specs(), store.options)
+
+def _getter(path):
+    """Fast accessor for a field path, returning _MISSING if absent"""
+    if '.' not in path:
+        return lambda doc: doc.get(path, _MISSING)
+    return lambda doc: _get_field(doc, path)
+
+def _same_value(a, b):
+    """Equality that, like MongoDB, does not treat True as 1"""
+    return a == b and (type(a) is type(b) or _TYPE_ORDER.get(type(a)) == _TYPE_ORDER.get(type(b)))
+
+def _regex_flags(options):
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if option in (options or ''):
+            flags |= flag
+    return flags
+
+def _regex_matcher(pattern):
+    search = pattern.search
+    def matches(value):
+        if isinstance(value, str):
+            return search(value) is not None
+        if isinstance(value, list):
+            return any(isinstance(v, str) and search(v) is not None for v in value)
+        return False
+    return matches
+
+def _eq_matcher(expected):
+    """Match a field value equal to expected (or an array containing it)"""
+    if isinstance(expected, Regex):
+        expected = expected.try_compile()
+    if isinstance(expected, re.Pattern):
+        return _regex_matcher(expected)
+    if expected is None:
+        return lambda value: value is _MISSING or value is None or (
+            isinstance(value, list) and None in value)
+    def matches(value):
+        if _same_value(value, expected):
+            return True
+        return isinstance(value, list) and any(_same_value(v, expected) for v in value)
+    return matches
+
+def _in_matcher(values):
+    matchers = [_eq_matcher(v) for v in values]
+    hashable = [v for v in values if not isinstance(v, (re.Pattern, Regex, dict, list)) and v is not None
+                and not isinstance(v, bool)]
+    if len(hashable) == len(values):
+        # Fast path: plain scalar values can be looked up in a set
+        lookup = set(hashable)
+        def matches(value):
+            if isinstance(value, list):
+                return any(not isinstance(v, bool) and _hashable(v) and v in lookup for v in value)
+            return not isinstance(value, bool) and _hashable(value) and value in lookup
+        return matches
+    return lambda value: any(m(value) for m in matchers)
+
+def _hashable(value):
+    return not isinstance(value, (dict, list))
+
+def _compare_matcher(op, bound):
+    bound_key = _sort_key(bound)
+    rank = bound_key[0]
+    compare = {
+        '$gt': lambda k: k > bound_key,
+        '$gte': lambda k: k >= bound_key,
+        '$lt': lambda k: k < bound_key,
+        '$lte': lambda k: k <= bound_key,
+    }[op]
+    def matches(value):
+        # Comparisons only apply within the same BSON type bracket
+        if isinstance(value, list):
+            return any(_sort_key(v)[0] == rank and compare(_sort_key(v)) for v in value)
+        key = _sort_key(value)
+        return key[0] == rank and compare(key)
+    return matches
+
+def _operator_matcher(op, params, options=None):
+    """Build the value predicate for a single field operator"""
+    if op == '$eq':
+        return _eq_matcher(next(params))
+    if op == '$ne':
+        matcher = _eq_matcher(next(params))
+        return lambda value: not matcher(value)
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        return _compare_matcher(op, next(params))
+    if op == '$in':
+        return _in_matcher(list(next(params)))
+    if op == '$nin':
+        matcher = _in_matcher(list(next(params)))
+        return lambda value: not matcher(value)
+    if op == '$exists':
+        wanted = bool(next(params))
+        return lambda value: (value is not _MISSING) == wanted
+    if op == '$regex':
+        pattern = next(params)
+        flags = _regex_flags(next(params)) if options else 0
+        if isinstance(pattern, Regex):
+            pattern = pattern.try_compile()
+        elif not isinstance(pattern, re.Pattern):
+            pattern = re.compile(pattern, flags)
+        return _regex_matcher(pattern)
+    raise OperationFailure(f"unknown operator: {op}")
+
+def _value_matcher(spec, params):
+    """Combine the operators of one field into a single value predicate"""
+    matchers = []
+    for op, extra in spec:
+        if op == '$not':
+            inner = _value_matcher(extra, params)
+            matchers.append(lambda value, inner=inner: not inner(value))
+        else:
+            matchers.append(_operator_matcher(op, params, extra))
+    if len(matchers) == 1:
+        return matchers[0]
+    return lambda value: all(m(value) for m in matchers)
+
+def _analyze_operators(value, params):
+    """Shape of a field's operator document, appending its operands to params"""
+    if isinstance(value, (re.Pattern, Regex)):
+        params.append(value)
+        return (('$regex', False),)
+    ops = []
+    for op, operand in value.items():
+        if op == '$not':
+            ops.append(('$not', _analyze_operators(operand, params)))
+        elif op == '$options':
+            continue
+        else:
+            has_options = op == '$regex' and '$options' in value
+            ops.append((op, has_options))
+            params.append(operand)
+            if has_options:
+                params.append(value['$options'])
+    return tuple(ops)
+
+def _analyze_query(query):
+    """Split a filter into a hashable shape and the values it binds, in order"""
+    shape = []
+    params = []
+    for key, value in query.items():
+        if key in ('$and', '$or', '$nor'):
+            subshapes = []
+            for sub in value:
+                subshape, subparams = _analyze_query(sub)
+                subshapes.append(subshape)
+                params.extend(subparams)
+            shape.append((key, tuple(subshapes)))
+        elif key.startswith('$'):
+            raise OperationFailure(f"unknown top level operator: {key}")
+        elif isinstance(value, dict) and value and next(iter(value)).startswith('$'):
+            shape.append((key, _analyze_operators(value, params)))
+        else:
+            if key == '_id' and isinstance(value, str) and ObjectId.is_valid(value):
+                # Legacy leniency: an ObjectId hex string also matches the ObjectId
+                shape.append((key, (('$in', False),)))
+                params.append([value, ObjectId(value)])
+            else:
+                shape.append((key, None))
+                params.append(value)
+    return tuple(shape), params
+
+class _Descending:
+    """Inverts the ordering of a sort key, for descending fields in mixed sorts"""
+    __slots__ = ('key',)
+    
+    def __init__(self, key):
+        self.key = key
+    
+    def __lt__(self, other):
+        return other.key < self.key
+    
+    def __eq__(self, other):
+        return self.key == other.key
+
+def _sort_spec_key(sort):
+    """Key function ordering documents by a [(field, direction), ...] spec"""
+    getters = [(_getter(field), direction) for field, direction in sort]
+    if len(getters) == 1 and getters[0][1] > 0:
+        get = getters[0][0]
+        return lambda doc: _sort_key(get(doc))
+    return lambda doc: tuple(_sort_key(get(doc)) if direction > 0 else _Descending(_sort_key(get(doc)))
+                             for get, direction in getters)
+
+def _all_of(predicates):
+    if not predicates:
+        return lambda doc: True
+    if len(predicates) == 1:
+        return predicates[0]
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda doc: first(doc) and second(doc)
+    return lambda doc: all(p(doc) for p in predicates)
+
+@lru_cache(maxsize=512)
+def _compile_shape(shape):
+    """
+    Compile a filter shape once into a binder that, given the filter's
+    values, returns a document predicate. Cached, so repeated queries of
+    the same shape (e.g. per-user lookups) only pay for binding.
+    """
+    builders = []
+    for key, spec in shape:
+        if key in ('$and', '$or', '$nor'):
+            binders = [_compile_shape(subshape) for subshape in spec]
+            def build(params, key=key, binders=binders):
+                predicates = [binder(params) for binder in binders]
+                if key == '$and':
+                    return _all_of(predicates)
+                if key == '$or':
+                    return lambda doc: any(p(doc) for p in predicates)
+                return lambda doc: not any(p(doc) for p in predicates)
+        else:
+            get = _getter(key)
+            def build(params, key=key, spec=spec, get=get):
+                if spec is None:
+                    matcher = _eq_matcher(next(params))
+                    return lambda doc: matcher(get(doc))
+                matcher = _value_matcher(spec, params)
+                return lambda doc: matcher(get(doc))
+        builders.append(build)
+    
+    def bind(params):
+        return _all_of([build(params) for build in builders])
+    return bind
+
+def _compile_query(query):
+    """Turn a MongoDB filter into a reusable document predicate"""
+    if not query:
+        return lambda doc: True
+    shape, params = _analyze_query(query)
+    return _compile_shape(shape)(iter(params))
+
+def _is_operator_update(update):
+    keys = list(update)
+    if keys and all(key.startswith('$') for key in keys):
+        return True
+    if any(key.startswith('$') for key in keys):
+        raise WriteError("Update document mixes operators and plain fields")
+    return False
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class _UpdateTarget:
+    """
+    Applies update operators to a document without touching it: each
+    changed top-level field is copied on first write, and the result is
+    a dict of top-level field -> new value (_MISSING for removed fields)
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self.changes = {}
+    
+    def get(self, path):
+        top, _, rest = path.partition('.')
+        value = self.changes[top] if top in self.changes else self.doc.get(top, _MISSING)
+        if rest and value is not _MISSING:
+            for part in rest.split('.'):
+                if isinstance(value, dict) and part in value:
+                    value = value[part]
+                elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+                    value = value[int(part)]
+                else:
+                    return _MISSING
+        return value
+    
+    def set(self, path, value):
+        top, _, rest = path.partition('.')
+        if not rest:
+            self.changes[top] = value
+            return
+        if top not in self.changes:
+            current = self.doc.get(top, _MISSING)
+            self.changes[top] = {} if current is _MISSING else _copy_doc(current)
+        container = self.changes[top]
+        parts = rest.split('.')
+        for part in parts[:-1]:
+            container = self._child(container, part, path)
+        self._assign(container, parts[-1], value, path)
+    
+    def unset(self, path):
+        top, _, rest = path.partition('.')
+        if not rest:
+            if top in self.doc or top in self.changes:
+                self.changes[top] = _MISSING
+            return
+        if self.get(path) is _MISSING:
+            return
+        if top not in self.changes:
+            self.changes[top] = _copy_doc(self.doc[top])
+        container = self.changes[top]
+        parts = rest.split('.')
+        for part in parts[:-1]:
+            container = container[int(part)] if isinstance(container, list) else container[part]
+        if isinstance(container, list):
+            # Like MongoDB, unsetting an array element leaves a null in its place
+            container[int(parts[-1])] = None
+        else:
+            del container[parts[-1]]
+    
+    @staticmethod
+    def _child(container, part, path):
+        if isinstance(container, list):
+            if not part.isdigit():
+                raise WriteError(f"Cannot create field '{part}' in array for path '{path}'")
+            index = int(part)
+            while len(container) <= index:
+                container.append(None)
+            if container[index] is None:
+                container[index] = {}
+            return container[index]
+        if not isinstance(container, dict):
+            raise WriteError(f"Cannot create field '{part}' in a non-document value for path '{path}'")
+        return container.setdefault(part, {})
+    
+    @staticmethod
+    def _assign(container, part, value, path):
+        if isinstance(container, list):
+            if not part.isdigit():
+                raise WriteError(f"Cannot create field '{part}' in array for path '{path}'")
+            index = int(part)
+            while len(container) <= index:
+                container.append(None)
+            container[index] = value
+        elif isinstance(container, dict):
+            container[part] = value
+        else:
+            raise WriteError(f"Cannot create field '{part}' in a non-document value for path '{path}'")
+
+def _each(value):
+    """Items added by $push/$addToSet, honouring the $each modifier"""
+    if isinstance(value, dict) and '$each' in value:
+        return list(value['$each'])
+    return [value]
+
+def _array_at(target, path, op):
+    current = target.get(path)
+    if current is _MISSING:
+        return []
+    if not isinstance(current, list):
+        raise WriteError(f"The field '{path}' must be an array to apply {op}")
+    return list(current)
+
+def _apply_update(doc, update, inserting=False):
+    """
+    Top-level field changes that an operator update makes to doc. Removed
+    fields map to _MISSING. $setOnInsert only applies when inserting.
+    """
+    target = _UpdateTarget(doc)
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        if not isinstance(fields, dict):
+            raise WriteError(f"Modifiers operate on fields but we found type {type(fields).__name__} instead")
+        for path, value in fields.items():
+            if op in ('$set', '$setOnInsert'):
+                target.set(path, _copy_doc(value))
+            elif op == '$unset':
+                target.unset(path)
+            elif op == '$inc':
+                current = target.get(path)
+                if not _numeric(value):
+                    raise WriteError(f"Cannot increment with non-numeric argument: {{{path}: {value!r}}}")
+                if current is _MISSING:
+                    target.set(path, value)
+                elif not _numeric(current):
+                    raise WriteError(f"Cannot apply $inc to a value of non-numeric type. {{_id: {doc.get('_id')!r}}} has the field '{path}' of non-numeric type {type(current).__name__}")
+                else:
+                    target.set(path, current + value)
+            elif op == '$push':
+                items = _array_at(target, path, op) + _copy_doc(_each(value))
+                if isinstance(value, dict) and '$slice' in value:
+                    n = value['$slice']
+                    items = items[n:] if n < 0 else items[:n]
+                target.set(path, items)
+            elif op == '$addToSet':
+                items = _array_at(target, path, op)
+                for item in _each(value):
+                    if not any(_same_value(item, existing) for existing in items):
+                        items.append(_copy_doc(item))
+                target.set(path, items)
+            else:
+                raise WriteError(f"Unknown modifier: {op}. Expected a valid update modifier")
+    return target.changes
+
+def _upsert_base(query):
+    """Fields an upsert copies from the filter: its top-level equality clauses"""
+    base = {}
+    for key, value in (query or {}).items():
+        if key.startswith('$') or '.' in key:
+            continue
+        if isinstance(value, dict) and any(k.startswith('$') for k in value):
+            if '$eq' in value:
+                base[key] = _copy_doc(value['$eq'])
+            continue
+        base[key] = _copy_doc(value)
+    return base
+
+def _index_spec(keys):
+    """Normalize an index key specification to a list of (field, direction)"""
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return list(keys)
+
+def _index_name(keys):
+    """The default name MongoDB gives an index"""
+    return '_'.join(f"{k}_{d}" for k, d in keys)
+
+# Called as hook(command, collection, duration_ms, failed, document) after
+# each mock command, mirroring what a pymongo CommandListener sees;
+# document is the command as MongoDB would receive it ({'find': name,
+# 'filter': ..., 'sort': ...}), so it can be logged or explained
+_command_hooks = []
+_command_depth = threading.local()
+
+def add_command_hook(hook):
+    if hook not in _command_hooks:
+        _command_hooks.append(hook)
+
+def remove_command_hook(hook):
+    if hook in _command_hooks:
+        _command_hooks.remove(hook)
+
+def _emit(command, collection, duration_ms, failed=False, document=None):
+    for hook in _command_hooks:
+        hook(command, collection, duration_ms, failed, document)
+
+def _command(name, document=None):
+    """
+    Time a MockCollection method as one database command. Commands issued
+    from inside another (bulk_write's updates, say) are not reported twice.
+    `document(*args, **kwargs)` gives the command's body from the method's
+    arguments.
+    """
+    def decorate(method):
+        @wraps(method)
+        def timed(self, *args, **kwargs):
+            if not _command_hooks or getattr(_command_depth, 'value', 0):
+                return method(self, *args, **kwargs)
+            _command_depth.value = 1
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = method(self, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _command_depth.value = 0
+                body = document(*args, **kwargs) if document is not None else {}
+                _emit(name, self.collection_name, (time.perf_counter() - started) * 1000, failed,
+                      {name: self.collection_name, **body})
+        return timed
+    return decorate
+
+def _find_command(query=None, projection=None, *args, **kwargs):
+    document = {'filter': query or {}, 'limit': 1}
+    if projection:
+        document['projection'] = projection
+    return document
+
+def _count_command(query=None):
+    return {'pipeline': [{'$match': query or {}}, {'$group': {'_id': 1, 'n': {'$sum': 1}}}]}
+
+def _update_command(multi):
+    def document(query, update=None, upsert=False, **kwargs):
+        return {'updates': [{'q': query, 'u': update or kwargs.get('replacement'), 'multi': multi,
+                             'upsert': upsert}]}
+    return document
+
+def _find_and_modify_command(query, update=None, projection=None, sort=None, upsert=False, **kwargs):
+    return {'query': query, 'update': update, 'sort': dict(sort) if sort else None, 'upsert': upsert}
+
+def _find_and_remove_command(query, projection=None, sort=None, **kwargs):
+    return {'query': query, 'remove': True, 'sort': dict(sort) if sort else None}
+
+def _delete_command(limit):
+    return lambda query: {'deletes': [{'q': query, 'limit': limit}]}
+
+# Documents examined by queries (index or collection scans), per thread
+_examined = threading.local()
+
+def _count_examined(n):
+    _examined.count = getattr(_examined, 'count', 0) + n
+
+def docs_examined():
+    """Documents the current thread's queries have examined so far"""
+    return getattr(_examined, 'count', 0)
 
 class MockCollection:
     def __init__(self, collection_name):
         self.collection_name = collection_name
-        self.data = _mock_data.get(collection_name, [])
+        self.store = _get_store(collection_name)
+    
+    @property
+    def data(self):
+        """All stored documents, in insertion order"""
+        with self.store.lock.read():
+            return list(self.store.docs.values())
+    
+    def _find_docs(self, query, sort=None):
+        """Yield stored documents matching the query, using indexes where possible"""
+        matches = _compile_query(query)
+        examined = 0
+        try:
+            for doc in self.store.plan(query, sort).docs:
+                examined += 1
+                if matches(doc):
+                    yield doc
+        finally:
+            _count_examined(examined)
     
-    def find_one(self, query=None, *args, **kwargs):
+    @_command('createIndexes')
+    def create_index(self, keys, unique=False, name=None, sparse=False, **kwargs):
+        """
+        Create an index. `[(field, 'hashed')]` builds a hash index for
+        equality lookups; any other spec builds a sorted (compound) index
+        serving equality prefixes, a range on the next field and sorts.
+        A sparse index still holds every document; it only lets documents
+        without its fields past a unique check.
+        """
+        keys = _index_spec(keys)
+        if name is None:
+            name = _index_name(keys)
+        return self.store.create_index(keys, unique=unique, name=name, sparse=sparse)
+    
+    @_command('createIndexes')
+    def create_indexes(self, indexes):
+        """Create several indexes from pymongo IndexModels; returns their names"""
+        names = []
+        for model in indexes:
+            document = model.document
+            names.append(self.create_index(
+                list(document['key'].items()), unique=document.get('unique', False), name=document['name'],
+                sparse=document.get('sparse', False)
+            ))
+        return names
+    
+    @_command('dropIndexes')
+    def drop_index(self, index_or_name):
+        """Drop an index by name or key specification"""
+        if index_or_name == '_id_':
+            raise OperationFailure("cannot drop _id index", code=72)
+        name = index_or_name if isinstance(index_or_name, str) else _index_name(_index_spec(index_or_name))
+        self.store.drop_index(name)
+    
+    @_command('dropIndexes')
+    def drop_indexes(self):
+        """Drop every index except the one on _id"""
+        for name in list(self.store.indexes):
+            self.store.drop_index(name)
+    
+    def list_indexes(self):
+        """Index documents in the server's format, starting with _id_"""
+        yield {'v': 2, 'key': {'_id': 1}, 'name': '_id_'}
+        with self.store.lock.read():
+            specs = self.store.index_specs()
+        for spec in specs:
+            document = {'v': 2, 'key': dict(spec['keys']), 'name': spec['name']}
+            if spec['unique']:
+                document['unique'] = True
+            if spec.get('sparse'):
+                document['sparse'] = True
+            yield document
+    
+    @_command('listIndexes')
+    def index_information(self):
+        """Indexes by name, as {'key': [(field, direction), ...], 'unique': ...}"""
+        info = {}
+        for document in self.list_indexes():
+            details = {k: v for k, v in document.items() if k not in ('name', 'key')}
+            details['key'] = list(document['key'].items())
+            info[document['name']] = details
+        return info
+    
+    def options(self):
+        """Options the collection was created with"""
+        return dict(self.store.options)
+    
+    @_command('find', _find_command)
+    def find_one(self, query=None, projection=None, *args, **kwargs):
         """Find a single document matching the query"""
-        if not query:
-            return self.data[0] if self.data else None
-        
-        for doc in self.data:
-            matches = True
-            for key, value in query.items():
-                if key == '_id' and isinstance(value, str):
-                    value = ObjectId(value)
-                
-                if key not in doc:
-                    matches = False
-                    break
-                
-                if isinstance(value, dict):
-                    # Handle comparison operators like $gte, $lte
-                    if '$gte' in value and doc[key] < value['$gte']:
-                        matches = False
-                        break
-                    if '$lte' in value and doc[key] > value['$lte']:
-                        matches = False
-                        break
-                elif doc[key] != value:
-                    matches = False
-                    break
-            
-            if matches:
-                return doc
+        for doc in self._find_docs(query):
+            return _projected_copy(doc, projection)
         
         return None
     
+    @_command('aggregate', _count_command)
     def count_documents(self, query=None):
         """Count documents matching the query"""
         if not query:
-            return len(self.data)
+            return len(self.store.docs)
         
-        count = 0
-        for doc in self.data:
-            matches = True
-            for key, value in query.items():
-                if key == '_id' and isinstance(value, str):
-                    value = ObjectId(value)
-                
-                if key not in doc:
-                    matches = False
-                    break
-                
-                if isinstance(value, dict):
-                    # Handle comparison operators like $gte, $lte
-                    if '$gte' in value and doc[key] < value['$gte']:
-                        matches = False
-                        break
-                    if '$lte' in value and doc[key] > value['$lte']:
-                        matches = False
-                        break
-                elif doc[key] != value:
-                    matches = False
-                    break
-            
-            if matches:
-                count += 1
-        
-        return count
+        return sum(1 for _ in self._find_docs(query))
     
-    def find(self, query=None, *args, **kwargs):
+    @_command('count', lambda **kwargs: {})
+    def estimated_document_count(self, **kwargs):
+        """Number of documents in the collection, without looking at them"""
+        return len(self.store.docs)
+    
+    def find(self, query=None, projection=None, *args, **kwargs):
         """Find documents matching the query"""
-        if not query:
-            return MockCursor(self.data)
-        
-        results = []
-        for doc in self.data:
-            matches = True
-            for key, value in query.items():
-                if key == '_id' and isinstance(value, str):
-                    value = ObjectId(value)
-                
-                if key not in doc:
-                    matches = False
-                    break
-                
-                if isinstance(value, dict):
-                    # Handle comparison operators like $gte, $lte
-                    if '$gte' in value and doc[key] < value['$gte']:
-                        matches = False
-                        break
-                    if '$lte' in value and doc[key] > value['$lte']:
-                        matches = False
-                        break
-                elif doc[key] != value:
-                    matches = False
-                    break
-            
-            if matches:
-                results.append(doc)
-        
-        return MockCursor(results)
+        return MockCursor(self, query, projection)
     
+    @_command('distinct', lambda field: {'key': field})
     def distinct(self, field):
         """Get distinct values for a field"""
         values = set()
@@ -198,102 +1539,262 @@ class MockCollection:
                     values.add(doc[field])
         return list(values)
     
+    @_command('insert')
     def insert_one(self, document):
         """Insert a document"""
         if '_id' not in document:
             document['_id'] = ObjectId()
         
-        self.data.append(document)
-        _mock_data[self.collection_name] = self.data
+        self.store.insert(_copy_doc(document))
         
         return MockResult(document['_id'])
     
-    def update_one(self, query, update, upsert=False):
-        """Update a document"""
-        if '$set' in update:
-            update_data = update['$set']
+    def _insert_batch(self, documents, ordered=True):
+        for document in documents:
+            if '_id' not in document:
+                document['_id'] = ObjectId()
+        return self.store.insert_many([_copy_doc(document) for document in documents], ordered)
+    
+    @_command('insert')
+    def insert_many(self, documents, ordered=True):
+        """Insert documents in one batch, maintaining each index once"""
+        documents = list(documents)
+        inserted, errors = self._insert_batch(documents, ordered)
+        if errors:
+            raise BulkWriteError(_bulk_details(
+                [(i, e, documents[i]) for i, e in errors], n_inserted=len(inserted)
+            ))
+        return MockResult(inserted_ids=[document['_id'] for document in documents])
+    
+    @staticmethod
+    def _changes(doc, update, inserting=False):
+        """Field changes an update makes to doc; plain documents are merged in"""
+        if _is_operator_update(update):
+            return _apply_update(doc, update, inserting)
+        return _copy_doc(update)
+    
+    def _update_doc(self, doc, update):
+        """Apply an update to a stored document; returns the new document, or None if unchanged"""
+        changes = self._changes(doc, update)
+        if all(_same_value(doc.get(key, _MISSING), value) for key, value in changes.items()):
+            return None
+        return self.store.update(doc, changes)
+    
+    def _upsert(self, query, update):
+        """Insert the document an update with upsert=True creates when nothing matches"""
+        if _is_operator_update(update):
+            new_doc = _upsert_base(query)
+            for key, value in _apply_update(new_doc, update, inserting=True).items():
+                if value is _MISSING:
+                    new_doc.pop(key, None)
+                else:
+                    new_doc[key] = value
         else:
-            update_data = update
+            new_doc = {**query, **update}
+        if '_id' not in new_doc:
+            new_doc['_id'] = ObjectId()
         
-        for i, doc in enumerate(self.data):
-            matches = True
-            for key, value in query.items():
-                if key == '_id' and isinstance(value, str):
-                    value = ObjectId(value)
-                
-                if key not in doc:
-                    matches = False
-                    break
-                
-                if doc[key] != value:
-                    matches = False
-                    break
+        self.store.insert(_copy_doc(new_doc))
+        
+        return new_doc
+    
+    @_command('update', _update_command(multi=False))
+    def update_one(self, query, update, upsert=False):
+        """Update a document"""
+        with self.store.lock.write():
+            for doc in self._find_docs(query):
+                modified = self._update_doc(doc, update) is not None
+                return MockResult(None, int(modified), matched_count=1)
             
-            if matches:
-                for key, value in update_data.items():
-                    doc[key] = value
-                
-                _mock_data[self.collection_name][i] = doc
-                return MockResult(None, 1)
+            # If no document matches and upsert is True, insert
+            if upsert:
+                return MockResult(None, 0, 0, self._upsert(query, update)['_id'])
         
-        # If no document matches and upsert is True, insert
-        if upsert:
-            new_doc = {**query, **update_data}
-            if '_id' not in new_doc:
-                new_doc['_id'] = ObjectId()
+        return MockResult(None, 0)
+    
+    @_command('update', _update_command(multi=True))
+    def update_many(self, query, update, upsert=False):
+        """Update every matching document in one batch"""
+        with self.store.lock.write():
+            docs = list(self._find_docs(query))
+            if docs:
+                updates = []
+                for doc in docs:
+                    changes = self._changes(doc, update)
+                    if not all(_same_value(doc.get(key, _MISSING), value) for key, value in changes.items()):
+                        updates.append((doc, changes))
+                updated, errors = self.store.update_many(updates)
+                if errors:
+                    raise errors[0][1]
+                return MockResult(None, len(updated), matched_count=len(docs))
             
-            self.data.append(new_doc)
-            _mock_data[self.collection_name] = self.data
+            if upsert:
+                return MockResult(None, 0, 0, self._upsert(query, update)['_id'])
+        
+        return MockResult(None, 0)
+    
+    @_command('findAndModify', _find_and_modify_command)
+    def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        """
+        Atomically update the first matching document (in sort order) and
+        return it as it was before the update, or after it with
+        return_document=ReturnDocument.AFTER
+        """
+        if not _is_operator_update(update):
+            raise ValueError("update only works with $ operators")
+        with self.store.lock.write():
+            cursor = MockCursor(self, query)
+            if sort:
+                cursor.sort(sort)
+            for doc in cursor.limit(1)._documents():
+                new_doc = self._update_doc(doc, update) or doc
+                result = new_doc if return_document == ReturnDocument.AFTER else doc
+                break
+            else:
+                if not upsert:
+                    return None
+                new_doc = self._upsert(query, update)
+                if return_document != ReturnDocument.AFTER:
+                    return None
+                result = new_doc
+        return _projected_copy(result, projection)
+    
+    @_command('findAndModify', _find_and_remove_command)
+    def find_one_and_delete(self, query, projection=None, sort=None, **kwargs):
+        """Atomically delete the first matching document (in sort order) and return it"""
+        with self.store.lock.write():
+            cursor = MockCursor(self, query)
+            if sort:
+                cursor.sort(sort)
+            for doc in cursor.limit(1)._documents():
+                self.store.remove(doc)
+                return _projected_copy(doc, projection)
+        return None
+    
+    @_command('update', _update_command(multi=False))
+    def replace_one(self, query, replacement, upsert=False):
+        """Replace a document"""
+        with self.store.lock.write():
+            for doc in self._find_docs(query):
+                self.store.update(doc, _copy_doc(replacement), replace=True)
+                return MockResult(None, 1)
             
-            return MockResult(None, 0, 0, new_doc['_id'])
+            if upsert:
+                new_doc = self._upsert({k: v for k, v in query.items() if k == '_id'}, replacement)
+                return MockResult(None, 0, 0, new_doc['_id'])
         
         return MockResult(None, 0)
     
+    @_command('delete', _delete_command(1))
     def delete_one(self, query):
         """Delete a document"""
-        for i, doc in enumerate(self.data):
-            matches = True
-            for key, value in query.items():
-                if key == '_id' and isinstance(value, str):
-                    value = ObjectId(value)
-                
-                if key not in doc:
-                    matches = False
-                    break
-                
-                if doc[key] != value:
-                    matches = False
-                    break
-            
-            if matches:
-                del self.data[i]
-                _mock_data[self.collection_name] = self.data
+        with self.store.lock.write():
+            for doc in self._find_docs(query):
+                self.store.remove(doc)
                 return MockResult(None, 0, 1)
         
         return MockResult(None, 0, 0)
     
-    def aggregate(self, pipeline):
-        """Simple mock for aggregation"""
-        if self.collection_name == 'users' and len(pipeline) > 0 and '$group' in pipeline[0]:
-            # Mock for user subscription distribution
-            return [
-                {"_id": "free", "count": 5},
-                {"_id": "premium", "count": 2},
-                {"_id": "admin", "count": 1}
-            ]
+    @_command('delete', _delete_command(0))
+    def delete_many(self, query):
+        """Delete every matching document in one batch"""
+        with self.store.lock.write():
+            docs = list(self._find_docs(query))
+            self.store.remove_many(docs)
         
-        return []
+        return MockResult(None, 0, len(docs))
+    
+    @_command('bulkWrite')
+    def bulk_write(self, requests, ordered=True):
+        """
+        Run a list of pymongo write operations (InsertOne, UpdateOne,
+        UpdateMany, ReplaceOne, DeleteOne, DeleteMany) under one write
+        lock. Consecutive inserts are applied as a single batch.
+        """
+        requests = list(requests)
+        result = MockBulkWriteResult()
+        write_errors = []
+        with self.store.lock.write():
+            i = 0
+            while i < len(requests):
+                request = requests[i]
+                if isinstance(request, InsertOne):
+                    j = i
+                    while j < len(requests) and isinstance(requests[j], InsertOne):
+                        j += 1
+                    documents = [r._doc for r in requests[i:j]]
+                    inserted, errors = self._insert_batch(documents, ordered)
+                    result.inserted_count += len(inserted)
+                    write_errors.extend((i + k, e, documents[k]) for k, e in errors)
+                    i = j
+                else:
+                    try:
+                        self._apply_request(request, result, i)
+                    except (DuplicateKeyError, WriteError, OperationFailure) as e:
+                        write_errors.append((i, e, request))
+                    i += 1
+                if write_errors and ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError(_bulk_details(write_errors, **result.counts()))
+        return result
+    
+    def _apply_request(self, request, result, position):
+        if isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+            if isinstance(request, UpdateOne):
+                outcome = self.update_one(request._filter, request._doc, upsert=request._upsert)
+            elif isinstance(request, UpdateMany):
+                outcome = self.update_many(request._filter, request._doc, upsert=request._upsert)
+            else:
+                outcome = self.replace_one(request._filter, request._doc, upsert=request._upsert)
+            result.matched_count += outcome.matched_count
+            result.modified_count += outcome.modified_count
+            if outcome.upserted_id is not None:
+                result.upserted_ids[position] = outcome.upserted_id
+        elif isinstance(request, (DeleteOne, DeleteMany)):
+            if isinstance(request, DeleteOne):
+                outcome = self.delete_one(request._filter)
+            else:
+                outcome = self.delete_many(request._filter)
+            result.deleted_count += outcome.deleted_count
+        else:
+            raise TypeError(f"{request!r} is not a valid request")
+    
+    @_command('aggregate', lambda pipeline, **kwargs: {'pipeline': pipeline})
+    def aggregate(self, pipeline, **kwargs):
+        """Run an aggregation pipeline, streaming documents through its stages"""
+        from app.utils.mock_aggregation import run_pipeline
+        results = run_pipeline(self, pipeline)
+        if _command_hooks:
+            # Like the server, do the work inside the timed command
+            results = iter(list(results))
+        return results
 
 class MockCursor:
-    def __init__(self, documents):
-        self.documents = documents
+    """
+    Lazily evaluated cursor. Nothing runs until the first document is
+    requested; sort+limit keeps a bounded heap of skip+limit documents
+    instead of sorting the whole result, and documents are copied out in
+    batch_size chunks (only their projected fields, given a projection).
+    """
+    def __init__(self, collection, query=None, projection=None):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
         self.current_sort = None
         self.current_limit = None
         self.current_skip = 0
+        self.current_batch_size = 0
+        self.docs_examined = 0
+        self._iterator = None
     
-    def sort(self, field, direction):
-        """Sort the documents"""
-        self.current_sort = (field, direction)
+    def sort(self, key, direction=1):
+        """Sort the documents by a field or a [(field, direction), ...] spec"""
+        if isinstance(key, str):
+            self.current_sort = [(key, direction)]
+        else:
+            self.current_sort = list(key)
         return self
     
     def limit(self, n):
@@ -306,47 +1807,213 @@ class MockCursor:
         self.current_skip = n
         return self
     
+    def batch_size(self, n):
+        """Number of documents copied out of the store at a time"""
+        self.current_batch_size = n
+        return self
+    
     def __iter__(self):
-        """Return iterator for documents"""
-        documents = self.documents
-        
-        # Apply sort if specified
+        return self
+    
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = self._batches()
+        return next(self._iterator)
+    
+    next = __next__
+    
+    def close(self):
+        """Discard any remaining results"""
+        self._iterator = iter(())
+    
+    def _batches(self):
+        documents = self._documents()
+        size = self.current_batch_size or 101
+        command = 'find'
+        while True:
+            started = time.perf_counter()
+            batch = [_projected_copy(doc, self.projection) for doc in islice(documents, size)]
+            if _command_hooks and not getattr(_command_depth, 'value', 0):
+                # Each batch is one round trip: find, then getMore
+                _emit(command, self.collection.collection_name, (time.perf_counter() - started) * 1000,
+                      document=self._command_document(command))
+                command = 'getMore'
+            yield from batch
+            if len(batch) < size:
+                # A short batch means the cursor is exhausted
+                return
+    
+    def _command_document(self, command):
+        name = self.collection.collection_name
+        if command == 'getMore':
+            return {'getMore': 0, 'collection': name}
+        document = {'find': name, 'filter': self.query or {}}
+        if self.projection:
+            document['projection'] = self.projection
         if self.current_sort:
-            field, direction = self.current_sort
-            documents = sorted(documents, key=lambda x: x.get(field, None), reverse=(direction < 0))
+            document['sort'] = dict(self.current_sort)
+        if self.current_skip:
+            document['skip'] = self.current_skip
+        if self.current_limit:
+            document['limit'] = self.current_limit
+        return document
+    
+    def _examine(self, docs):
+        start = self.docs_examined
+        try:
+            for doc in docs:
+                self.docs_examined += 1
+                yield doc
+        finally:
+            _count_examined(self.docs_examined - start)
+    
+    def _documents(self, plan=None):
+        """Matching stored documents in cursor order (not copied)"""
+        if plan is None:
+            plan = self.collection.store.plan(self.query, self.current_sort)
+        documents = filter(_compile_query(self.query), self._examine(plan.docs))
         
-        # Apply skip
-        if self.current_skip > 0:
-            documents = documents[self.current_skip:]
+        start = self.current_skip
+        stop = start + self.current_limit if self.current_limit else None
         
-        # Apply limit
-        if self.current_limit is not None:
-            documents = documents[:self.current_limit]
+        # Sort unless the chosen index already yields documents in order
+        if self.current_sort and not plan.sorted:
+            key = _sort_spec_key(self.current_sort)
+            if stop is not None:
+                # Top-k: O(n log k), holding only skip+limit documents
+                documents = iter(nsmallest(stop, documents, key=key))
+            else:
+                documents = iter(sorted(documents, key=key))
         
-        return iter(documents)
+        return islice(documents, start, stop)
+    
+    def count(self, with_limit_and_skip=False):
+        """Number of matching documents (ignores skip/limit unless asked)"""
+        if not with_limit_and_skip:
+            return self.collection.count_documents(self.query or {})
+        return sum(1 for _ in self._documents())
+    
+    def explain(self):
+        """Execute the query and describe how it was answered, like MongoDB's explain()"""
+        store = self.collection.store
+        plan = store.plan(self.query, self.current_sort)
+        self.docs_examined = 0
+        started = time.perf_counter()
+        returned = sum(1 for _ in self._documents(plan))
+        elapsed = time.perf_counter() - started
+        
+        if plan.index is None:
+            stage = {'stage': 'COLLSCAN', 'filter': self.query or {}, 'direction': 'forward'}
+        else:
+            stage = {'stage': 'FETCH', 'inputStage': {'stage': 'IDHACK' if plan.index == '_id_' else 'IXSCAN',
+                                                      'indexName': plan.index}}
+        if self.current_sort and not plan.sorted:
+            stage = {'stage': 'SORT', 'sortPattern': dict(self.current_sort),
+                     'limitAmount': self.current_limit or 0, 'inputStage': stage}
+        if self.current_skip:
+            stage = {'stage': 'SKIP', 'skipAmount': self.current_skip, 'inputStage': stage}
+        if self.current_limit:
+            stage = {'stage': 'LIMIT', 'limitAmount': self.current_limit, 'inputStage': stage}
+        
+        return {
+            'queryPlanner': {
+                'namespace': f"mock.{store.name}",
+                'parsedQuery': self.query or {},
+                'winningPlan': stage,
+            },
+            'executionStats': {
+                'nReturned': returned,
+                'executionTimeMillis': round(elapsed * 1000, 3),
+                'totalKeysExamined': 0 if plan.index is None else self.docs_examined,
+                'totalDocsExamined': self.docs_examined,
+            },
+        }
 
 class MockResult:
-    def __init__(self, inserted_id=None, modified_count=0, deleted_count=0, upserted_id=None):
+    def __init__(self, inserted_id=None, modified_count=0, deleted_count=0, upserted_id=None,
+                 inserted_ids=None, matched_count=None):
         self.inserted_id = inserted_id
+        self.inserted_ids = inserted_ids
+        self.matched_count = modified_count if matched_count is None else matched_count
         self.modified_count = modified_count
         self.deleted_count = deleted_count
         self.upserted_id = upserted_id
 
-class MockMongoDB:
+class MockBulkWriteResult:
     def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_ids = {}
+    
+    @property
+    def upserted_count(self):
+        return len(self.upserted_ids)
+    
+    def counts(self):
+        return {
+            'n_inserted': self.inserted_count,
+            'n_matched': self.matched_count,
+            'n_modified': self.modified_count,
+            'n_removed': self.deleted_count,
+            'upserted': self.upserted_ids,
+        }
+
+def _bulk_details(errors, n_inserted=0, n_matched=0, n_modified=0, n_removed=0, upserted=None):
+    """The error document pymongo attaches to a BulkWriteError"""
+    return {
+        'writeErrors': [
+            {'index': i, 'code': getattr(e, 'code', None) or (11000 if isinstance(e, DuplicateKeyError) else 2),
+             'errmsg': str(e), 'op': op}
+            for i, e, op in errors
+        ],
+        'writeConcernErrors': [],
+        'nInserted': n_inserted,
+        'nUpserted': len(upserted or {}),
+        'nMatched': n_matched,
+        'nModified': n_modified,
+        'nRemoved': n_removed,
+        'upserted': [{'index': i, '_id': _id} for i, _id in (upserted or {}).items()],
+    }
+
+class MockMongoDB:
+    def __init__(self, path=None, **store_options):
         self.collections = {}
+        if path:
+            # Persist to disk: reload the last snapshot and log every write
+            from app.utils.mock_store import attach
+            attach(path, **store_options)
     
     def __getattr__(self, name):
-        if name not in self.collections:
-            self.collections[name] = MockCollection(name)
-        return self.collections[name]
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections.setdefault(name, MockCollection(name))
+        return collection
 
     def command(self, cmd):
         """Mock for database commands"""
+        if _command_hooks:
+            name = cmd if isinstance(cmd, str) else next(iter(cmd))
+            _emit(name, None, 0.0, document={name: 1} if isinstance(cmd, str) else cmd)
         if cmd == "serverStatus":
             return {"version": "5.0.0-mock"}
         return {}
     
+    def create_collection(self, name, capped=False, size=None, max=None, **kwargs):
+        """
+        Create an (empty) collection. A capped collection keeps its newest
+        `max` documents, dropping the oldest on insert (`size` is recorded
+        but not enforced).
+        """
+        if name in _mock_data or name in _pending_fixtures:
+            raise CollectionInvalid(f"collection {name} already exists")
+        collection = getattr(self, name)
+        if capped:
+            collection.store.set_options({'capped': True, 'size': size, 'max': max})
+        return collection
+    
     def list_collection_names(self):
         """Return list of collection names"""
-        return list(_mock_data.keys())
\ No newline at end of file
+        return list(_mock_data.keys()) + [name for name in _pending_fixtures if name not in _mock_data]
+
@@ -0,0 +1,363 @@
+# app/utils/mock_store.py
+"""
+On-disk persistence for the mock database.
+
+The directory holds a snapshot of every collection plus an append-only
+operation log. Each write is appended to the log before it is applied in
+memory; the log is fsynced in batches (every `sync_every` records or
+`sync_interval` seconds) rather than once per write. On startup the
+snapshot is decoded in bulk and the log replayed on top of it, then a
+fresh snapshot is written so the next start does not replay again. While
+running, a log that grows past `compact_bytes` is folded into a new
+snapshot on a background thread, which bounds both the log on disk and
+the replay after a crash.
+
+Files are plain BSON documents laid end to end (each BSON document starts
+with its own length):
+
+    snapshot.bson        {'generation': n}, then per collection
+                         {'c': name, 'indexes': [...], 'options': {...}}
+                         and batches of {'c': name, 'docs': [...]}
+    oplog.NNNNNN.bson    {'o': 'i'|'u'|'d'|'x'|'r'|'c', 'c': name, 'd': ...}
+
+Records insert (i), update (u) or delete (d) a document, create (x) or
+drop (r) an index, or set a collection's options (c). Document records hold the full document after the
+write, so replay is idempotent and logs at or after the snapshot's
+generation can be replayed over it safely. Indexes are persisted as
+definitions and rebuilt on load.
+"""
+import atexit
+import os
+import re
+import struct
+import threading
+import time
+
+import bson
+
+from app.utils import mock_db
+
+SNAPSHOT_FILE = 'snapshot.bson'
+_LOG_PATTERN = re.compile(r'^oplog\.(\d{6})\.bson$')
+_BATCH_SIZE = 1000
+
+def _log_path(directory, generation):
+    return os.path.join(directory, f"oplog.{generation:06d}.bson")
+
+def _log_generations(directory):
+    generations = []
+    for filename in os.listdir(directory):
+        match = _LOG_PATTERN.match(filename)
+        if match:
+            generations.append(int(match.group(1)))
+    return sorted(generations)
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _read_records(path, truncate_torn=False):
+    """
+    Decode the BSON documents of a file. A partial record at the end (a
+    write interrupted by a crash) is dropped, and cut off the file when
+    `truncate_torn` is set so new records append after the last good one.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records = []
+    offset = 0
+    while offset + 4 <= len(data):
+        length = struct.unpack_from('<i', data, offset)[0]
+        if length < 5 or offset + length > len(data):
+            break
+        try:
+            records.append(bson.decode(data[offset:offset + length]))
+        except bson.errors.InvalidBSON:
+            break
+        offset += length
+    if offset < len(data) and truncate_torn:
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+    return records
+
+class Journal:
+    """
+    Append-only operation log with batched fsync. Once the current log
+    reaches `compact_bytes`, on_full() is called (once per log, outside the
+    journal's lock) to have it compacted.
+    """
+    def __init__(self, directory, generation, sync_every=1000, sync_interval=1.0,
+                 compact_bytes=None, on_full=None):
+        self.directory = directory
+        self.generation = generation
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.on_full = on_full
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.file = self._open(generation)
+        self.size = self.file.tell()
+
+    def _open(self, generation):
+        # Unbuffered: every record reaches the OS as soon as it is written,
+        # so only a power loss (not a crashed process) can lose unsynced writes
+        return open(_log_path(self.directory, generation), 'ab', buffering=0)
+
+    def record(self, op, collection, doc):
+        data = bson.encode({'o': op, 'c': collection, 'd': doc})
+        with self.lock:
+            self.file.write(data)
+            self.pending += 1
+            if (self.pending >= self.sync_every
+                    or time.monotonic() - self.last_sync >= self.sync_interval):
+                self._sync()
+            size, self.size = self.size, self.size + len(data)
+        if self.compact_bytes and self.on_full is not None and size < self.compact_bytes <= size + len(data):
+            self.on_full()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def flush(self):
+        """Force any unsynced records to disk"""
+        with self.lock:
+            if self.pending and not self.file.closed:
+                self._sync()
+
+    def rotate(self, generation):
+        """Sync the current log and start writing to a new one"""
+        with self.lock:
+            self._sync()
+            self.file.close()
+            self.generation = generation
+            self.file = self._open(generation)
+            self.size = self.file.tell()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+def load(directory):
+    """
+    Read the persisted state of a directory. Returns a dict of collection
+    name -> (index specs, documents by _id, options) and the generation to log to
+    next, or (None, 0) if nothing has been persisted there yet.
+    """
+    snapshot = os.path.join(directory, SNAPSHOT_FILE)
+    generations = _log_generations(directory)
+    if not os.path.exists(snapshot) and not generations:
+        return None, 0
+
+    collections = {}
+    generation = 0
+    if os.path.exists(snapshot):
+        records = _read_records(snapshot)
+        if records:
+            generation = records[0].get('generation', 0)
+        for record in records[1:]:
+            specs, docs, options = collections.setdefault(record['c'], ([], {}, {}))
+            if 'indexes' in record:
+                specs.extend(record['indexes'])
+            options.update(record.get('options', {}))
+            for doc in record.get('docs', ()):
+                docs[doc['_id']] = doc
+
+    replayed = 0
+    for log_generation in generations:
+        if log_generation < generation:
+            continue
+        for record in _read_records(_log_path(directory, log_generation), truncate_torn=True):
+            specs, docs, options = collections.setdefault(record['c'], ([], {}, {}))
+            op, doc = record['o'], record['d']
+            if op in ('i', 'u'):
+                docs[doc['_id']] = doc
+            elif op == 'd':
+                docs.pop(doc['_id'], None)
+            elif op == 'x' and all(spec['name'] != doc['name'] for spec in specs):
+                specs.append(doc)
+            elif op == 'r':
+                specs[:] = [spec for spec in specs if spec['name'] != doc['name']]
+            elif op == 'c':
+                options.clear()
+                options.update(doc)
+            replayed += 1
+    next_generation = max([generation] + generations) + (1 if replayed else 0)
+    return collections, next_generation
+
+class SnapshotWriter:
+    """
+    Streams collections into a new snapshot file, which replaces the
+    current one atomically (temp file, fsync, rename) on commit
+    """
+    def __init__(self, directory, generation):
+        self.directory = directory
+        self.generation = generation
+        self.path = os.path.join(directory, SNAPSHOT_FILE)
+        self.tmp_path = self.path + '.tmp'
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(bson.encode({'generation': generation}))
+
+    def write_indexes(self, collection, index_specs, options=None):
+        record = {'c': collection, 'indexes': index_specs}
+        if options:
+            record['options'] = options
+        self.file.write(bson.encode(record))
+
+    def write(self, collection, docs):
+        for start in range(0, len(docs), _BATCH_SIZE):
+            self.file.write(bson.encode({'c': collection, 'docs': docs[start:start + _BATCH_SIZE]}))
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        _fsync_dir(self.directory)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+def next_generation(directory):
+    """A generation newer than any snapshot or log already in the directory"""
+    generations = _log_generations(directory)
+    snapshot = os.path.join(directory, SNAPSHOT_FILE)
+    if os.path.exists(snapshot):
+        with open(snapshot, 'rb') as f:
+            head = f.read(4)
+            if len(head) == 4:
+                header = bson.decode(head + f.read(struct.unpack('<i', head)[0] - 4))
+                generations.append(header.get('generation', 0))
+    return max(generations, default=0) + 1
+
+def drop_logs(directory, before):
+    """Remove the logs a snapshot of generation `before` supersedes"""
+    for old in _log_generations(directory):
+        if old < before:
+            os.remove(_log_path(directory, old))
+
+def write_snapshot(directory, generation, stores):
+    """Write a snapshot of the stores"""
+    with SnapshotWriter(directory, generation) as writer:
+        for name, store in stores.items():
+            # Stored documents are never mutated, so a list of them taken
+            # under the read lock is a consistent snapshot
+            with store.lock.read():
+                index_specs = store.index_specs()
+                options = store.options
+                docs = list(store.docs.values())
+            writer.write_indexes(name, index_specs, options)
+            writer.write(name, docs)
+
+class PersistentStore:
+    """Ties the in-memory mock collections to a directory on disk"""
+    def __init__(self, directory, sync_every=1000, sync_interval=1.0, compact_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.journal = None
+        self.compact_lock = threading.Lock()
+        self._compactor = None
+        self._compact_wanted = threading.Event()
+        self._closing = False
+
+    def open(self):
+        """Load the persisted state (or persist the current one) and start logging writes"""
+        os.makedirs(self.directory, exist_ok=True)
+        collections, generation = load(self.directory)
+        if collections is None:
+            # Persist the seeded state: fixtures must not appear later on their own
+            mock_db.load_fixtures()
+        else:
+            # The persisted state replaces the fixtures
+            mock_db.configure_fixtures('none')
+            for name in list(mock_db._mock_data):
+                if name not in collections:
+                    mock_db._get_store(name).load([])
+            for name, (specs, docs, options) in collections.items():
+                mock_db._get_store(name).load(list(docs.values()), specs, options)
+        self.journal = Journal(self.directory, generation, self.sync_every, self.sync_interval,
+                               self.compact_bytes, self._compact_in_background)
+        mock_db._journal = self.journal
+        if collections is None or self._has_older_logs(generation):
+            # First run or the log was replayed: fold it into a new snapshot
+            self.compact()
+        if self.compact_bytes:
+            self._compactor = threading.Thread(target=self._compact_loop, name='mock-db-compact', daemon=True)
+            self._compactor.start()
+        atexit.register(self.close)
+        return self
+
+    def _has_older_logs(self, generation):
+        return any(g < generation for g in _log_generations(self.directory))
+
+    def compact(self):
+        """Snapshot every collection and drop the logs it covers"""
+        with self.compact_lock:
+            generation = self.journal.generation + 1
+            # Writes from here on go to the new log; anything logged before
+            # the rotation has been applied once the snapshot takes each
+            # store's read lock, so the snapshot covers the old logs
+            self.journal.rotate(generation)
+            write_snapshot(self.directory, generation, dict(mock_db._mock_data))
+            drop_logs(self.directory, generation)
+
+    def _compact_in_background(self):
+        # Called from a write, which holds its collection's write lock: the
+        # snapshot needs every read lock, so it is taken on another thread
+        self._compact_wanted.set()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_wanted.wait()
+            self._compact_wanted.clear()
+            if self._closing:
+                return
+            self.compact()
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self._closing = True
+        if self._compactor is not None:
+            self._compact_wanted.set()
+            self._compactor.join()
+        if self.journal is not None:
+            if mock_db._journal is self.journal:
+                mock_db._journal = None
+            self.journal.close()
+
+_stores = {}
+
+def attach(directory, **options):
+    """Persist the mock database to a directory, reloading what is already there"""
+    directory = os.path.abspath(directory)
+    store = _stores.get(directory)
+    if store is None:
+        store = _stores[directory] = PersistentStore(directory, **options).open()
+    return store
@@ -0,0 +1,194 @@
+# app/utils/pagination.py
+"""
+Keyset pagination.
+
+A page is the first `limit` documents after a continuation token, in the
+order of a sort key made unique by ending it with _id. The token carries
+the sort values of the previous page's last document, and the next page
+asks for the documents strictly after them. With an index on the sort key
+(plus _id) the database seeks straight to that point, so page N costs
+what page 1 does; skip((page - 1) * per_page) walked and discarded every
+document before the page.
+
+Tokens are signed with the app's SECRET_KEY and tied to the sort they
+were made for, so clients can only hand them back.
+"""
+from datetime import datetime
+
+from bson import json_util
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from app.utils.projection import projection
+
+class InvalidPageToken(ValueError):
+    """A continuation token that was tampered with or made for another list"""
+
+def sort_with_id(sort):
+    """The sort spec as [(field, direction), ...], ending with _id"""
+    sort = [(sort, 1)] if isinstance(sort, str) else list(sort)
+    if sort[-1][0] != '_id':
+        sort.append(('_id', sort[-1][1]))
+    return sort
+
+class _TokenJSON:
+    """
+    Extended JSON for token values, except that datetimes keep their
+    microseconds: json_util stops at milliseconds, and a cursor short of
+    the stored value would repeat (ascending) or skip (descending) the
+    documents inside that millisecond
+    """
+    @staticmethod
+    def dumps(values):
+        return json_util.dumps([
+            {'$datetime': value.isoformat()} if isinstance(value, datetime) else value for value in values
+        ])
+
+    @staticmethod
+    def loads(data):
+        values = json_util.loads(data)
+        if not isinstance(values, list):
+            return values
+        return [
+            datetime.fromisoformat(value['$datetime'])
+            if isinstance(value, dict) and list(value) == ['$datetime'] else value
+            for value in values
+        ]
+
+def _serializer(sort):
+    salt = 'page:' + ','.join(f"{field}:{direction}" for field, direction in sort)
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=salt, serializer=_TokenJSON)
+
+def _value(doc, path):
+    for part in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+def encode_token(doc, sort):
+    """The token for the page after doc"""
+    return _serializer(sort).dumps([_value(doc, field) for field, _ in sort])
+
+def decode_token(token, sort):
+    """The sort values a token holds; InvalidPageToken if it is not one of ours for this sort"""
+    try:
+        values = _serializer(sort).loads(token)
+    except BadSignature:
+        raise InvalidPageToken("Invalid page token")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise InvalidPageToken("Invalid page token")
+    return values
+
+def _after(field, direction, value, nulls=True):
+    """
+    The condition for documents whose field follows `value` in the sort
+    direction, or None if nothing can. As in MongoDB, null (or missing)
+    sorts below every other value; nulls=False leaves out the nulls that
+    follow a value in descending order.
+    """
+    if value is None:
+        return {field: {'$ne': None}} if direction > 0 else None
+    if direction > 0:
+        return {field: {'$gt': value}}
+    if nulls:
+        return {'$or': [{field: {'$lt': value}}, {field: None}]}
+    return {field: {'$lt': value}}
+
+def _narrow(query, field, condition):
+    """query with condition added on field, merged into its own operators on field if they don't overlap"""
+    narrowed = dict(query or {})
+    existing = narrowed.get(field)
+    if field not in narrowed:
+        narrowed[field] = condition
+    elif (isinstance(condition, dict) and isinstance(existing, dict) and existing
+          and all(key.startswith('$') for key in existing) and not set(existing) & set(condition)):
+        narrowed[field] = {**existing, **condition}
+    else:
+        narrowed['$and'] = narrowed.get('$and', []) + [{field: condition}]
+    return narrowed
+
+def after_query(query, sort, values, nulls=True):
+    """
+    query narrowed to the documents after `values` in sort order. Besides
+    the exact condition (an $or over the key's prefixes) the leading field
+    gets a plain range where it can, which is what lets an index seek to
+    the page. Null sort values order lowest, as in MongoDB: they come
+    first in ascending order and last in descending order, where a range
+    on the leading field can't include them, so it is only added with
+    nulls=False (for which keyset_page fetches the nulls separately).
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i], nulls or i > 0)
+        if after is not None:
+            branches.append({**{prefix: values[j] for j, (prefix, _) in enumerate(sort[:i])}, **after})
+
+    leading, direction = sort[0]
+    narrowed = dict(query or {})
+    if values[0] is None:
+        if direction < 0:
+            # Only nulls follow a null in descending order
+            narrowed = _narrow(narrowed, leading, None)
+    elif direction > 0 or not nulls:
+        narrowed = _narrow(narrowed, leading, {'$gte' if direction > 0 else '$lte': values[0]})
+    if '$or' in narrowed:
+        narrowed['$and'] = narrowed.get('$and', []) + [{'$or': branches}]
+    else:
+        narrowed['$or'] = branches
+    return narrowed
+
+def keyset_cursor(collection, query, sort, token=None, fields=None):
+    """
+    A cursor over the documents matching query that follow `token` in sort
+    order; with `fields`, only those (and the sort key) are read
+    """
+    sort = sort_with_id(sort)
+    if token:
+        query = after_query(query, sort, decode_token(token, sort))
+    return collection.find(query, projection(fields, [field for field, _ in sort])).sort(sort)
+
+def keyset_page(collection, query, sort, limit, token=None, fields=None):
+    """
+    (documents, next_token): up to `limit` documents of collection matching
+    query, following `token` in sort order (_id is added as the last key).
+    next_token is None on the last page.
+    """
+    sort = sort_with_id(sort)
+    keep = projection(fields, [field for field, _ in sort])
+    def fetch(narrowed, n):
+        return list(collection.find(narrowed, keep).sort(sort).limit(n))
+
+    # One extra document tells whether there is a next page
+    if not token:
+        docs = fetch(query, limit + 1)
+    else:
+        values = decode_token(token, sort)
+        docs = fetch(after_query(query, sort, values, nulls=False), limit + 1)
+        leading, direction = sort[0]
+        if len(docs) <= limit and direction < 0 and values[0] is not None:
+            # Past the last non-null value of a descending key: on to the nulls
+            docs += fetch(_narrow(query, leading, None), limit + 1 - len(docs))
+    next_token = encode_token(docs[limit - 1], sort) if len(docs) > limit else None
+    return docs[:limit], next_token
+
+def page_args(default=None, capped=True):
+    """
+    (limit, after) for a list request: ?limit= (default, else PAGE_SIZE, and
+    at most MAX_PAGE_SIZE) and the ?after= token. capped=False lifts the
+    maximum, for streamed responses: they hold one batch at a time however
+    many documents they send.
+    """
+    config = current_app.config
+    limit = max(1, request.args.get('limit', type=int) or default or config.get('PAGE_SIZE', 50))
+    if capped:
+        limit = min(limit, config.get('MAX_PAGE_SIZE', 200))
+    return limit, request.args.get('after')
+
+def count_total(collection, query):
+    """
+    The number of documents matching query: read from the collection's
+    metadata when there is no filter, counted otherwise
+    """
+    if not query:
+        return collection.estimated_document_count()
+    return collection.count_documents(query)
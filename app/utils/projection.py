@@ -0,0 +1,40 @@
+# app/utils/projection.py
+"""
+Sparse fieldsets.
+
+List endpoints take ?fields=name,muscle_group to return only those fields
+of each document (and _id). The model methods turn the names into a find
+projection, so the database sends, and the app encodes, just those fields:
+
+    GET /api/workouts/exercises?fields=name,muscle_group
+    GET /api/workouts/routines?fields=name,days.day
+
+Dotted names reach into subdocuments (and arrays of them). Paged lists
+also keep their sort key, which the next-page token is made from.
+"""
+import re
+from flask import request
+
+# A field name or dotted path; no operators ($) and nothing empty
+_FIELD = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+MAX_FIELDS = 50
+
+class InvalidFields(ValueError):
+    """A ?fields= list with a name that is not a plain field path"""
+
+def requested_fields():
+    """The field names asked for with ?fields=, or None for whole documents"""
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    if not fields:
+        return None
+    if len(fields) > MAX_FIELDS or not all(_FIELD.match(field) for field in fields):
+        raise InvalidFields("Invalid fields")
+    return fields
+
+def projection(fields, always=()):
+    """The find projection for fields plus `always`; None (whole documents) without fields"""
+    if not fields:
+        return None
+    paths = dict.fromkeys([*fields, *always])
+    # A path inside another one asked for is already covered (and MongoDB rejects the pair)
+    return {path: 1 for path in paths if not any(path.startswith(f"{other}.") for other in paths)}
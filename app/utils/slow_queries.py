@@ -0,0 +1,320 @@
+# app/utils/slow_queries.py
+"""
+Slow-query log.
+
+Commands slower than a threshold are written to the capped `slow_queries`
+collection together with the model method (or view) that issued them and
+a summary of their explain() plan: COLLSCAN or IXSCAN, documents and keys
+examined versus documents returned. The plan is captured by explaining
+the command again, on a background thread so the request that ran the
+slow query does not pay for it twice; commands issued by that thread are
+never logged themselves.
+
+Entries are grouped by query shape, the filter with every value replaced
+by '?', so `{'name': {'$regex': 'press'}}` and `{'name': {'$regex': 'curl'}}`
+count as the same query (see worst_offenders).
+"""
+import json
+import queue
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+
+from bson import json_util
+from bson.regex import Regex
+from flask import has_request_context, request
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.utils.db_metrics import add_observer, register_listener, record_command
+
+SLOW_QUERIES = 'slow_queries'
+
+# Set on the capture thread, whose own commands must not be logged
+_capturing = ContextVar('slow_query_capture', default=False)
+
+# Fields of a command document that are not part of the query itself
+_META_FIELDS = {
+    'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit', 'startTransaction',
+    'readConcern', 'writeConcern', 'apiVersion', 'apiStrict', 'apiDeprecationErrors', 'comment', 'cursor'
+}
+_EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+
+def command_query(command, document):
+    """The (filter, sort) a command runs, or (None, None) if it has none"""
+    if not document:
+        return None, None
+    if command == 'find':
+        return document.get('filter') or {}, document.get('sort')
+    if command == 'aggregate':
+        pipeline = document.get('pipeline') or []
+        return (pipeline[0]['$match'] if pipeline and '$match' in pipeline[0] else {}), None
+    if command in ('count', 'distinct'):
+        return document.get('query') or {}, None
+    if command == 'findAndModify':
+        return document.get('query') or {}, document.get('sort')
+    if command in ('update', 'delete'):
+        statements = document.get('updates' if command == 'update' else 'deletes') or [{}]
+        return statements[0].get('q') or {}, None
+    return None, None
+
+def query_shape(value):
+    """The query with its values replaced by '?'"""
+    if isinstance(value, dict):
+        return {
+            key: [query_shape(clause) for clause in item]
+            if key in ('$and', '$or', '$nor') and isinstance(item, list) else query_shape(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (re.Pattern, Regex)):
+        return {'$regex': '?'}
+    return '?'
+
+def shape_key(command, document):
+    """Identifies the shape of a command: its filter shape, sort keys and pipeline stages"""
+    query, sort = command_query(command, document)
+    shape = {'filter': query_shape(query) if query is not None else None}
+    if sort:
+        shape['sort'] = list(dict(sort))
+    if command == 'aggregate' and document:
+        shape['pipeline'] = [next(iter(stage)) for stage in document.get('pipeline') or []]
+    return json.dumps(shape, sort_keys=True)
+
+def _caller():
+    """`module:qualname` of the innermost app function outside app.utils on the stack"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('app.') and not module.startswith('app.utils.'):
+            return f"{module}:{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return None
+
+def _find(value, key):
+    """The first value stored under `key` anywhere in a nested document"""
+    if isinstance(value, dict):
+        if key in value:
+            return value[key]
+        children = value.values()
+    elif isinstance(value, list):
+        children = value
+    else:
+        return None
+    for child in children:
+        found = _find(child, key)
+        if found is not None:
+            return found
+    return None
+
+def summarize_plan(explain):
+    """Stages, indexes and examined/returned counts of an explain() result"""
+    planner = _find(explain, 'queryPlanner') or {}
+    stats = _find(explain, 'executionStats') or {}
+    winning = planner.get('winningPlan') or {}
+    # Plans run by the slot-based engine nest the classic plan
+    winning = winning.get('queryPlan', winning)
+    stages, indexes = [], []
+    pending = [winning]
+    while pending:
+        stage = pending.pop()
+        if not isinstance(stage, dict):
+            continue
+        if 'stage' in stage:
+            stages.append(stage['stage'])
+        if 'indexName' in stage:
+            indexes.append(stage['indexName'])
+        if 'inputStage' in stage:
+            pending.append(stage['inputStage'])
+        pending.extend(reversed(stage.get('inputStages', [])))
+    return {
+        'stages': stages,
+        'indexes': indexes,
+        'collscan': 'COLLSCAN' in stages,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'n_returned': stats.get('nReturned'),
+    }
+
+def explain_command(db, command, collection, document):
+    """Explain a command with executionStats (the mock explains the equivalent find)"""
+    from app.utils.mock_db import MockMongoDB
+    if isinstance(db, MockMongoDB):
+        query, sort = command_query(command, document)
+        cursor = getattr(db, collection).find(query)
+        if sort:
+            cursor.sort(list(dict(sort).items()))
+        if document.get('skip'):
+            cursor.skip(document['skip'])
+        if document.get('limit'):
+            cursor.limit(document['limit'])
+        return cursor.explain()
+    body = {key: value for key, value in document.items() if key not in _META_FIELDS}
+    return db.command({'explain': body, 'verbosity': 'executionStats'})
+
+class SlowQueryLog:
+    """
+    Observes every database command and queues the slow ones for the
+    capture thread, which explains them and writes the log entries
+    """
+    def __init__(self, db=None, threshold_ms=100, max_entries=10000, size=16 * 1024 * 1024,
+                 explain=True, queue_size=1000):
+        self._db = db
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self.size = size
+        self.explain = explain
+        self.queue = queue.Queue(queue_size)
+        # Entries dropped because the capture thread fell behind
+        self.dropped = 0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._collection_ready = False
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from app import mongo
+        return mongo.db
+
+    def observe(self, command, collection, duration_ms, failed, document):
+        if duration_ms < self.threshold_ms or collection == SLOW_QUERIES or _capturing.get():
+            return
+        entry = {
+            'ts': datetime.utcnow(),
+            'command': command,
+            'collection': collection,
+            'duration_ms': round(duration_ms, 3),
+            'failed': failed,
+            'caller': _caller(),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'shape': shape_key(command, document),
+        }
+        query, _ = command_query(command, document)
+        if query is not None:
+            # Stored as (extended) JSON: filters hold $-prefixed keys
+            entry['query'] = json_util.dumps(query)
+        try:
+            self.queue.put_nowait((entry, document))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._start()
+
+    def _start(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        _capturing.set(True)
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            entry, document = item
+            try:
+                self.capture(entry, document)
+            except Exception:
+                # The log is best effort; a failed capture must not stop the thread
+                pass
+            finally:
+                self.queue.task_done()
+
+    def ensure_collection(self):
+        """Create the capped log collection if it does not exist yet"""
+        if self._collection_ready:
+            return
+        try:
+            self.db.create_collection(SLOW_QUERIES, capped=True, size=self.size, max=self.max_entries)
+        except CollectionInvalid:
+            pass
+        self._collection_ready = True
+
+    def capture(self, entry, document):
+        """Explain the command (if it can be) and write the log entry"""
+        db = self.db
+        if self.explain and entry['command'] in _EXPLAINABLE and entry['collection'] and document:
+            try:
+                entry['plan'] = summarize_plan(
+                    explain_command(db, entry['command'], entry['collection'], document)
+                )
+            except PyMongoError as e:
+                entry['explain_error'] = str(e)
+        self.ensure_collection()
+        getattr(db, SLOW_QUERIES).insert_one(entry)
+
+    def flush(self):
+        """Wait until every queued entry has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Write what is queued, then stop the capture thread"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+def worst_offenders(db=None, limit=50):
+    """
+    Logged queries grouped by collection, command and shape, the most
+    total time first
+    """
+    if db is None:
+        from app import mongo
+        db = mongo.db
+    return list(getattr(db, SLOW_QUERIES).aggregate([
+        {'$group': {
+            '_id': {'collection': '$collection', 'command': '$command', 'shape': '$shape'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'last_seen': {'$max': '$ts'},
+            'callers': {'$addToSet': '$caller'},
+            'collscan': {'$max': '$plan.collscan'},
+            'docs_examined': {'$max': '$plan.docs_examined'},
+            'n_returned': {'$max': '$plan.n_returned'},
+            'indexes': {'$last': '$plan.indexes'},
+            'example': {'$last': '$query'},
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': limit}
+    ]))
+
+_log = None
+
+def _observe(command, collection, duration_ms, failed, document):
+    # Registered once per process and passed on to the current app's log, so
+    # an app created again does not leave the old log observing as well
+    if _log is not None:
+        _log.observe(command, collection, duration_ms, failed, document)
+
+def init_slow_query_log(app):
+    """
+    Log the app's slow commands. Must run before the MongoClient is
+    created, like the metrics listener it relies on. Replaces (and stops)
+    the log of an app created before.
+    """
+    global _log
+    from app.utils import mock_db
+    register_listener()
+    mock_db.add_command_hook(record_command)
+    previous, _log = _log, SlowQueryLog(
+        threshold_ms=app.config.get('SLOW_QUERY_MS', 100),
+        max_entries=app.config.get('SLOW_QUERY_LOG_MAX', 10000),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True)
+    )
+    add_observer(_observe)
+    if previous is not None:
+        previous.close()
+    return _log
+
+def slow_query_log():
+    """The app's SlowQueryLog, or None if it is not enabled"""
+    return _log
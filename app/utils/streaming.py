@@ -0,0 +1,79 @@
+# app/utils/streaming.py
+"""
+Streamed list responses.
+
+A list endpoint normally reads its whole cursor and encodes one JSON body.
+A client may instead ask for the documents to be encoded and sent as the
+cursor yields them, one batch at a time, so the worker holds a single
+batch however long the list is:
+
+    ?stream=1 (or ?stream=json)           the usual body, its list streamed:
+                                          {"success":true,"workouts":[{...},{...}]}
+    ?stream=ndjson, or
+    Accept: application/x-ndjson          one document per line, nothing else
+
+The batch size is STREAM_BATCH_SIZE (or ?batch_size=, up to
+STREAM_MAX_BATCH_SIZE).
+"""
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON = 'application/x-ndjson'
+
+def stream_format():
+    """'json' or 'ndjson' if the request asked for a streamed response, else None"""
+    stream = request.args.get('stream', '').lower()
+    if stream == 'ndjson':
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    # Only an explicit NDJSON preference counts: */* matches JSON first
+    if request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON:
+        return 'ndjson'
+    return None
+
+def batch_size():
+    size = request.args.get('batch_size', type=int) or current_app.config.get('STREAM_BATCH_SIZE', 100)
+    return max(1, min(size, current_app.config.get('STREAM_MAX_BATCH_SIZE', 1000)))
+
+def _batches(documents, size, encode):
+    batch = []
+    for document in documents:
+        batch.append(encode(document))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def streamed_list(cursor, key, fmt, **fields):
+    """
+    A response sending cursor's documents in format fmt: as the `key` list
+    of a JSON object that also holds `fields` (and success: true), or as
+    NDJSON. An error halfway leaves the body truncated (the status has
+    gone out already); it is logged.
+    """
+    size = batch_size()
+    cursor.batch_size(size)
+    encode = current_app.json.dumps
+    endpoint = request.endpoint
+
+    def generate():
+        try:
+            if fmt == 'ndjson':
+                for batch in _batches(cursor, size, encode):
+                    yield ''.join(f"{line}\n" for line in batch)
+                return
+            head = encode({'success': True, **fields})
+            yield f'{head[:-1]},"{key}":['
+            first = True
+            for batch in _batches(cursor, size, encode):
+                yield ('' if first else ',') + ','.join(batch)
+                first = False
+            yield ']}\n'
+        except Exception as e:
+            current_app.logger.error(f"Error streaming {endpoint}: {str(e)}")
+        finally:
+            cursor.close()
+
+    mimetype = NDJSON if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,432 @@
+# app/utils/synthetic_data.py
+"""
+Deterministic synthetic dataset for load testing.
+
+Each user is generated from its own Random, seeded from (seed, user
+index), so the same arguments always produce the same documents (ObjectIds
+included) and any range of users can be generated on its own. Documents
+come out in per-collection batches and can be streamed to the mock
+database, a persistent mock snapshot or a real MongoDB without holding the
+whole dataset in memory.
+
+Per user and day: three meals plus an occasional snack, a few water logs,
+frequent weigh-ins, weekly measurements and monthly body composition,
+progress photos, and workouts scheduled on the user's training days and
+mostly completed. Users also get nutrition and body goals, 2-4 routines
+built from a shared exercise library, and reminders.
+"""
+import hashlib
+import os
+import random
+import string
+import struct
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+DEFAULT_PASSWORD = 'password123'
+DEFAULT_END = datetime(2025, 6, 1)
+
+_EPOCH = datetime(1970, 1, 1)
+
+_FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Jamie", "Riley",
+                "Avery", "Quinn", "Hatim", "Sara", "Omar", "Lina", "Yusuf", "Maya"]
+_LAST_NAMES = ["Smith", "Garcia", "Chen", "Khan", "Martin", "Silva", "Okafor", "Novak",
+               "Haddad", "Kim", "Rossi", "Dubois", "Ali", "Jensen", "Lopez", "Ivanova"]
+
+# name, calories, protein, carbs, fats per serving
+_FOODS = [
+    ("Oatmeal", 150, 5, 27, 3), ("Eggs", 155, 13, 1, 11), ("Greek Yogurt", 100, 17, 6, 1),
+    ("Banana", 105, 1, 27, 0), ("Chicken Breast", 165, 31, 0, 4), ("Brown Rice", 215, 5, 45, 2),
+    ("Salmon", 208, 20, 0, 13), ("Broccoli", 55, 4, 11, 1), ("Sweet Potato", 112, 2, 26, 0),
+    ("Whole Wheat Bread", 80, 4, 14, 1), ("Peanut Butter", 190, 8, 7, 16), ("Apple", 95, 0, 25, 0),
+    ("Pasta", 220, 8, 43, 1), ("Beef Steak", 270, 26, 0, 18), ("Avocado", 160, 2, 9, 15),
+    ("Protein Shake", 120, 24, 3, 1), ("Almonds", 165, 6, 6, 14), ("Lentil Soup", 180, 12, 30, 1),
+]
+_MEALS = [("Breakfast", 7, 0.9), ("Lunch", 12, 0.9), ("Dinner", 19, 0.85), ("Snack", 16, 0.4)]
+_SERVINGS = (0.5, 1, 1, 1.5, 2)
+_WATER_AMOUNTS = (250, 330, 500, 750)
+
+_MUSCLE_GROUPS = ["Chest", "Back", "Shoulders", "Arms", "Legs", "Core", "Full Body", "Cardio"]
+_DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+_EQUIPMENT = ["barbell", "dumbbell", "kettlebell", "machine", "cable", "bodyweight", "bands"]
+_ROUTINE_TYPES = ["custom", "split", "full-body"]
+_REMINDER_TYPES = ["workout", "water", "meal", "weigh-in"]
+
+def _password_hash(password, seed, iterations=600000):
+    """A werkzeug-compatible pbkdf2 hash with a salt derived from the seed, so output is reproducible"""
+    rng = random.Random(f"salt-{seed}")
+    salt = ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+    return f"pbkdf2:sha256:{iterations}${salt}${digest}"
+
+class _Ids:
+    """
+    Deterministic ObjectIds: the creation timestamp, then 16 bits of the
+    seed, 24 bits of the generating stream (a user) and a 24-bit counter
+    """
+    def __init__(self, seed, stream):
+        self.prefix = ((seed & 0xFFFF) << 48) | ((stream & 0xFFFFFF) << 24)
+        self.counter = 0
+
+    def __call__(self, seconds):
+        self.counter += 1
+        return ObjectId(struct.pack('>IQ', int(seconds), self.prefix | self.counter))
+
+class DatasetGenerator:
+    """Generates the documents of `users` users over the `days` days before `end`"""
+    def __init__(self, users=1000, days=90, seed=42, end=DEFAULT_END, exercises=200,
+                 password=DEFAULT_PASSWORD):
+        self.users = users
+        self.days = days
+        self.seed = seed
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.exercise_count = exercises
+        self.password_hash = _password_hash(password, seed)
+        # Day boundaries as datetimes and epoch seconds, shared by every user
+        self.day_starts = [self.start + timedelta(days=d) for d in range(days)]
+        self.day_seconds = [(day - _EPOCH).total_seconds() for day in self.day_starts]
+        self.minutes = [timedelta(minutes=m) for m in range(24 * 60)]
+        self.admin_id = None
+        self.exercise_ids = []
+
+    def shared_documents(self):
+        """The admin user and the exercise library every routine draws from"""
+        rng = random.Random(self.seed)
+        ids = _Ids(self.seed, 0)
+        created = self.start - timedelta(days=365)
+        created_seconds = (created - _EPOCH).total_seconds()
+        self.admin_id = ids(created_seconds)
+        admin = {
+            '_id': self.admin_id,
+            'username': 'admin',
+            'email': 'admin@example.com',
+            'password_hash': self.password_hash,
+            'first_name': 'Admin',
+            'last_name': 'User',
+            'created_at': created,
+            'last_login': self.end,
+            'is_active': True,
+            'is_superuser': True,
+            'role': 'admin',
+            'subscription_tier': 'admin'
+        }
+        exercises = []
+        for i in range(1, self.exercise_count + 1):
+            exercise_id = ids(created_seconds + i)
+            equipment = rng.sample(_EQUIPMENT, rng.randint(1, 2))
+            exercises.append({
+                '_id': exercise_id,
+                'name': f"{rng.choice(_MUSCLE_GROUPS)} Exercise {i}",
+                'muscle_group': rng.choice(_MUSCLE_GROUPS).lower(),
+                'difficulty': rng.choice(_DIFFICULTIES),
+                'description': f"Synthetic exercise {i}.",
+                'instruction': "Step 1. Set up.\nStep 2. Perform the movement.\nStep 3. Return to start.",
+                'video_url': f"https://www.youtube.com/watch?v=synthetic{i}",
+                'equipment': equipment,
+                'created_by': str(self.admin_id),
+                'created_at': created + timedelta(seconds=i)
+            })
+        self.exercise_ids = [exercise['_id'] for exercise in exercises]
+        return {'users': [admin], 'exercises': exercises}
+
+    def user_documents(self, index):
+        """All documents of one user, by collection"""
+        if not self.exercise_ids:
+            self.shared_documents()
+        rng = random.Random(self.seed * 1_000_003 + index)
+        ids = _Ids(self.seed, index + 1)
+        # The day loop draws from random() directly: randint/choice cost
+        # several times more per call and dominate generation time
+        random_ = rng.random
+        randint = rng.randint
+        day_starts, day_seconds, minutes = self.day_starts, self.day_seconds, self.minutes
+        out = {name: [] for name in (
+            'users', 'nutrition_goals', 'body_goals', 'meals', 'water_intake', 'body_logs',
+            'progress_photos', 'workout_routines', 'scheduled_workouts', 'completed_workouts',
+            'reminders'
+        )}
+
+        signup_offset = randint(1, 365)
+        created = self.start - timedelta(days=signup_offset)
+        created_seconds = (created - _EPOCH).total_seconds()
+        user_id = ids(created_seconds)
+        first_name = rng.choice(_FIRST_NAMES)
+        last_name = rng.choice(_LAST_NAMES)
+        out['users'].append({
+            '_id': user_id,
+            'username': f"user{index:07d}",
+            'email': f"user{index:07d}@example.com",
+            'password_hash': self.password_hash,
+            'first_name': first_name,
+            'last_name': last_name,
+            'created_at': created,
+            'last_login': day_starts[-1] + minutes[randint(0, 1439)] if day_starts else created,
+            'is_active': random_() < 0.97,
+            'is_superuser': False,
+            'role': 'user',
+            'subscription_tier': 'premium' if random_() < 0.25 else 'free'
+        })
+
+        calorie_goal = rng.choice([1800, 2000, 2200, 2500, 2800])
+        out['nutrition_goals'].append({
+            '_id': ids(created_seconds),
+            'user_id': user_id,
+            'calories': calorie_goal,
+            'protein': calorie_goal * 3 // 40,
+            'carbs': calorie_goal // 10,
+            'fats': calorie_goal // 30,
+            'water': rng.choice([2000, 2500, 3000]),
+            'updated_at': created
+        })
+        weight = round(rng.uniform(55, 110), 1)
+        trend = rng.uniform(-0.08, 0.03)
+        body_fat = round(rng.uniform(12, 32), 1)
+        out['body_goals'].append({
+            '_id': ids(created_seconds),
+            'user_id': user_id,
+            'target_weight': round(weight * rng.uniform(0.85, 1.02), 1),
+            'target_body_fat': round(body_fat * 0.8, 1),
+            'target_measurements': {},
+            'deadline': self.end + timedelta(days=randint(30, 180)),
+            'notes': "",
+            'created_at': created,
+            'updated_at': created
+        })
+
+        routine_ids = []
+        for r in range(randint(2, 4)):
+            routine_id = ids(created_seconds + r)
+            routine_ids.append(routine_id)
+            days = []
+            for day_number in range(randint(1, 5)):
+                days.append({
+                    'day': day_number + 1,
+                    'exercises': [
+                        {'exercise_id': exercise_id, 'sets': randint(2, 5), 'reps': randint(5, 15)}
+                        for exercise_id in rng.sample(self.exercise_ids, min(len(self.exercise_ids), randint(3, 6)))
+                    ]
+                })
+            out['workout_routines'].append({
+                '_id': routine_id,
+                'user_id': user_id,
+                'name': f"Routine {r + 1}",
+                'description': "",
+                'type': rng.choice(_ROUTINE_TYPES),
+                'days': days,
+                'is_public': random_() < 0.1,
+                'tags': rng.sample(["strength", "cardio", "hypertrophy", "mobility"], 2),
+                'created_at': created + timedelta(seconds=r)
+            })
+
+        training_days = set(rng.sample(range(7), randint(2, 5)))
+        meals, water, body_logs = out['meals'], out['water_intake'], out['body_logs']
+        scheduled, completed, photos = out['scheduled_workouts'], out['completed_workouts'], out['progress_photos']
+        measurement_weekday = randint(0, 6)
+        for d, (day, seconds) in enumerate(zip(day_starts, day_seconds)):
+            for name, hour, probability in _MEALS:
+                if random_() >= probability:
+                    continue
+                minute = hour * 60 + int(random_() * 91)
+                when = day + minutes[minute]
+                foods = []
+                totals = [0, 0, 0, 0]
+                for _ in range(1 + int(random_() * 3)):
+                    food = _FOODS[int(random_() * len(_FOODS))]
+                    servings = _SERVINGS[int(random_() * len(_SERVINGS))]
+                    foods.append({'name': food[0], 'servings': servings})
+                    for k in range(4):
+                        totals[k] += food[k + 1] * servings
+                meals.append({
+                    '_id': ids(seconds + minute * 60),
+                    'user_id': user_id,
+                    'name': name,
+                    'time': when,
+                    'calories': round(totals[0]),
+                    'protein': round(totals[1]),
+                    'carbs': round(totals[2]),
+                    'fats': round(totals[3]),
+                    'foods': foods,
+                    'created_at': when
+                })
+            for _ in range(3 + int(random_() * 6)):
+                minute = 7 * 60 + int(random_() * (15 * 60 + 1))
+                when = day + minutes[minute]
+                water.append({
+                    '_id': ids(seconds + minute * 60),
+                    'user_id': user_id,
+                    'amount': _WATER_AMOUNTS[int(random_() * len(_WATER_AMOUNTS))],
+                    'time': when,
+                    'created_at': when
+                })
+            weight = round(weight + trend + rng.gauss(0, 0.3), 1)
+            if random_() < 0.4:
+                minute = 6 * 60 + int(random_() * (3 * 60 + 1))
+                when = day + minutes[minute]
+                body_logs.append({
+                    '_id': ids(seconds + minute * 60),
+                    'user_id': user_id,
+                    'weight': weight,
+                    'unit': 'kg',
+                    'date': when,
+                    'notes': "",
+                    'created_at': when
+                })
+            if d % 7 == measurement_weekday:
+                when = day + minutes[8 * 60]
+                waist = round(weight * 0.9 + rng.uniform(-3, 3), 1)
+                body_logs.append({
+                    '_id': ids(seconds + 8 * 3600),
+                    'user_id': user_id,
+                    'date': when,
+                    'chest': round(waist * 1.2, 1),
+                    'waist': waist,
+                    'hips': round(waist * 1.1, 1),
+                    'arms': round(waist * 0.4, 1),
+                    'legs': round(waist * 0.65, 1),
+                    'neck': round(waist * 0.45, 1),
+                    'shoulders': round(waist * 1.35, 1),
+                    'unit': 'cm',
+                    'notes': "",
+                    'created_at': when
+                })
+            if d % 30 == measurement_weekday:
+                when = day + minutes[8 * 60 + 5]
+                body_fat = round(body_fat + rng.uniform(-0.6, 0.3), 1)
+                body_logs.append({
+                    '_id': ids(seconds + 8 * 3600 + 300),
+                    'user_id': user_id,
+                    'date': when,
+                    'body_fat_percentage': body_fat,
+                    'muscle_mass': round(weight * (1 - body_fat / 100) * 0.55, 1),
+                    'bone_mass': round(weight * 0.04, 1),
+                    'water_percentage': round(rng.uniform(50, 60), 1),
+                    'bmi': round(weight / 1.75 ** 2, 1),
+                    'bmr': round(370 + 21.6 * weight * (1 - body_fat / 100)),
+                    'visceral_fat': randint(3, 14),
+                    'method': rng.choice(("manual", "scale")),
+                    'notes': "",
+                    'created_at': when
+                })
+                if random_() < 0.3:
+                    photos.append({
+                        '_id': ids(seconds + 8 * 3600 + 600),
+                        'user_id': user_id,
+                        'date': when,
+                        'photo_url': f"/static/uploads/progress/{user_id}/{d}.jpg",
+                        'category': rng.choice(("front", "back", "side")),
+                        'weight': weight,
+                        'notes': "",
+                        'created_at': when
+                    })
+            if day.weekday() in training_days:
+                minute = rng.choice((6 * 60 + 30, 12 * 60, 17 * 60 + 30, 19 * 60))
+                start = day + minutes[minute]
+                duration = rng.choice((30, 45, 60, 75, 90))
+                routine_id = routine_ids[randint(0, len(routine_ids) - 1)]
+                scheduled_id = ids(seconds + minute * 60 - 86400)
+                done = random_() < 0.8
+                scheduled.append({
+                    '_id': scheduled_id,
+                    'user_id': user_id,
+                    'routine_id': routine_id,
+                    'date': day,
+                    'start_time': start,
+                    'end_time': start + minutes[duration],
+                    'title': "Workout",
+                    'notes': "",
+                    'completed': done,
+                    'notify': True,
+                    'created_at': day - timedelta(days=1)
+                })
+                if done:
+                    end = start + minutes[duration]
+                    completed.append({
+                        '_id': ids(seconds + (minute + duration) * 60),
+                        'user_id': user_id,
+                        'routine_id': routine_id,
+                        'scheduled_id': scheduled_id,
+                        'date': start,
+                        'duration': duration,
+                        'exercises': [
+                            {'exercise_id': exercise_id, 'sets': randint(2, 5), 'reps': randint(5, 15),
+                             'weight': round(rng.uniform(5, 120), 1)}
+                            for exercise_id in rng.sample(self.exercise_ids, min(len(self.exercise_ids), randint(3, 6)))
+                        ],
+                        'notes': "",
+                        'rating': randint(1, 5),
+                        'created_at': end
+                    })
+
+        last_seconds = day_seconds[-1] if day_seconds else created_seconds
+        for r in range(randint(2, 6)):
+            reminder_type = rng.choice(_REMINDER_TYPES)
+            recurring = random_() < 0.7
+            out['reminders'].append({
+                '_id': ids(last_seconds + r),
+                'user_id': user_id,
+                'title': f"{reminder_type.title()} reminder",
+                'description': "",
+                'datetime': self.end + minutes[randint(6 * 60, 22 * 60)],
+                'type': reminder_type,
+                'is_recurring': recurring,
+                'recurring_pattern': rng.choice(("daily", "weekly")) if recurring else None,
+                'is_active': random_() < 0.9,
+                'created_at': created + timedelta(days=randint(0, signup_offset + self.days - 1))
+            })
+        return out
+
+    def batches(self, batch_size=1000, start_user=0, stop_user=None):
+        """Yield (collection, documents) batches of at most batch_size documents"""
+        stop_user = self.users if stop_user is None else stop_user
+        pending = {}
+        if start_user == 0:
+            for name, docs in self.shared_documents().items():
+                pending.setdefault(name, []).extend(docs)
+        elif not self.exercise_ids:
+            self.shared_documents()
+        for index in range(start_user, stop_user):
+            for name, docs in self.user_documents(index).items():
+                buffer = pending.setdefault(name, [])
+                buffer.extend(docs)
+                if len(buffer) >= batch_size:
+                    for start in range(0, len(buffer) - batch_size + 1, batch_size):
+                        yield name, buffer[start:start + batch_size]
+                    del buffer[:len(buffer) - len(buffer) % batch_size]
+        for name, buffer in pending.items():
+            if buffer:
+                yield name, buffer
+
+def load_into(db, generator, batch_size=1000, progress=None):
+    """
+    Insert a generated dataset into a database (a MockMongoDB or a pymongo
+    Database) with unordered insert_many batches. Returns documents
+    written per collection.
+    """
+    counts = {}
+    for name, docs in generator.batches(batch_size):
+        getattr(db, name).insert_many(docs, ordered=False)
+        counts[name] = counts.get(name, 0) + len(docs)
+        if progress:
+            progress(counts)
+    return counts
+
+def write_snapshot(directory, generator, batch_size=1000, progress=None):
+    """
+    Write a generated dataset straight to a persistent mock snapshot,
+    replacing whatever the directory held. Returns documents written per
+    collection.
+    """
+    from app.utils.mock_store import SnapshotWriter, drop_logs, next_generation
+
+    os.makedirs(directory, exist_ok=True)
+    generation = next_generation(directory)
+    counts = {}
+    with SnapshotWriter(directory, generation) as writer:
+        for name, docs in generator.batches(batch_size):
+            writer.write(name, docs)
+            counts[name] = counts.get(name, 0) + len(docs)
+            if progress:
+                progress(counts)
+    drop_logs(directory, generation)
+    return counts
@@ -0,0 +1,375 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+DEFAULT_OUTPUT = os.path.join('benchmarks', 'results.json')
+
+# Scales by the size of the largest per-user time series, meals (the
+# generator writes about MEALS_PER_USER_DAY meals per user and day)
+SCALES = {'1k': 1000, '100k': 100000, '1M': 1000000}
+DAYS = 90
+MEALS_PER_USER_DAY = 3.04
+
+# name -> (signed-in as, path); {date} is a day within the generated history
+BENCHMARKS = {
+    'meals_by_date': ('user', '/api/nutrition/meals/{date}'),
+    'weight_history': ('user', '/api/body/weight'),
+    'workout_history': ('user', '/api/workouts/history'),
+    'exercise_search': ('user', '/api/workouts/exercises?search=chest'),
+    # The user's routines and the first page of the public ones, and streamed
+    'routines': ('user', '/api/workouts/routines'),
+    'routines_stream': ('user', '/api/workouts/routines?stream=1'),
+    'user_stats': ('admin', '/admin/api/stats/users'),
+    'exercises_csv': ('admin', '/admin/exercises/export'),
+}
+
+# Payload sizes (meal documents) for --serialization
+SERIALIZATION_SIZES = (100, 1000, 10000)
+
+# gzip levels compared by --compression
+COMPRESSION_LEVELS = (1, 6, 9)
+
+# Metrics that fail the comparison when they regress beyond the threshold;
+# the others are reported only
+GATED_METRICS = ('p50_ms', 'p95_ms', 'peak_kb')
+# Latency differences below this are noise, whatever the ratio
+MIN_DELTA_MS = 0.2
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Benchmark representative endpoints on the mock DB at several dataset sizes"
+    )
+    parser.add_argument('--scales', default='1k,100k',
+                        help=f"comma-separated dataset scales out of {', '.join(SCALES)} (default %(default)s)")
+    parser.add_argument('--only', help="comma-separated benchmark names (default: all)")
+    parser.add_argument('--iterations', type=int, default=200, help="timed calls per benchmark (default 200)")
+    parser.add_argument('--rounds', type=int, default=3,
+                        help="timed rounds per benchmark; the fastest is kept (default 3)")
+    parser.add_argument('--warmup', type=int, default=20, help="untimed calls first (default 20)")
+    parser.add_argument('--memory-calls', type=int, default=5,
+                        help="calls traced for peak memory, after the timed ones (default 5)")
+    parser.add_argument('--serialization', action='store_true',
+                        help="also compare the json_util round trip with the app's JSON provider "
+                             "on large meal lists (reported, not gated)")
+    parser.add_argument('--compression', action='store_true',
+                        help="also report the bytes gzip saves on each benchmark's response against "
+                             "the CPU it costs, per level (reported, not gated)")
+    parser.add_argument('--seed', type=int, default=42, help="dataset seed (default 42)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="results file (default %(default)s)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file (default %(default)s)")
+    parser.add_argument('--compare', action='store_true',
+                        help="compare with the baseline; exit 1 if a gated metric regressed")
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help="allowed regression as a fraction of the baseline (default 0.5)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="also write the results as the baseline; rerun after changing the benchmarked "
+                             "code paths, the benchmark set or the host, and commit it with the change")
+    return parser.parse_args(argv)
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+def _signed_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def _load_scale(db, scale, seed):
+    from app.utils.mock_db import clear_collections
+    from app.utils.synthetic_data import DatasetGenerator, load_into
+    clear_collections()
+    gc.collect()
+    users = max(1, math.ceil(SCALES[scale] / (DAYS * MEALS_PER_USER_DAY)))
+    generator = DatasetGenerator(users=users, days=DAYS, seed=seed)
+    started = time.perf_counter()
+    counts = load_into(db, generator)
+    return generator, counts, time.perf_counter() - started
+
+def _run(calls, request):
+    for i in range(calls):
+        request(i)
+
+def _timed_round(request, iterations):
+    latencies = []
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        request(i)
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return latencies, elapsed
+
+def run_benchmark(request, iterations, warmup, memory_calls, rounds=3):
+    """
+    Time `iterations` calls of request(i) in each of `rounds` rounds and
+    keep the fastest round (by median), which filters out interference from
+    the rest of the machine; then trace the peak memory of a few more calls
+    """
+    _run(warmup, request)
+    latencies, elapsed = min(
+        (_timed_round(request, iterations) for _ in range(rounds)),
+        key=lambda round_: percentile(round_[0], 50)
+    )
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(memory_calls):
+            tracemalloc.reset_peak()
+            request(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'rps': round(iterations / elapsed, 1),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def _cpu_ms(call, iterations, rounds):
+    """Median CPU time of call() over the fastest of `rounds` rounds, and its peak memory"""
+    call()
+    best = None
+    for _ in range(rounds):
+        gc.collect()
+        times = []
+        for _ in range(iterations):
+            started = time.process_time()
+            call()
+            times.append((time.process_time() - started) * 1000)
+        times.sort()
+        median = percentile(times, 50)
+        best = median if best is None else min(best, median)
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run_serialization(app, db, args):
+    """
+    CPU time and peak memory of a jsonify response holding n meals: the
+    json.loads(json_util.dumps(...)) round trip the handlers used to do
+    against the single pass of the app's JSON provider
+    """
+    from bson import json_util
+    from flask import jsonify
+    results = {}
+    with app.app_context():
+        for size in SERIALIZATION_SIZES:
+            meals = list(db.meals.find().limit(size))
+            if len(meals) < size:
+                break
+            calls = max(3, args.iterations * 100 // size)
+            round_trip = _cpu_ms(lambda: jsonify({'meals': json.loads(json_util.dumps(meals))}).get_data(),
+                                 calls, args.rounds)
+            single_pass = _cpu_ms(lambda: jsonify({'meals': meals}).get_data(), calls, args.rounds)
+            result = {
+                'round_trip_ms': round(round_trip[0], 3),
+                'single_pass_ms': round(single_pass[0], 3),
+                'round_trip_peak_kb': round(round_trip[1] / 1024, 1),
+                'single_pass_peak_kb': round(single_pass[1] / 1024, 1),
+                'cpu_saved': round(1 - single_pass[0] / round_trip[0], 3) if round_trip[0] else None,
+            }
+            results[str(size)] = result
+            print(f"  serialize {size:6} meals  round trip {result['round_trip_ms']:9.3f}ms "
+                  f"{result['round_trip_peak_kb']:9.1f}KB  single pass {result['single_pass_ms']:9.3f}ms "
+                  f"{result['single_pass_peak_kb']:9.1f}KB  cpu saved {result['cpu_saved']:.0%}")
+    return results
+
+def run_compression(bodies, args):
+    """
+    For each response body: its size, and per gzip level the compressed
+    size, the share of bytes saved and the CPU time compression takes
+    """
+    from app.utils.compression import gzip_body
+    results = {}
+    for name, body in bodies.items():
+        result = {'bytes': len(body), 'levels': {}}
+        calls = max(3, min(args.iterations, 20_000_000 // max(len(body), 1)))
+        for level in COMPRESSION_LEVELS:
+            compressed = len(gzip_body(body, level))
+            cpu_ms, _ = _cpu_ms(lambda: gzip_body(body, level), calls, args.rounds)
+            result['levels'][str(level)] = {
+                'gzip_bytes': compressed,
+                'saved': round(1 - compressed / len(body), 3) if body else None,
+                'cpu_ms': round(cpu_ms, 3),
+                # Bytes saved per millisecond of CPU spent
+                'saved_kb_per_cpu_ms': round((len(body) - compressed) / 1024 / cpu_ms, 1) if cpu_ms else None,
+            }
+        results[name] = result
+        levels = '  '.join(f"L{level} {values['gzip_bytes']:9,}B {values['saved']:4.0%} {values['cpu_ms']:7.3f}ms"
+                           for level, values in result['levels'].items())
+        print(f"  gzip {name:18} {result['bytes']:10,}B  {levels}")
+    return results
+
+def run_scale(app, db, scale, args, names):
+    generator, counts, load_seconds = _load_scale(db, scale, args.seed)
+    print(f"[{scale}] {sum(counts.values()):,} documents ({counts.get('meals', 0):,} meals, "
+          f"{generator.users} users) loaded in {load_seconds:.1f}s")
+    clients = {
+        'user': [_signed_in(app, db.users.find_one({'username': f"user{i:07d}"})['_id'])
+                 for i in range(min(generator.users, 10))],
+        'admin': [_signed_in(app, generator.admin_id)],
+    }
+    dates = [(generator.end - timedelta(days=d + 1)).strftime('%Y-%m-%d') for d in range(min(DAYS, 30))]
+
+    results = {}
+    bodies = {}
+    for name in names:
+        role, path = BENCHMARKS[name]
+        pool = clients[role]
+        statuses = set()
+
+        def request(i):
+            response = pool[i % len(pool)].get(path.format(date=dates[i % len(dates)]))
+            statuses.add(response.status_code)
+            # Drain the body (streamed responses only run as they are read)
+            for _ in response.response:
+                pass
+            response.close()
+
+        result = run_benchmark(request, args.iterations, args.warmup, args.memory_calls, args.rounds)
+        result['status'] = sorted(statuses)
+        if args.compression:
+            # The benchmark clients send no Accept-Encoding: this is the uncompressed body
+            response = pool[0].get(path.format(date=dates[0]))
+            bodies[name] = response.get_data()
+            response.close()
+        results[name] = result
+        print(f"  {name:18} p50 {result['p50_ms']:8.3f}ms  p95 {result['p95_ms']:8.3f}ms  "
+              f"p99 {result['p99_ms']:8.3f}ms  {result['rps']:8.1f}/s  peak {result['peak_kb']:9.1f}KB  "
+              f"status {','.join(map(str, result['status']))}")
+    scale_results = {
+        'documents': sum(counts.values()),
+        'counts': counts,
+        'users': generator.users,
+        'load_s': round(load_seconds, 2),
+        'maxrss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'benchmarks': results,
+    }
+    if args.serialization:
+        scale_results['serialization'] = run_serialization(app, db, args)
+    if args.compression:
+        scale_results['compression'] = run_compression(bodies, args)
+    return scale_results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """Lines describing the differences, and the gated regressions among them"""
+    lines, regressions = [], []
+    for scale, current in results['scales'].items():
+        base_scale = baseline.get('scales', {}).get(scale)
+        if base_scale is None:
+            lines.append(f"[{scale}] not in the baseline")
+            continue
+        for name, result in current['benchmarks'].items():
+            base = base_scale['benchmarks'].get(name)
+            if base is None:
+                lines.append(f"[{scale}] {name}: not in the baseline")
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'peak_kb', 'rps'):
+                old, new = base.get(metric), result.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                # Throughput regresses downwards, everything else upwards
+                worse = -change if metric == 'rps' else change
+                line = f"[{scale}] {name} {metric}: {old} -> {new} ({change:+.1%})"
+                if (metric in GATED_METRICS and worse > threshold
+                        and not (metric.endswith('_ms') and new - old < MIN_DELTA_MS)):
+                    regressions.append(line)
+                    line += "  REGRESSION"
+                lines.append(line)
+    return lines, regressions
+
+def main(argv=None):
+    args = parse_args(argv)
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    names = [name.strip() for name in args.only.split(',')] if args.only else list(BENCHMARKS)
+    unknown += [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Error: unknown scale or benchmark: {', '.join(unknown)}")
+        return 2
+
+    from app import create_app, mongo
+    app = create_app('testing')
+    # Measure the endpoints, not the log handler
+    app.logger.disabled = True
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'rounds': args.rounds,
+        'seed': args.seed,
+        'scales': {},
+    }
+    for scale in scales:
+        results['scales'][scale] = run_scale(app, mongo.db, scale, args, names)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"Error: no baseline at {args.baseline} (run with --save-baseline first)")
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.threshold)
+        for line in lines:
+            print(line)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} of the baseline")
+            status = 1
+        else:
+            print(f"No regressions beyond {args.threshold:.0%} of the baseline")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+from app.utils.synthetic_data import DEFAULT_END, DEFAULT_PASSWORD, DatasetGenerator, load_into, write_snapshot
+
+# Load environment variables
+load_dotenv()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Generate a deterministic synthetic dataset for load testing"
+    )
+    parser.add_argument('--target', choices=['mock', 'snapshot', 'mongo'], default='snapshot',
+                        help="mock: the in-process mock DB (a dry run, unless --path persists it); "
+                             "snapshot: write a persistent mock snapshot to --path; "
+                             "mongo: batched inserts into a MongoDB server")
+    parser.add_argument('--users', type=int, default=1000, help="number of users (default 1000)")
+    parser.add_argument('--days', type=int, default=90, help="days of history per user (default 90)")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (default 42)")
+    parser.add_argument('--end', default=DEFAULT_END.strftime('%Y-%m-%d'),
+                        help="last day of history, YYYY-MM-DD (default %(default)s)")
+    parser.add_argument('--exercises', type=int, default=200, help="size of the exercise library")
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help="password of every generated user")
+    parser.add_argument('--batch-size', type=int, default=1000, help="documents per insert batch")
+    parser.add_argument('--path', default=os.environ.get('MOCK_DB_PATH'),
+                        help="mock DB directory (default $MOCK_DB_PATH)")
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'),
+                        help="MongoDB URI for --target mongo (default $MONGO_URI or a local mongod)")
+    parser.add_argument('--database', default='sweatz_synthetic',
+                        help="database for --target mongo (default %(default)s)")
+    parser.add_argument('--drop', action='store_true', help="drop the target database first (mongo only)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.target == 'snapshot' and not args.path:
+        print("Error: --target snapshot needs --path (or MOCK_DB_PATH)")
+        return 1
+
+    generator = DatasetGenerator(
+        users=args.users,
+        days=args.days,
+        seed=args.seed,
+        end=datetime.strptime(args.end, '%Y-%m-%d'),
+        exercises=args.exercises,
+        password=args.password
+    )
+
+    started = time.perf_counter()
+    last_report = [started]
+
+    def progress(counts):
+        now = time.perf_counter()
+        if now - last_report[0] >= 2:
+            last_report[0] = now
+            total = sum(counts.values())
+            print(f"  {total:,} documents ({total / (now - started):,.0f}/s)")
+
+    if args.target == 'snapshot':
+        print(f"Writing snapshot to {args.path}")
+        counts = write_snapshot(args.path, generator, args.batch_size, progress)
+    elif args.target == 'mock':
+        from app.utils.mock_db import MockMongoDB
+        counts = load_into(MockMongoDB(path=args.path), generator, args.batch_size, progress)
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        if args.drop:
+            client.drop_database(args.database)
+        print(f"Inserting into database '{args.database}'")
+        counts = load_into(client[args.database], generator, args.batch_size, progress)
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for name, count in sorted(counts.items()):
+        print(f"  {name}: {count:,}")
+    print(f"Generated {total:,} documents in {elapsed:.1f}s ({total / elapsed:,.0f}/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
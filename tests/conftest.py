@@ -0,0 +1,94 @@
+# tests/conftest.py
+"""
+Shared fixtures: the app on the in-memory mock database, seeded once per
+session with a small deterministic synthetic dataset, and test clients
+signed in as a regular user and as the admin.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+# Small enough to seed in well under a second, big enough that a collection
+# scan or an N+1 pattern shows up clearly in the counts
+DATASET = dict(users=12, days=21, seed=7, exercises=60)
+
+class QueryCount:
+    """Database commands and documents examined while it is active"""
+    def __init__(self):
+        self.commands = []
+        self.docs_examined = 0
+
+    @property
+    def ops(self):
+        return len(self.commands)
+
+    def hook(self, command, collection, duration_ms, failed, document):
+        self.commands.append(f"{command} {collection}" if collection else command)
+
+@contextmanager
+def count_queries():
+    """Count the mock commands (as the db_metrics hooks see them) run inside the block"""
+    from app.utils import mock_db
+    counter = QueryCount()
+    mock_db.add_command_hook(counter.hook)
+    start = mock_db.docs_examined()
+    try:
+        yield counter
+    finally:
+        mock_db.remove_command_hook(counter.hook)
+        counter.docs_examined = mock_db.docs_examined() - start
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app, mongo
+    from app.utils.synthetic_data import DatasetGenerator, load_into
+    app = create_app('testing')
+    generator = DatasetGenerator(**DATASET)
+    load_into(mongo.db, generator)
+    app.dataset = generator
+    # Load the settings cache, as the app's first request would
+    from app.utils.app_settings import app_settings
+    app_settings()
+    return app
+
+@pytest.fixture(scope='session')
+def db(app):
+    from app import mongo
+    return mongo.db
+
+def _signed_in(app, user_id):
+    """A client with a session for user_id, whose user is already cached (the steady state)"""
+    from app.models.user import User
+    with app.app_context():
+        User.get_cached(user_id)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture(scope='session')
+def user(db):
+    """The first generated (non-admin) user"""
+    return db.users.find_one({'username': 'user0000000'})
+
+@pytest.fixture
+def client(app, user):
+    return _signed_in(app, user['_id'])
+
+@pytest.fixture
+def admin_client(app):
+    return _signed_in(app, app.dataset.admin_id)
+
+@pytest.fixture
+def anonymous_client(app):
+    return app.test_client()
+
+@pytest.fixture
+def collection(request):
+    """An empty mock collection of the test's own, dropped afterwards"""
+    from app.utils import mock_db
+    name = f"test_{request.node.name}"
+    mock_db._mock_data.pop(name, None)
+    yield getattr(mock_db.MockMongoDB(), name)
+    mock_db._mock_data.pop(name, None)
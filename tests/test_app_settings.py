@@ -0,0 +1,76 @@
+# tests/test_app_settings.py
+"""The cached app settings and the flags read from them"""
+from pymongo.errors import ExecutionTimeout
+
+from app.utils import app_settings
+from app.utils.app_settings import DEFAULT_SETTINGS, SettingsCache
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Settings:
+    """A stand-in db whose settings reads can be counted and made to fail"""
+    def __init__(self, doc):
+        self.doc = doc
+        self.reads = 0
+        self.error = None
+
+    @property
+    def settings(self):
+        return self
+
+    def find_one(self, query, max_time_ms=None):
+        self.reads += 1
+        if self.error:
+            raise self.error
+        return self.doc
+
+def test_stale_settings_are_served_while_refreshing():
+    clock, db = Clock(), Settings({'_id': 'app_settings', 'maintenance_mode': True})
+    cache = SettingsCache(db=db, ttl=5, clock=clock)
+    assert cache.get()['maintenance_mode'] and cache.get()['allow_registrations']
+    assert db.reads == 1
+
+    db.doc = {'_id': 'app_settings', 'maintenance_mode': False}
+    clock.now = 6
+    assert cache.get()['maintenance_mode']
+    cache._refreshing.acquire()
+    cache._refreshing.release()
+    assert not cache.get()['maintenance_mode'] and db.reads == 2
+
+def test_failed_load_falls_back_to_defaults():
+    db = Settings(None)
+    db.error = ExecutionTimeout('operation exceeded time limit')
+    cache = SettingsCache(db=db)
+    assert cache.get() == DEFAULT_SETTINGS
+    cache.update({'maintenance_mode': True})
+    assert cache.get()['maintenance_mode'] and db.reads == 1
+
+def test_update_settings_applies_at_once(db, admin_client, anonymous_client):
+    form = {'maintenance_mode': 'false', 'allow_registrations': 'false',
+            'default_subscription': 'free', 'app_version': '1.0.0'}
+    admin_client.post('/admin/settings/update', data=form)
+    try:
+        response = anonymous_client.post('/api/register', json={
+            'username': 'closed', 'email': 'closed@example.com', 'password': 'secret123'
+        })
+        assert response.status_code == 403
+        assert db.users.find_one({'username': 'closed'}) is None
+    finally:
+        admin_client.post('/admin/settings/update', data={**form, 'allow_registrations': 'true'})
+    assert app_settings.setting('allow_registrations')
+
+def test_maintenance_mode_redirects_non_admins(admin_client, client):
+    form = {'maintenance_mode': 'true', 'allow_registrations': 'true',
+            'default_subscription': 'free', 'app_version': '1.0.0'}
+    admin_client.post('/admin/settings/update', data=form)
+    try:
+        assert client.get('/api/body/weight').status_code == 302
+        assert admin_client.get('/api/body/weight').status_code == 200
+    finally:
+        admin_client.post('/admin/settings/update', data={**form, 'maintenance_mode': 'false'})
+    assert client.get('/api/body/weight').status_code == 200
@@ -0,0 +1,40 @@
+# tests/test_benchmark.py
+"""The benchmark runner's statistics and baseline comparison"""
+import benchmark
+
+def _results(**metrics):
+    base = {'p50_ms': 1.0, 'p95_ms': 2.0, 'p99_ms': 3.0, 'peak_kb': 100.0, 'rps': 500.0}
+    return {'scales': {'1k': {'benchmarks': {'meals_by_date': {**base, **metrics}}}}}
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 95) == 95
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([7.0], 99) == 7.0
+
+def test_compare_flags_gated_regressions_beyond_threshold():
+    lines, regressions = benchmark.compare(_results(p95_ms=4.0, peak_kb=400.0), _results(), 0.5)
+    assert [line.split(':')[0] for line in regressions] == [
+        '[1k] meals_by_date p95_ms', '[1k] meals_by_date peak_kb'
+    ]
+    assert len(lines) == 5
+
+def test_compare_ignores_noise_and_ungated_metrics():
+    # p50 is 150% slower but only by 0.15ms; p99 and throughput are reported, not gated
+    current = _results(p50_ms=0.25, p99_ms=30.0, rps=50.0)
+    assert benchmark.compare(current, _results(p50_ms=0.1), 0.5)[1] == []
+
+def test_compare_reports_scales_missing_from_the_baseline():
+    lines, regressions = benchmark.compare(_results(), {'scales': {}}, 0.5)
+    assert lines == ["[1k] not in the baseline"] and regressions == []
+
+def test_run_benchmark_records_latency_throughput_and_memory():
+    calls = []
+    result = benchmark.run_benchmark(lambda i: calls.append(bytearray(64 * 1024)), iterations=20,
+                                     warmup=2, memory_calls=2, rounds=2)
+    assert len(calls) == 2 + 20 * 2 + 2
+    assert result['calls'] == 20
+    assert 0 <= result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+    assert result['rps'] > 0
+    assert result['peak_kb'] >= 64
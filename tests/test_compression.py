@@ -0,0 +1,67 @@
+# tests/test_compression.py
+"""gzip response compression"""
+import gzip
+import os
+
+from flask import Response
+
+from app.utils.compression import compress_response
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+def _body(response):
+    return b''.join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in response.response)
+
+def test_large_json_is_gzipped(client):
+    plain = client.get('/api/workouts/exercises?limit=100')
+    compressed = client.get('/api/workouts/exercises?limit=100', headers=GZIP)
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert int(compressed.headers['Content-Length']) < len(plain.data) / 3
+
+def test_small_responses_are_left_alone(client):
+    response = client.get('/api/body/goals', headers=GZIP)
+    assert response.status_code == 200 and 'Content-Encoding' not in response.headers
+    # The representation could have differed, so caches must still key on the header
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_csv_export_is_gzipped(admin_client):
+    plain = admin_client.get('/admin/exercises/export')
+    compressed = admin_client.get('/admin/exercises/export', headers=GZIP)
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+
+def test_streamed_responses_are_gzipped_chunk_by_chunk(client):
+    path = '/api/workouts/exercises?limit=60&stream=ndjson&batch_size=10'
+    plain = _body(client.get(path, buffered=False))
+    response = client.get(path, headers=GZIP, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    assert gzip.decompress(b''.join(chunks)) == plain
+
+def test_compressed_etags_are_weak_and_still_match(app, client):
+    with app.test_request_context(headers=GZIP):
+        response = Response('{"a":1}' * 500, mimetype='application/json')
+        response.set_etag('abc')
+        compress_response(response)
+        assert response.get_etag() == ('abc', True)
+
+    day = '2025-05-20'
+    etag = client.get(f'/api/nutrition/meals/{day}').headers['ETag']
+    weak = f'W/{etag}'
+    assert client.get(f'/api/nutrition/meals/{day}', headers={**GZIP, 'If-None-Match': weak}).status_code == 304
+
+def test_encoded_or_incompressible_bodies_are_skipped(app):
+    with app.test_request_context(headers=GZIP):
+        encoded = Response(b'x' * 5000, mimetype='text/plain', headers={'Content-Encoding': 'br'})
+        assert compress_response(encoded).headers['Content-Encoding'] == 'br'
+
+        noise = os.urandom(5000)
+        incompressible = compress_response(Response(noise, mimetype='text/plain'))
+        assert 'Content-Encoding' not in incompressible.headers and incompressible.get_data() == noise
+
+        image = compress_response(Response(b'x' * 5000, mimetype='image/png'))
+        assert 'Content-Encoding' not in image.headers
@@ -0,0 +1,87 @@
+# tests/test_conditional_get.py
+"""ETags from per-user data versions, and 304 Not Modified"""
+from tests.conftest import _signed_in, count_queries
+
+DAY = '2025-05-21'
+
+def test_unchanged_data_is_not_modified(client):
+    first = client.get(f'/api/nutrition/meals/{DAY}')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    with count_queries() as queries:
+        second = client.get(f'/api/nutrition/meals/{DAY}', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304 and not second.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    # Only the versions were read: not the meals
+    assert queries.commands == ['find data_versions']
+
+def test_writes_change_the_etag(client):
+    etag = client.get(f'/api/nutrition/meals/{DAY}').headers['ETag']
+    created = client.post('/api/nutrition/meals', json={'name': 'Oats', 'time': f'{DAY}T08:00:00'})
+    meal_id = created.get_json()['meal_id']
+
+    changed = client.get(f'/api/nutrition/meals/{DAY}', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert meal_id in [meal['_id']['$oid'] for meal in changed.get_json()['meals']]
+
+    # Updates and deletes by id bump the owner's version too
+    etag = changed.headers['ETag']
+    client.put(f'/api/nutrition/meals/{meal_id}', json={'name': 'Porridge', 'time': f'{DAY}T08:00:00'})
+    updated = client.get(f'/api/nutrition/meals/{DAY}', headers={'If-None-Match': etag})
+    assert updated.status_code == 200
+    etag = updated.headers['ETag']
+    client.delete(f'/api/nutrition/meals/{meal_id}')
+    assert client.get(f'/api/nutrition/meals/{DAY}', headers={'If-None-Match': etag}).status_code == 200
+
+def test_other_collections_leave_the_etag_alone(client):
+    etag = client.get(f'/api/nutrition/water/{DAY}').headers['ETag']
+    client.post('/api/body/weight', json={'weight': 81, 'date': f'{DAY}T07:00:00'})
+    assert client.get(f'/api/nutrition/water/{DAY}', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/api/nutrition/water', json={'amount': 250, 'time': f'{DAY}T09:00:00'})
+    assert client.get(f'/api/nutrition/water/{DAY}', headers={'If-None-Match': etag}).status_code == 200
+
+def test_etags_differ_by_user_and_url(app, db, client):
+    other = _signed_in(app, db.users.find_one({'username': 'user0000001'})['_id'])
+    mine = client.get('/api/nutrition/goals').headers['ETag']
+    assert other.get('/api/nutrition/goals').headers['ETag'] != mine
+    assert client.get('/api/workouts/schedule?start_date=2025-05-01').headers['ETag'] != \
+        client.get('/api/workouts/schedule?start_date=2025-05-02').headers['ETag']
+
+def test_only_successful_gets_are_tagged(client):
+    assert 'ETag' not in client.get('/api/nutrition/meals/not-a-date').headers
+    assert 'ETag' not in client.post('/api/nutrition/goals', json={'calories': 2100}).headers
+
+def test_updates_report_whether_they_modified_anything(app, client, user, monkeypatch):
+    from datetime import datetime
+    from bson import ObjectId
+    from app.models import nutrition, reminders
+    from app.models.nutrition import Nutrition
+    from app.models.reminders import Reminder
+
+    class Frozen(datetime):
+        """A clock that stands still, so updated_at alone does not change a document"""
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2025, 5, 21, 12, 0)
+
+    monkeypatch.setattr(nutrition, 'datetime', Frozen)
+    monkeypatch.setattr(reminders, 'datetime', Frozen)
+    meal = {'name': 'Rice', 'time': datetime(2025, 5, 21, 13, 0), 'calories': 300}
+    reminder = {'title': 'Walk', 'datetime': datetime(2025, 5, 21, 18, 0)}
+    with app.app_context():
+        meal_id = Nutrition.create_meal(str(user['_id']), meal)
+        reminder_id = Reminder.create_reminder(str(user['_id']), reminder)
+        try:
+            assert Nutrition.update_meal(meal_id, meal) is True
+            assert Reminder.update_reminder(reminder_id, reminder) is True
+            etag = client.get(f'/api/nutrition/meals/{DAY}').headers['ETag']
+            # The same values again change nothing, like update_one's modified_count
+            assert Nutrition.update_meal(meal_id, meal) is False
+            assert Reminder.update_reminder(reminder_id, reminder) is False
+            assert client.get(f'/api/nutrition/meals/{DAY}', headers={'If-None-Match': etag}).status_code == 304
+            assert Nutrition.update_meal(meal_id, {**meal, 'calories': 350}) is True
+            assert Nutrition.update_meal(str(ObjectId()), meal) is False
+        finally:
+            Nutrition.delete_meal(meal_id)
+            Reminder.delete_reminder(reminder_id)
@@ -0,0 +1,43 @@
+# tests/test_db_init.py
+"""Syncing the models' declared indexes"""
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.db_init import format_drift, index_drift, sync_indexes
+
+@pytest.fixture
+def duplicated_goals(db):
+    """Two body goals for one user, written while the unique user_id index was missing"""
+    goals = db.body_goals
+    goals.drop_index('user_id_1')
+    goals.insert_many([{'_id': 'dup-1', 'user_id': 'dup'}, {'_id': 'dup-2', 'user_id': 'dup'}])
+    yield goals
+    goals.delete_many({'user_id': 'dup'})
+    sync_indexes(db)
+
+def test_duplicates_are_reported_instead_of_failing_the_sync(db, duplicated_goals):
+    db.nutrition_goals.drop_index('user_id_1')
+    report = sync_indexes(db)
+
+    assert report['body_goals']['failed'] == {
+        'user_id_1': "E11000 duplicate key error index: user_id_1 dup key: { user_id: 'dup' }"
+    }
+    # The other indexes were still built, and the failed one is still drift
+    assert index_drift(db) == {'body_goals': {'missing': ['user_id_1'], 'changed': [], 'stale': []}}
+    assert format_drift(report) == [
+        "body_goals: missing index user_id_1",
+        "body_goals: could not build index user_id_1: "
+        "E11000 duplicate key error index: user_id_1 dup key: { user_id: 'dup' }",
+        "nutrition_goals: missing index user_id_1",
+    ]
+
+    duplicated_goals.delete_one({'_id': 'dup-2'})
+    assert 'failed' not in sync_indexes(db)['body_goals']
+    assert index_drift(db) == {}
+
+def test_the_duplicate_key_names_the_values(collection):
+    collection.create_index([('user_id', 1), ('day', -1)], unique=True, name='user_day')
+    collection.insert_one({'user_id': 'a', 'day': '2025-05-01'})
+    with pytest.raises(DuplicateKeyError) as e:
+        collection.insert_one({'user_id': 'a', 'day': '2025-05-01'})
+    assert str(e.value).endswith("dup key: { user_id: 'a', day: '2025-05-01' }")
@@ -0,0 +1,29 @@
+# tests/test_formatters.py
+"""The app's JSON provider writes BSON values as json_util did"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import Decimal128, ObjectId, Regex, json_util
+from flask import jsonify
+
+VALUES = [
+    ObjectId(),
+    datetime(2025, 5, 20, 12, 0, 0, 123456),
+    datetime(2025, 5, 20, 12),
+    datetime(2025, 5, 20, 12, tzinfo=timezone(timedelta(hours=2))),
+    datetime(1960, 1, 1, 3, 4, 5, 678000),
+    Decimal128('1.50'),
+    Regex('^bench', 'i'),
+]
+
+@pytest.mark.parametrize('value', VALUES, ids=lambda value: type(value).__name__)
+def test_bson_values_match_json_util(app, value):
+    document = {'_id': ObjectId(), 'value': value, 'items': [{'value': value}]}
+    with app.app_context():
+        encoded = jsonify(document).get_data(as_text=True)
+    assert json.loads(encoded) == json.loads(json_util.dumps(document))
+
+def test_encoding_is_compact_and_sorted(app):
+    with app.app_context():
+        assert jsonify({'b': 1, 'a': [1, 2]}).get_data(as_text=True) == '{"a":[1,2],"b":1}\n'
@@ -0,0 +1,67 @@
+# tests/test_import_budget.py
+"""
+Import-time budget for the app package. Test workers and CLI tools import
+`app` without needing the blueprints, the models or the mock database, so
+none of those may be pulled in (or seeded) at import time.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed for `import app`, in milliseconds
+IMPORT_BUDGET_MS = int(os.environ.get('IMPORT_BUDGET_MS', '1000'))
+
+def _run(code, *flags):
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return result
+
+def _cumulative_us(importtime_output, module):
+    for line in importtime_output.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise AssertionError(f"{module} not found in -X importtime output")
+
+def test_import_app_within_budget():
+    result = _run('import app', '-X', 'importtime')
+    elapsed_ms = _cumulative_us(result.stderr, 'app') / 1000
+    assert elapsed_ms <= IMPORT_BUDGET_MS, f"import app took {elapsed_ms:.0f}ms (budget {IMPORT_BUDGET_MS}ms)"
+
+def test_import_app_is_lazy():
+    result = _run(
+        'import sys, app\n'
+        'print("\\n".join(name for name in sys.modules if name.startswith(("app.api", "app.models", "app.utils"))))'
+    )
+    assert result.stdout.split() == []
+
+def test_mock_db_seeds_on_first_use():
+    result = _run(
+        'from app.utils import mock_db\n'
+        'print(len(mock_db._mock_data))\n'
+        'db = mock_db.MockMongoDB()\n'
+        'print(db.users.count_documents({}))\n'
+        'print(sorted(mock_db._mock_data))'
+    )
+    assert result.stdout.split('\n')[:3] == ['0', '2', "['users']"]
+
+def test_create_app_leaves_the_fixtures_unseeded():
+    result = _run(
+        'import os\n'
+        'os.environ.update(USE_MOCK_DB="true", MOCK_DB_FIXTURES="default", SLOW_QUERY_LOG_ENABLED="false")\n'
+        'os.environ.pop("MOCK_DB_PATH", None)\n'
+        'from app import create_app\n'
+        'from app.utils import mock_db\n'
+        'create_app("development")\n'
+        'print(sorted(mock_db._mock_data))\n'
+        'db = mock_db.MockMongoDB()\n'
+        'print(db.users.count_documents({}), sorted(db.users.index_information()))'
+    )
+    unseeded, users = result.stdout.split('\n')[-3:-1]
+    assert unseeded == '[]'
+    # Seeded on first use, with the indexes the models declare
+    assert users == "2 ['_id_', 'created_at_1__id_1', 'email_1', 'username_1']"
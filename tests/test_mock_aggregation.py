@@ -0,0 +1,101 @@
+# tests/test_mock_aggregation.py
+"""The mock database's aggregation pipelines, stage by stage"""
+from datetime import datetime
+
+import pytest
+from pymongo.errors import OperationFailure
+
+WORKOUTS = [
+    {'_id': 1, 'user': 'a', 'minutes': 30, 'date': datetime(2025, 5, 1, 7, 30),
+     'exercises': ['squat', 'press'], 'meta': {'tags': ['legs', 'push']}},
+    {'_id': 2, 'user': 'a', 'minutes': 45, 'date': datetime(2025, 5, 2, 8, 0),
+     'exercises': ['row'], 'meta': {'tags': []}},
+    {'_id': 3, 'user': 'b', 'minutes': 20, 'date': datetime(2025, 5, 2, 9, 15),
+     'exercises': [], 'meta': {}},
+    {'_id': 4, 'user': 'b', 'minutes': None, 'date': None, 'meta': {'tags': 'cardio'}},
+]
+
+@pytest.fixture
+def workouts(collection):
+    collection.insert_many([dict(doc) for doc in WORKOUTS])
+    return collection
+
+def _run(collection, *stages):
+    return list(collection.aggregate(list(stages)))
+
+def test_match_sort_skip_limit(workouts):
+    assert [doc['_id'] for doc in _run(workouts, {'$match': {'user': 'a'}})] == [1, 2]
+    ranked = _run(workouts, {'$sort': {'minutes': -1}}, {'$skip': 1}, {'$limit': 2})
+    assert [doc['_id'] for doc in ranked] == [1, 3]
+    # The same stages after a non-pushed-down stage run in the pipeline itself
+    staged = _run(workouts, {'$project': {'minutes': 1}}, {'$sort': {'minutes': 1}}, {'$limit': 2})
+    assert staged == [{'_id': 4, 'minutes': None}, {'_id': 3, 'minutes': 20}]
+    assert _run(workouts, {'$match': {'user': 'a'}}, {'$match': {'minutes': {'$gt': 40}}})[0]['_id'] == 2
+
+def test_pushed_down_stages_match_an_unindexed_run(workouts):
+    pipeline = [{'$match': {'user': 'b'}}, {'$sort': {'_id': -1}}, {'$limit': 1}]
+    unindexed = list(workouts.aggregate(pipeline))
+    workouts.create_index([('user', 1), ('_id', -1)])
+    assert list(workouts.aggregate(pipeline)) == unindexed == [WORKOUTS[3]]
+
+def test_group_accumulators(workouts):
+    groups = _run(workouts, {'$group': {
+        '_id': '$user',
+        'total': {'$sum': '$minutes'}, 'count': {'$sum': 1}, 'average': {'$avg': '$minutes'},
+        'shortest': {'$min': '$minutes'}, 'longest': {'$max': '$minutes'},
+        'ids': {'$push': '$_id'}, 'users': {'$addToSet': '$user'},
+        'first': {'$first': '$_id'}, 'last': {'$last': '$_id'},
+    }}, {'$sort': {'_id': 1}})
+    assert groups == [
+        {'_id': 'a', 'total': 75, 'count': 2, 'average': 37.5, 'shortest': 30, 'longest': 45,
+         'ids': [1, 2], 'users': ['a'], 'first': 1, 'last': 2},
+        {'_id': 'b', 'total': 20, 'count': 2, 'average': 20.0, 'shortest': 20, 'longest': 20,
+         'ids': [3, 4], 'users': ['b'], 'first': 3, 'last': 4},
+    ]
+    with pytest.raises(OperationFailure):
+        _run(workouts, {'$group': {'_id': None, 'n': {'$median': '$minutes'}}})
+
+def test_group_by_computed_keys(workouts):
+    days = _run(workouts, {'$match': {'date': {'$ne': None}}},
+                {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$date'}},
+                            'n': {'$sum': 1}}},
+                {'$sort': {'_id': 1}})
+    assert days == [{'_id': '2025-05-01', 'n': 1}, {'_id': '2025-05-02', 'n': 2}]
+
+def test_project(workouts):
+    first = {'$match': {'_id': 1}}
+    assert _run(workouts, first, {'$project': {'user': 1, 'meta.tags': 1}}) == \
+        [{'_id': 1, 'user': 'a', 'meta': {'tags': ['legs', 'push']}}]
+    assert _run(workouts, first, {'$project': {'exercises': 0, 'meta': 0, 'date': 0}}) == \
+        [{'_id': 1, 'user': 'a', 'minutes': 30}]
+    assert _run(workouts, first, {'$project': {'meta.tags': 0, 'exercises': 0, 'date': 0}}) == \
+        [{'_id': 1, 'user': 'a', 'minutes': 30, 'meta': {}}]
+    computed = _run(workouts, first, {'$project': {
+        '_id': 0, 'n': {'$size': '$exercises'}, 'hours': {'$divide': ['$minutes', 60]},
+        'label': {'$toString': '$_id'}, 'day': {'$dateToString': {'format': '%d.%m %H:%M:%S.%L', 'date': '$date'}},
+        'fallback': {'$ifNull': ['$missing', '$user']}, 'constant': {'$literal': '$user'},
+        'plus': {'$add': ['$minutes', 5]}, 'sum': {'$sum': '$exercises'},
+    }})
+    assert computed == [{'n': 2, 'hours': 0.5, 'label': '1', 'day': '01.05 07:30:00.000',
+                         'fallback': 'a', 'constant': '$user', 'plus': 35, 'sum': 0}]
+
+def test_unwind(workouts):
+    assert [(doc['_id'], doc['exercises']) for doc in _run(workouts, {'$unwind': '$exercises'})] == \
+        [(1, 'squat'), (1, 'press'), (2, 'row')]
+    preserved = _run(workouts, {'$unwind': {'path': '$exercises', 'preserveNullAndEmptyArrays': True,
+                                            'includeArrayIndex': 'position'}})
+    assert [(doc['_id'], doc.get('exercises'), doc['position']) for doc in preserved] == \
+        [(1, 'squat', 0), (1, 'press', 1), (2, 'row', 0), (3, [], None), (4, None, None)]
+
+def test_unwind_a_dotted_path(workouts):
+    unwound = _run(workouts, {'$unwind': '$meta.tags'})
+    assert [(doc['_id'], doc['meta']) for doc in unwound] == \
+        [(1, {'tags': 'legs'}), (1, {'tags': 'push'}), (4, {'tags': 'cardio'})]
+    assert all('meta.tags' not in doc for doc in unwound)
+    # The stored documents are left alone
+    assert workouts.find_one({'_id': 1})['meta'] == {'tags': ['legs', 'push']}
+
+def test_count_and_unknown_stages(workouts):
+    assert _run(workouts, {'$match': {'user': 'b'}}, {'$count': 'n'}) == [{'n': 2}]
+    with pytest.raises(OperationFailure):
+        _run(workouts, {'$match': {}}, {'$facet': {}})
@@ -0,0 +1,334 @@
+# tests/test_mock_db.py
+"""The mock database engine: query planning, predicates and indexes"""
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from bson.regex import Regex
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+from app.utils import mock_db
+
+def _names_of(cursor):
+    return [doc['name'] for doc in cursor]
+
+def test_regex_queries_ignore_indexes(collection):
+    collection.insert_many([{'name': name} for name in ('Bench press', 'Leg press', 'Curl', 'PRESS UP')])
+    queries = [{'name': re.compile('press')}, {'name': Regex('press', 'i')},
+               {'name': {'$regex': 'press'}}, {'name': {'$in': [re.compile('^Curl'), 'Leg press']}}]
+    scanned = [sorted(_names_of(collection.find(query))) for query in queries]
+    collection.create_index([('name', 1)])
+    collection.create_index([('name', 'hashed')])
+    assert [sorted(_names_of(collection.find(query))) for query in queries] == scanned
+    assert scanned[0] == ['Bench press', 'Leg press'] and len(scanned[1]) == 3
+
+def test_dotted_paths_reach_into_arrays(collection):
+    collection.insert_many([
+        {'name': 'a', 'sets': [{'reps': 8, 'tags': ['warmup']}, {'reps': 6}]},
+        {'name': 'b', 'sets': [{'reps': 10}]},
+        {'name': 'c', 'sets': []},
+        {'name': 'd', 'sets': {'reps': 6}},
+    ])
+    queries = [({'sets.reps': 6}, ['a', 'd']), ({'sets.reps': {'$gte': 8}}, ['a', 'b']),
+               ({'sets.reps': {'$in': [10, 12]}}, ['b']), ({'sets.tags': 'warmup'}, ['a']),
+               ({'sets.0.reps': 8}, ['a']), ({'sets.reps': {'$exists': False}}, ['c'])]
+    for query, expected in queries:
+        assert sorted(_names_of(collection.find(query))) == expected, query
+    collection.create_index([('sets.reps', 1)])
+    collection.create_index([('sets.tags', 'hashed')])
+    for query, expected in queries:
+        assert sorted(_names_of(collection.find(query))) == expected, query
+
+def _sample_docs():
+    rng = random.Random(3)
+    docs = []
+    for i in range(300):
+        doc = {'_id': i, 'user': rng.choice('abcd'), 'score': rng.randint(0, 50),
+               'name': rng.choice(['Bench press', 'Squat', 'Row', 'Leg press', 'Curl']),
+               'day': datetime(2025, 5, 1) + timedelta(days=rng.randint(0, 20)),
+               'tags': rng.sample(['push', 'pull', 'legs', 'core'], rng.randint(0, 2))}
+        if i % 7 == 0:
+            del doc['score']
+        elif i % 11 == 0:
+            doc['score'] = None
+        docs.append(doc)
+    return docs
+
+INDEXED_QUERIES = [
+    ({'user': 'b'}, None, None),
+    ({'score': 10}, None, None),
+    ({'score': None}, None, None),
+    ({'score': {'$gte': 20, '$lt': 30}}, None, None),
+    ({'score': {'$gt': 45}}, [('score', -1), ('_id', 1)], None),
+    ({'user': 'a', 'score': {'$lte': 5}}, None, None),
+    ({'user': {'$in': ['a', 'c']}, 'tags': 'legs'}, None, None),
+    ({'_id': {'$in': [3, 5, 999]}}, None, None),
+    ({'name': {'$regex': '^Leg'}}, None, None),
+    ({'name': re.compile('press$'), 'user': 'd'}, None, None),
+    ({'day': {'$gte': datetime(2025, 5, 10)}}, [('day', 1), ('_id', 1)], 7),
+    ({'user': 'c'}, [('score', 1), ('_id', 1)], 5),
+    ({'user': 'c'}, [('score', -1), ('_id', -1)], 5),
+    ({}, [('user', 1), ('score', -1), ('_id', 1)], 12),
+    ({'tags': {'$in': ['core']}}, [('_id', -1)], 4),
+    ({'$or': [{'user': 'a'}, {'score': {'$gt': 48}}]}, None, None),
+]
+
+def _run_queries(collection):
+    results = []
+    for query, sort, limit in INDEXED_QUERIES:
+        cursor = collection.find(query)
+        if sort:
+            cursor.sort(sort)
+        if limit:
+            cursor.skip(2).limit(limit)
+        ids = [doc['_id'] for doc in cursor]
+        results.append(ids if sort else sorted(ids))
+    return results
+
+def test_indexed_queries_match_a_collection_scan(collection):
+    collection.insert_many(_sample_docs())
+    scanned = _run_queries(collection)
+    assert all(scanned[:-1]), "every query should match something"
+
+    collection.create_index([('user', 'hashed')])
+    collection.create_index([('tags', 'hashed')])
+    collection.create_index([('score', 1)])
+    collection.create_index([('user', 1), ('score', 1), ('_id', 1)])
+    collection.create_index([('day', 1), ('_id', 1)])
+    assert _run_queries(collection) == scanned
+    # The equality and range queries are answered from an index
+    for query, _, _ in INDEXED_QUERIES[:4]:
+        assert collection.find(query).explain()['queryPlanner']['winningPlan']['stage'] == 'FETCH', query
+
+    # Indexes follow writes
+    collection.update_many({'user': 'b'}, {'$set': {'user': 'c'}})
+    collection.delete_many({'score': {'$lt': 10}})
+    collection.insert_one({'_id': 1000, 'user': 'c', 'score': 3, 'name': 'Squat', 'day': datetime(2025, 5, 30),
+                           'tags': ['core']})
+    indexed = _run_queries(collection)
+    collection.drop_indexes()
+    assert _run_queries(collection) == indexed
+
+def test_sort_limit_keeps_the_top_documents(collection):
+    collection.insert_many(_sample_docs())
+    everything = list(collection.find().sort([('score', -1), ('name', 1), ('_id', 1)]))
+    top = list(collection.find().sort([('score', -1), ('name', 1), ('_id', 1)]).skip(10).limit(15))
+    assert top == everything[10:25]
+    batched = collection.find({'user': 'a'}).batch_size(4)
+    assert list(batched) == [doc for doc in _sample_docs() if doc['user'] == 'a']
+
+def test_update_operators(collection):
+    collection.insert_one({'_id': 1, 'n': 1, 'tags': ['a'], 'stats': {'reps': 5}, 'old': True})
+    collection.update_one({'_id': 1}, {
+        '$inc': {'n': 2, 'stats.reps': 1, 'stats.sets': 3},
+        '$set': {'stats.best.weight': 100, 'name': 'Squat'},
+        '$unset': {'old': ''},
+        '$push': {'log': {'$each': [1, 2, 3], '$slice': -2}},
+        '$addToSet': {'tags': {'$each': ['a', 'b']}},
+        '$setOnInsert': {'created': True},
+    })
+    assert collection.find_one({'_id': 1}) == {
+        '_id': 1, 'n': 3, 'tags': ['a', 'b'], 'name': 'Squat', 'log': [2, 3],
+        'stats': {'reps': 6, 'sets': 3, 'best': {'weight': 100}},
+    }
+    collection.update_one({'_id': 1}, {'$set': {'tags.1': 'c'}, '$unset': {'tags.0': 1}})
+    assert collection.find_one({'_id': 1})['tags'] == [None, 'c']
+
+    result = collection.update_one({'_id': 1}, {'$set': {'n': 3}})
+    assert (result.matched_count, result.modified_count) == (1, 0)
+    for bad in ({'$inc': {'name': 1}}, {'$inc': {'n': 'x'}}, {'$push': {'n': 1}},
+                {'$rename': {'n': 'm'}}, {'$set': {'_id': 2}}, {'$set': {'a': 1}, 'b': 2}):
+        with pytest.raises(WriteError):
+            collection.update_one({'_id': 1}, bad)
+    # A failed update leaves the document as it was
+    assert collection.find_one({'_id': 1})['n'] == 3
+
+def test_upserts(collection):
+    result = collection.update_one({'user': 'a', 'day': {'$eq': 3}, 'n': {'$gt': 1}},
+                                   {'$inc': {'n': 1}, '$setOnInsert': {'created': True}}, upsert=True)
+    doc = collection.find_one({'_id': result.upserted_id})
+    assert doc == {'_id': result.upserted_id, 'user': 'a', 'day': 3, 'n': 1, 'created': True}
+    # Plain documents replace with replace_one and merge with update_one
+    collection.replace_one({'_id': doc['_id']}, {'user': 'b'})
+    assert collection.find_one({'_id': doc['_id']}) == {'_id': doc['_id'], 'user': 'b'}
+    collection.update_many({'user': 'b'}, {'n': 5})
+    assert collection.find_one({'_id': doc['_id']}) == {'_id': doc['_id'], 'user': 'b', 'n': 5}
+
+def test_find_one_and_update(collection):
+    collection.insert_many([{'_id': i, 'queue': 'q', 'priority': i % 3, 'state': 'new'} for i in range(6)])
+    before = collection.find_one_and_update({'state': 'new'}, {'$set': {'state': 'taken'}},
+                                            sort=[('priority', -1), ('_id', 1)])
+    assert before == {'_id': 2, 'queue': 'q', 'priority': 2, 'state': 'new'}
+    after = collection.find_one_and_update({'state': 'new'}, {'$set': {'state': 'taken'}},
+                                           sort=[('priority', -1), ('_id', 1)], projection={'state': 1},
+                                           return_document=ReturnDocument.AFTER)
+    assert after == {'_id': 5, 'state': 'taken'}
+    assert collection.count_documents({'state': 'taken'}) == 2
+
+    assert collection.find_one_and_update({'state': 'gone'}, {'$set': {'x': 1}}) is None
+    assert collection.find_one_and_update({'_id': 9}, {'$inc': {'n': 1}}, upsert=True) is None
+    created = collection.find_one_and_update({'_id': 10}, {'$inc': {'n': 1}}, upsert=True,
+                                             return_document=ReturnDocument.AFTER)
+    assert created == {'_id': 10, 'n': 1}
+    assert collection.find_one({'_id': 9}) == {'_id': 9, 'n': 1}
+    with pytest.raises(ValueError):
+        collection.find_one_and_update({'_id': 10}, {'n': 2})
+
+def _bulk_requests():
+    return [
+        InsertOne({'_id': 1, 'email': 'a@x'}),
+        InsertOne({'_id': 2, 'email': 'a@x'}),
+        InsertOne({'_id': 3, 'email': 'c@x'}),
+        UpdateOne({'_id': 3}, {'$set': {'email': 'd@x'}}),
+        UpdateOne({'_id': 3}, {'$set': {'email': 'a@x'}}),
+        DeleteOne({'_id': 1}),
+        UpdateOne({'_id': 4}, {'$set': {'email': 'e@x'}}, upsert=True),
+    ]
+
+def test_ordered_bulk_write_stops_at_the_first_error(collection):
+    collection.create_index('email', unique=True)
+    with pytest.raises(BulkWriteError) as error:
+        collection.bulk_write(_bulk_requests())
+    details = error.value.details
+    assert [(e['index'], e['code']) for e in details['writeErrors']] == [(1, 11000)]
+    assert details['nInserted'] == 1
+    assert [doc['_id'] for doc in collection.find()] == [1]
+
+def test_unordered_bulk_write_applies_the_rest(collection):
+    collection.create_index('email', unique=True)
+    with pytest.raises(BulkWriteError) as error:
+        collection.bulk_write(_bulk_requests(), ordered=False)
+    details = error.value.details
+    assert [(e['index'], e['code']) for e in details['writeErrors']] == [(1, 11000), (4, 11000)]
+    assert (details['nInserted'], details['nModified'], details['nRemoved'], details['nUpserted']) == (2, 1, 1, 1)
+    assert details['upserted'] == [{'index': 6, '_id': 4}]
+    assert {doc['_id']: doc['email'] for doc in collection.find()} == {3: 'd@x', 4: 'e@x'}
+
+def test_bulk_write_result_and_insert_many_errors(collection):
+    result = collection.bulk_write([InsertOne({'_id': 1, 'n': 0}), InsertOne({'_id': 2, 'n': 0}),
+                                    UpdateMany({}, {'$inc': {'n': 1}}), ReplaceOne({'_id': 2}, {'n': 9}),
+                                    DeleteMany({'n': 1})])
+    counts = (result.inserted_count, result.matched_count, result.modified_count, result.deleted_count)
+    assert counts == (2, 3, 3, 1)
+    assert list(collection.find()) == [{'_id': 2, 'n': 9}]
+
+    with pytest.raises(BulkWriteError) as error:
+        collection.insert_many([{'_id': 5}, {'_id': 2}, {'_id': 6}], ordered=False)
+    assert error.value.details['nInserted'] == 2
+    assert collection.count_documents({}) == 3
+
+@pytest.mark.parametrize('keys', [[('email', 1)], [('email', 'hashed')], [('email', 1), ('team', 1)]])
+def test_unique_indexes_count_missing_keys_as_null(collection, keys):
+    collection.create_index(keys, unique=True)
+    collection.insert_one({'_id': 1, 'team': None})
+    # Missing and null are the same key: only one document may have it
+    for doc in ({'_id': 2}, {'_id': 3, 'email': None, 'team': None}):
+        with pytest.raises(DuplicateKeyError):
+            collection.insert_one(doc)
+    collection.insert_one({'_id': 4, 'email': 'a@example.com', 'team': None})
+    with pytest.raises(DuplicateKeyError):
+        collection.update_one({'_id': 4}, {'$unset': {'email': ''}})
+    # A document's own key does not conflict with itself
+    collection.update_one({'_id': 1}, {'$set': {'n': 1}})
+    with pytest.raises(DuplicateKeyError):
+        collection.create_index([('nickname', 1)], unique=True)
+    assert sorted(doc['_id'] for doc in collection.find()) == [1, 4]
+
+@pytest.mark.parametrize('keys', [[('email', 1)], [('email', 'hashed')]])
+def test_sparse_unique_indexes_skip_documents_without_the_fields(collection, keys):
+    name = collection.create_index(keys, unique=True, sparse=True)
+    collection.insert_many([{'_id': 1}, {'_id': 2}, {'_id': 3, 'email': None}])
+    # The null of _id 3 conflicts, though the documents without an email come first among the nulls
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({'_id': 4, 'email': None})
+    collection.delete_one({'_id': 3})
+    collection.update_one({'_id': 1}, {'$set': {'email': None}})
+    assert collection.index_information()[name]['sparse'] is True
+
+def test_unique_arrays_may_repeat_a_value_within_a_document(collection):
+    collection.create_index('tags', unique=True)
+    collection.insert_one({'_id': 1, 'tags': ['a', 'a', 'b']})
+    collection.update_one({'_id': 1}, {'$push': {'tags': 'a'}})
+    # Another document may not
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({'_id': 2, 'tags': ['a']})
+
+def test_rwlock_excludes_writers_and_shares_reads():
+    lock = mock_db._RWLock()
+    active = {'readers': 0, 'writers': 0}
+    seen = {'readers': 0, 'writers': 0, 'overlap': False}
+    guard = threading.Lock()
+    # Both readers (and the test) meet inside the read lock before the writers start
+    both_reading = threading.Barrier(3)
+
+    def enter(kind):
+        with guard:
+            active[kind] += 1
+            seen[kind] = max(seen[kind], active[kind])
+            seen['overlap'] |= bool(active['writers'] and (active['readers'] or active['writers'] > 1))
+
+    def leave(kind):
+        with guard:
+            active[kind] -= 1
+
+    def reader():
+        with lock.read():
+            enter('readers')
+            both_reading.wait(timeout=5)
+            # Hold on while the writers queue up behind the readers
+            time.sleep(0.05)
+            leave('readers')
+
+    def writer():
+        for _ in range(200):
+            with lock.write():
+                enter('writers')
+                with lock.write(), lock.read():
+                    pass
+                leave('writers')
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    both_reading.wait(timeout=5)
+    writers = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in writers:
+        thread.start()
+    for thread in readers + writers:
+        thread.join(timeout=10)
+    assert seen['readers'] == 2 and seen['writers'] == 1 and not seen['overlap']
+
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            with lock.write():
+                pass
+
+def test_concurrent_writers_lose_no_updates(collection):
+    collection.insert_one({'_id': 'counter', 'n': 0})
+    collection.create_index('email', unique=True, sparse=True)
+    errors = []
+
+    def work(worker):
+        for i in range(100):
+            collection.update_one({'_id': 'counter'}, {'$inc': {'n': 1}})
+            collection.insert_one({'worker': worker, 'i': i})
+            list(collection.find({'worker': worker}).limit(5))
+        try:
+            collection.insert_one({'email': 'same@example.com'})
+        except DuplicateKeyError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert collection.find_one({'_id': 'counter'})['n'] == 800
+    assert collection.count_documents({'worker': {'$exists': True}}) == 800
+    # Exactly one of the racing inserts won the unique key
+    assert len(errors) == 7 and collection.count_documents({'email': 'same@example.com'}) == 1
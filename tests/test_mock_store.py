@@ -0,0 +1,99 @@
+# tests/test_mock_store.py
+"""Persistence of the mock database: operation log replay and snapshots after a crash"""
+import os
+import time
+
+import pytest
+
+from app.utils import mock_db, mock_store
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """An operation log in tmp_path that the mock collections write to"""
+    journal = mock_store.Journal(str(tmp_path), 0, sync_every=3)
+    monkeypatch.setattr(mock_db, '_journal', journal)
+    yield journal
+    journal.close()
+
+def _write_some(collection):
+    collection.insert_many([{'_id': i, 'n': i, 'tags': ['a'] if i % 2 else []} for i in range(5)])
+    collection.create_index([('n', 1)], name='n_1')
+    collection.update_one({'_id': 1}, {'$inc': {'n': 10}})
+    collection.update_many({'n': {'$lt': 3}}, {'$push': {'tags': 'low'}})
+    collection.delete_one({'_id': 4})
+    collection.create_index([('tags', 'hashed')], name='tags_hashed')
+    collection.drop_index('tags_hashed')
+
+def _crash(journal):
+    """Stop logging without closing, leaving half a record at the end of the log"""
+    mock_db._journal = None
+    journal.file.write(b'\x40\x00\x00\x00\x03o\x00')
+
+def test_the_log_replays_to_the_state_before_a_crash(tmp_path, journal, collection):
+    _write_some(collection)
+    expected = collection.data
+    log = mock_store._log_path(str(tmp_path), 0)
+    size = os.path.getsize(log)
+    _crash(journal)
+
+    collections, generation = mock_store.load(str(tmp_path))
+    specs, docs, options = collections[collection.collection_name]
+    assert list(docs.values()) == expected
+    assert [spec['name'] for spec in specs] == ['n_1'] and options == {}
+    # The log was replayed, so the next one starts a new generation
+    assert generation == 1
+    # The torn record was cut off, so later records follow the last good one
+    assert os.path.getsize(log) == size
+
+    store = mock_db._CollectionStore('replayed')
+    store.load(list(docs.values()), specs, options)
+    assert [doc['_id'] for doc in store.plan({'n': {'$gte': 3}}).docs] == [3, 1]
+
+def test_a_snapshot_plus_newer_logs(tmp_path, journal, collection):
+    _write_some(collection)
+    # Compact: newer writes go to the next log and the snapshot covers the old one
+    journal.rotate(1)
+    mock_store.write_snapshot(str(tmp_path), 1, {collection.collection_name: collection.store})
+    mock_store.drop_logs(str(tmp_path), 1)
+    collection.insert_one({'_id': 9, 'n': 9})
+    collection.store.set_options({'capped': True, 'size': None, 'max': 4})
+    expected = collection.data
+    _crash(journal)
+    # A snapshot interrupted before its rename is ignored
+    with open(os.path.join(tmp_path, mock_store.SNAPSHOT_FILE + '.tmp'), 'wb') as f:
+        f.write(b'\x10\x00')
+
+    assert sorted(os.listdir(tmp_path)) == ['oplog.000001.bson', 'snapshot.bson', 'snapshot.bson.tmp']
+    assert mock_store.next_generation(str(tmp_path)) == 2
+    collections, generation = mock_store.load(str(tmp_path))
+    specs, docs, options = collections[collection.collection_name]
+    assert list(docs.values()) == expected and len(expected) == 4
+    assert options == {'capped': True, 'size': None, 'max': 4}
+    assert generation == 2
+
+def test_an_empty_directory_has_nothing_to_load(tmp_path):
+    assert mock_store.load(str(tmp_path)) == (None, 0)
+
+def test_a_long_log_is_compacted_while_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(mock_db, '_mock_data', {})
+    monkeypatch.setattr(mock_db, '_pending_fixtures', {})
+    monkeypatch.setattr(mock_db, '_journal', None)
+    store = mock_store.PersistentStore(str(tmp_path), compact_bytes=4096).open()
+    try:
+        events = mock_db.MockMongoDB().events
+        for i in range(300):
+            events.insert_one({'_id': i, 'payload': 'x' * 50})
+        # Compaction runs on its own thread: wait for it to catch up
+        deadline = time.monotonic() + 5
+        while store.journal.size >= 4096 or store._compact_wanted.is_set() or store.compact_lock.locked():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        store.close()
+
+    logs = [name for name in os.listdir(tmp_path) if name.startswith('oplog.')]
+    # Every log that outgrew the threshold was folded into the snapshot and dropped
+    assert len(logs) == 1 and store.journal.generation > 2
+    assert os.path.getsize(tmp_path / logs[0]) < 4096 + 100
+    collections, _ = mock_store.load(str(tmp_path))
+    assert len(collections['events'][1]) == 300
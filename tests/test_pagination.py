@@ -0,0 +1,207 @@
+# tests/test_pagination.py
+"""Keyset pagination: continuation tokens for the list endpoints and admin lists"""
+import re
+from datetime import datetime, time, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.utils.pagination import (
+    InvalidPageToken, decode_token, encode_token, keyset_cursor, keyset_page, sort_with_id,
+)
+from tests.conftest import count_queries
+
+# More pages than any list here has: a cursor that stops advancing fails instead of looping
+MAX_PAGES = 500
+
+def _all_pages(fetch):
+    """Every document of a paged list, and the docs examined per page"""
+    ids, examined, after = [], [], None
+    for _ in range(MAX_PAGES):
+        with count_queries() as queries:
+            docs, after = fetch(after)
+        ids += [doc['_id'] for doc in docs]
+        examined.append(queries.docs_examined)
+        if not after:
+            return ids, examined
+    pytest.fail(f"still paging after {MAX_PAGES} pages")
+
+def _api_pages(client, url, key):
+    """The ids of every item of a paged API list, following its next tokens"""
+    def fetch(after):
+        body = client.get(url + (f"&after={after}" if after else '')).get_json()
+        return [{'_id': item['_id']['$oid']} for item in body[key]], body['next']
+    ids, _ = _all_pages(fetch)
+    return ids
+
+def test_pages_cover_the_list_once_in_order(app, db):
+    from app.models.workouts import Workout
+    with app.app_context():
+        ids, _ = _all_pages(lambda after: Workout.get_exercises_page(limit=7, after=after, with_total=False)[:2])
+    expected = [doc['_id'] for doc in db.exercises.find().sort([('name', 1), ('_id', 1)])]
+    assert ids == expected
+
+def test_filtered_pages_keep_the_filter(app, db):
+    from app.models.workouts import Workout
+    with app.app_context():
+        ids, _ = _all_pages(lambda after: Workout.get_exercises_page({'search': 'a'}, limit=4, after=after)[:2])
+    assert len(ids) == len(set(ids)) == db.exercises.count_documents({'name': {'$regex': 'a', '$options': 'i'}})
+
+def test_later_pages_cost_what_the_first_does(app):
+    from app.models.workouts import Workout
+    with app.app_context():
+        _, examined = _all_pages(lambda after: Workout.get_exercises_page(limit=10, after=after, with_total=False)[:2])
+    assert len(examined) > 3
+    assert max(examined) <= examined[0] + 1
+
+def test_ties_on_the_sort_key_are_broken_by_id(app, db):
+    # Many users share a subscription tier: paging by it alone would repeat or drop some
+    with app.app_context():
+        ids, _ = _all_pages(lambda after: keyset_page(db.users, {}, [('subscription_tier', 1)], 3, after))
+    assert sorted(ids) == sorted(doc['_id'] for doc in db.users.find())
+
+@pytest.mark.parametrize('direction', [1, -1])
+def test_null_sort_keys_are_paged_once_in_order(app, collection, direction):
+    # Meals without a time, reminders without a next_at: null or missing sorts lowest
+    docs = [{'_id': i, 'user': i % 2, 'time': None if i % 3 == 0 else i % 5} for i in range(40)]
+    for doc in docs[::7]:
+        del doc['time']
+    collection.insert_many(docs)
+    collection.create_index([('user', 1), ('time', direction), ('_id', direction)])
+    sort = [('time', direction)]
+    expected = [doc['_id'] for doc in collection.find({'user': 1}).sort(sort_with_id(sort))]
+    with app.app_context():
+        for limit in (1, 3, 7):
+            ids, _ = _all_pages(lambda after: keyset_page(collection, {'user': 1}, sort, limit, after))
+            assert ids == expected, limit
+        for position in (2, 6, 15):
+            token = encode_token(collection.find_one({'_id': expected[position]}), sort_with_id(sort))
+            streamed = [doc['_id'] for doc in keyset_cursor(collection, {'user': 1}, sort, token)]
+            assert streamed == expected[position + 1:], position
+
+@pytest.mark.parametrize('direction', [1, -1])
+def test_timestamps_within_a_millisecond_are_paged_once_in_order(app, collection, direction):
+    # datetime.now() defaults keep microseconds, finer than extended JSON's $date
+    start = datetime(2025, 5, 1, 12, 0, 0, 123000)
+    collection.insert_many([{'_id': i, 'at': start + timedelta(microseconds=100 * i)} for i in range(10)])
+    sort = [('at', direction)]
+    expected = [doc['_id'] for doc in collection.find().sort(sort_with_id(sort))]
+    with app.app_context():
+        for limit in (1, 3):
+            ids, _ = _all_pages(lambda after: keyset_page(collection, {}, sort, limit, after))
+            assert ids == expected, limit
+        token = encode_token(collection.find_one({'_id': expected[4]}), sort_with_id(sort))
+        assert decode_token(token, sort_with_id(sort))[0] == start + timedelta(microseconds=100 * expected[4])
+        assert [doc['_id'] for doc in keyset_cursor(collection, {}, sort, token)] == expected[5:]
+
+def test_tokens_only_decode_for_their_own_sort(app):
+    sort = [('name', 1), ('_id', 1)]
+    with app.app_context():
+        token = encode_token({'name': 'Squat', '_id': 1}, sort)
+        assert decode_token(token, sort) == ['Squat', 1]
+        with pytest.raises(InvalidPageToken):
+            decode_token(token, [('created_at', -1), ('_id', -1)])
+        with pytest.raises(InvalidPageToken):
+            decode_token(token[:-2], sort)
+
+def test_api_follows_the_next_token(client, db):
+    first = client.get('/api/workouts/exercises?limit=25').get_json()
+    assert first['total'] == db.exercises.count_documents({})
+    second = client.get(f"/api/workouts/exercises?limit=25&after={first['next']}").get_json()
+    # Counting is opt-in past the first page
+    assert second['total'] is None
+    names = [e['name'] for e in first['exercises'] + second['exercises']]
+    assert names == sorted(names) and len(set(e['_id']['$oid'] for e in first['exercises'] + second['exercises'])) == 50
+
+def test_api_rejects_a_tampered_token(client):
+    response = client.get('/api/workouts/exercises?after=not-a-token')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid page token'
+
+def test_admin_exercises_next_link(admin_client):
+    page = admin_client.get('/admin/exercises').get_data(as_text=True)
+    links = re.findall(r'href="/admin/exercises\?after=([^"&]+)', page)
+    assert len(links) == 1
+    following = admin_client.get(f'/admin/exercises?after={links[0]}')
+    assert following.status_code == 200
+    assert 'First page' in following.get_data(as_text=True)
+
+def test_admin_bad_token_goes_back_to_the_first_page(admin_client):
+    response = admin_client.get('/admin/exercises?after=not-a-token')
+    assert response.status_code == 302
+    assert response.location.endswith('/admin/exercises')
+
+def test_reminders_page_by_datetime(client, user):
+    from datetime import datetime, time, timedelta
+    from app import mongo
+    created = [{'user_id': user['_id'], 'title': f'Stretch {i}', 'datetime': datetime(2030, 1, 1) + timedelta(hours=i // 2)}
+               for i in range(9)]
+    mongo.db.reminders.insert_many(created)
+    try:
+        ids, after = [], None
+        while True:
+            body = client.get(f"/api/reminders?limit=4{f'&after={after}' if after else ''}").get_json()
+            assert len(body['reminders']) <= 4
+            ids += [r['_id']['$oid'] for r in body['reminders']]
+            after = body['next']
+            if not after:
+                break
+        assert len(ids) == len(set(ids)) == mongo.db.reminders.count_documents({'user_id': user['_id']})
+    finally:
+        mongo.db.reminders.delete_many({'_id': {'$in': [r['_id'] for r in created]}})
+
+def test_meals_logged_without_a_time_are_paged_once(client, user, db):
+    # The server stamps them with datetime.now(), microseconds and all
+    posted = [client.post('/api/nutrition/meals', json={'name': f'Snack {i}'}).get_json()['meal_id'] for i in range(3)]
+    try:
+        today = datetime.now().date()
+        ids = _api_pages(client, f'/api/nutrition/meals/{today.isoformat()}?limit=1', 'meals')
+        assert len(ids) == len(set(ids)) == db.meals.count_documents({
+            'user_id': user['_id'],
+            'time': {'$gte': datetime.combine(today, time.min), '$lte': datetime.combine(today, time.max)},
+        })
+        assert set(posted) <= set(ids)
+    finally:
+        db.meals.delete_many({'_id': {'$in': [ObjectId(meal_id) for meal_id in posted]}})
+
+def test_reminders_created_without_a_datetime_are_paged_once(app, client, user, db):
+    from app.models.reminders import Reminder
+    with app.app_context():
+        created = [Reminder.create_reminder(str(user['_id']), {'title': f'Drink {i}'}) for i in range(3)]
+    try:
+        ids = _api_pages(client, '/api/reminders?limit=1', 'reminders')
+        assert len(ids) == len(set(ids)) == db.reminders.count_documents({'user_id': user['_id']})
+        assert set(created) <= set(ids)
+    finally:
+        db.reminders.delete_many({'_id': {'$in': [ObjectId(reminder_id) for reminder_id in created]}})
+
+def test_public_routines_are_paged_apart_from_the_users_own(client, user, db):
+    body = client.get('/api/workouts/routines?limit=2').get_json()
+    own = db.workout_routines.count_documents({'user_id': user['_id']})
+    assert len(body['routines']) == min(own, 2)
+    assert all(r['user_id']['$oid'] == str(user['_id']) for r in body['routines'])
+    assert all(r['is_public'] and r['user_id']['$oid'] != str(user['_id']) for r in body['public_routines'])
+
+    public, after = [], None
+    while True:
+        page = client.get(f"/api/workouts/routines/public?limit=2{f'&after={after}' if after else ''}").get_json()
+        public += [r['_id']['$oid'] for r in page['routines']]
+        after = page['next']
+        if not after:
+            break
+    assert len(public) == len(set(public)) == db.workout_routines.count_documents(
+        {'is_public': True, 'user_id': {'$ne': user['_id']}})
+    # Later pages of the user's own routines leave the public ones out
+    if body['next']:
+        assert 'public_routines' not in client.get(f"/api/workouts/routines?after={body['next']}").get_json()
+
+def test_page_size_is_capped(app, client):
+    limit = app.config['MAX_PAGE_SIZE']
+    body = client.get(f'/api/workouts/exercises?limit={limit * 10}').get_json()
+    assert body['limit'] == limit
+
+def test_streamed_lists_are_not_capped(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_PAGE_SIZE', 10)
+    assert len(client.get('/api/workouts/exercises?limit=40').get_json()['exercises']) == 10
+    streamed = client.get('/api/workouts/exercises?limit=40&stream=ndjson').get_data(as_text=True)
+    assert len(streamed.splitlines()) == 40
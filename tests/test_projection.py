@@ -0,0 +1,54 @@
+# tests/test_projection.py
+"""Sparse fieldsets: ?fields= projections, in the API and in the mock database"""
+import json
+
+from app.utils.mock_db import _projected_copy
+from app.utils.projection import projection
+
+DOC = {'_id': 1, 'name': 'Push', 'notes': 'long text',
+       'days': [{'day': 1, 'exercises': [{'sets': 3}]}, {'day': 2, 'exercises': []}, 'rest']}
+
+def test_mock_find_projections():
+    assert _projected_copy(DOC, {'name': 1}) == {'_id': 1, 'name': 'Push'}
+    assert _projected_copy(DOC, {'name': 1, '_id': 0}) == {'name': 'Push'}
+    assert _projected_copy(DOC, {'days.day': 1}) == {'_id': 1, 'days': [{'day': 1}, {'day': 2}]}
+    assert _projected_copy(DOC, {'notes': 0, 'days': 0}) == {'_id': 1, 'name': 'Push'}
+    # The stored document is left alone
+    assert DOC['days'][0] == {'day': 1, 'exercises': [{'sets': 3}]}
+
+def test_projection_keeps_required_fields_without_overlaps():
+    assert projection(None, ['name']) is None
+    assert projection(['days.day', 'name'], ['created_at']) == {'days.day': 1, 'name': 1, 'created_at': 1}
+    assert projection(['days', 'days.day']) == {'days': 1}
+
+def test_exercises_with_fields(client):
+    full = client.get('/api/workouts/exercises?limit=20')
+    sparse = client.get('/api/workouts/exercises?limit=20&fields=name,muscle_group')
+    exercises = sparse.get_json()['exercises']
+    assert {key for exercise in exercises for key in exercise} == {'_id', 'name', 'muscle_group'}
+    assert [e['name'] for e in exercises] == [e['name'] for e in full.get_json()['exercises']]
+    assert len(sparse.data) < len(full.data) / 2
+
+def test_fields_keep_the_sort_key_for_the_next_page(client):
+    first = client.get('/api/workouts/exercises?limit=10&fields=difficulty').get_json()
+    assert all(set(e) == {'_id', 'name', 'difficulty'} for e in first['exercises'])
+    second = client.get(f"/api/workouts/exercises?limit=10&fields=difficulty&after={first['next']}").get_json()
+    assert second['exercises'][0]['name'] >= first['exercises'][-1]['name']
+
+def test_routines_with_nested_fields(client):
+    routines = client.get('/api/workouts/routines?fields=name,days.day').get_json()['routines']
+    assert routines
+    for routine in routines:
+        assert set(routine) == {'_id', 'name', 'days', 'created_at'}
+        assert all(set(day) == {'day'} for day in routine['days'])
+
+def test_streamed_history_with_fields(client):
+    response = client.get('/api/workouts/history?limit=5&fields=date&stream=ndjson')
+    workouts = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert workouts and all(set(workout) == {'_id', 'date'} for workout in workouts)
+
+def test_invalid_fields_are_rejected(client):
+    for fields in ('$where', 'name,,a..b', 'days.$'):
+        response = client.get(f'/api/workouts/exercises?fields={fields}')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid fields'
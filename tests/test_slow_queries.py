@@ -0,0 +1,34 @@
+# tests/test_slow_queries.py
+"""The slow-query log across apps created more than once"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import db_metrics, mock_db, slow_queries
+
+@pytest.fixture
+def slow_log(db):
+    """init_slow_query_log for a stand-in app that logs every command, undone afterwards"""
+    config = {'SLOW_QUERY_MS': 0, 'SLOW_QUERY_LOG_MAX': 100, 'SLOW_QUERY_EXPLAIN': False}
+    yield lambda: slow_queries.init_slow_query_log(SimpleNamespace(config=config))
+    if slow_queries._log is not None:
+        slow_queries._log.close()
+    slow_queries._log = None
+    db_metrics.remove_observer(slow_queries._observe)
+    mock_db._mock_data.pop(slow_queries.SLOW_QUERIES, None)
+
+def test_a_new_app_replaces_the_old_log(db, slow_log):
+    observers = len(db_metrics._observers)
+    first = slow_log()
+    db.workouts.find_one({'user_id': 'first'})
+    first.flush()
+    second = slow_log()
+    db.workouts.find_one({'user_id': 'second'})
+    second.flush()
+
+    assert len(db_metrics._observers) == observers + 1
+    assert slow_queries.slow_query_log() is second
+    # The old log stopped observing, and its capture thread is gone
+    assert first.queue.empty() and first._thread is None
+    entries = list(db.slow_queries.find({'collection': 'workouts'}))
+    assert [entry['query'] for entry in entries] == ['{"user_id": "first"}', '{"user_id": "second"}']
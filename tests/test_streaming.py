@@ -0,0 +1,46 @@
+# tests/test_streaming.py
+"""Streamed list responses (?stream=, Accept: application/x-ndjson)"""
+import json
+
+import pytest
+
+PATHS = [
+    ('/api/workouts/history?limit=50', 'workouts'),
+    ('/api/body/weight', 'weights'),
+    ('/api/workouts/exercises?limit=40', 'exercises'),
+    ('/api/workouts/routines?include_public=false', 'routines'),
+]
+
+def _body(response):
+    return b''.join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in response.response)
+
+@pytest.mark.parametrize('path, key', PATHS)
+def test_streamed_json_matches_the_plain_response(client, path, key):
+    plain = client.get(path).get_json()
+    # The next-page token is only known once the list has been read
+    plain.pop('next', None)
+    separator = '&' if '?' in path else '?'
+    response = client.get(f'{path}{separator}stream=1&batch_size=4', buffered=False)
+    assert response.mimetype == 'application/json'
+    assert json.loads(_body(response)) == plain
+
+@pytest.mark.parametrize('path, key', PATHS)
+def test_ndjson_has_one_document_per_line(client, path, key):
+    plain = client.get(path).get_json()
+    response = client.get(path, headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == plain[key]
+
+def test_documents_are_sent_in_batches(client):
+    response = client.get('/api/workouts/exercises?limit=30&stream=ndjson&batch_size=7', buffered=False)
+    chunks = [chunk for chunk in response.response if chunk]
+    assert [len(chunk.splitlines()) for chunk in chunks] == [7, 7, 7, 7, 2]
+
+def test_plain_clients_are_not_streamed(client):
+    response = client.get('/api/body/weight', headers={'Accept': '*/*'})
+    assert response.mimetype == 'application/json'
+    assert 'weights' in response.get_json()
+
+def test_admin_templates_stream(admin_client, db):
+    response = admin_client.get('/admin/workout-templates?stream=1')
+    assert len(response.get_json()['templates']) == db.workout_routines.count_documents({})
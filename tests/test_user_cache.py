@@ -0,0 +1,97 @@
+# tests/test_user_cache.py
+"""The user and token caches behind the auth decorators and load_user"""
+from app.utils.cache import TTLCache, VersionStamp
+from tests.conftest import count_queries
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_cache_expires_entries():
+    clock = Clock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=20)
+    clock.now = 6
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    clock.now = 21
+    assert cache.get('b') is None and len(cache) == 0
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+def test_version_stamp_reports_bumps_from_other_processes(db):
+    clock = Clock()
+    ours = VersionStamp('test', interval=5, db=db, clock=clock)
+    theirs = VersionStamp('test', interval=5, db=db, clock=clock)
+    assert not ours.changed()
+    theirs.bump()
+    # Not read again until the interval is over
+    assert not ours.changed()
+    clock.now = 5
+    assert ours.changed()
+    clock.now = 10
+    assert not ours.changed()
+
+def test_load_user_is_cached_until_invalidated(app, user):
+    from app.models.user import User, load_user
+    user_id = str(user['_id'])
+    with app.app_context():
+        User.invalidate(user_id)
+        with count_queries() as queries:
+            first, second = load_user(user_id), load_user(user_id)
+        assert queries.commands == ['find users']
+        assert first.id == second.id == user_id
+
+        User.invalidate(user_id)
+        with count_queries() as queries:
+            load_user(user_id)
+        assert queries.commands == ['find users']
+
+def test_admin_update_invalidates_the_user(app, db, admin_client):
+    from app.models.user import User
+    target = db.users.find_one({'username': 'user0000001'})
+    user_id = str(target['_id'])
+    with app.app_context():
+        assert User.get_cached(user_id).is_active
+    admin_client.post(f'/admin/users/{user_id}/update', data={
+        'first_name': 'Off', 'last_name': 'Line', 'is_active': 'false',
+        'subscription_tier': 'free', 'role': 'user'
+    })
+    try:
+        with app.app_context():
+            assert not User.get_cached(user_id).is_active
+    finally:
+        db.users.update_one({'_id': target['_id']}, {'$set': {'is_active': True}})
+        User.invalidate(user_id)
+
+def test_token_required_decodes_each_token_once(app, user, monkeypatch):
+    import jwt
+    from app.api.auth import generate_jwt_token
+    from app.middleware.auth import token_required
+
+    decoded = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(jwt, 'decode', lambda *args, **kwargs: decoded.append(1) or real_decode(*args, **kwargs))
+    view = token_required(lambda current: current.id)
+
+    with app.app_context():
+        token = generate_jwt_token(str(user['_id']))
+    for _ in range(3):
+        with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+            assert view() == str(user['_id'])
+    assert len(decoded) == 1
+
+    with app.test_request_context(headers={'Authorization': 'Bearer not-a-token'}):
+        response, status = view()
+    assert status == 401